@@ -23,4 +23,16 @@ class TokenAuthMiddleware(BaseMiddleware):
         except ValueError:
             token_key = None
         scope['user'] = AnonymousUser() if token_key is None else await get_user(token_key)
-        return await super().__call__(scope, receive, send)
\ No newline at end of file
+        return await super().__call__(scope, receive, send)
+
+# Shares resolved group permissions between every group_user_permissions call of a request
+class GroupUserPermissionsCacheMiddleware:
+    def __init__(self, get_response):
+        from flowback.group.selectors import group_user_permissions_cache
+
+        self.get_response = get_response
+        self.cache = group_user_permissions_cache
+
+    def __call__(self, request):
+        with self.cache():
+            return self.get_response(request)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import os
 import sys
+import tempfile
 
 import environ
 from pathlib import Path
@@ -38,6 +39,8 @@ env = environ.Env(DEBUG=(bool, False),
                   FLOWBACK_ALLOW_DYNAMIC_POLL=(bool, False),
                   FLOWBACK_ALLOW_GROUP_CREATION=(bool, True),
                   FLOWBACK_GROUP_ADMIN_USER_LIST_ACCESS_ONLY=(bool, False),
+                  FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT=(int, 3600),
+                  FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT=(int, 5),
                   FLOWBACK_DEFAULT_PERMISSION=(str, 'rest_framework.permissions.IsAuthenticated'),
                   EMAIL_HOST=(str, None),
                   EMAIL_PORT=(str, None),
@@ -48,7 +51,13 @@ env = environ.Env(DEBUG=(bool, False),
                   EMAIL_USE_SSL=(bool, None),
                   INTEGRATIONS=(list, []),
                   SCORE_VOTE_CEILING=(int, 100),
-                  SCORE_VOTE_FLOOR=(int, 0)
+                  SCORE_VOTE_FLOOR=(int, 0),
+                  FLOWBACK_POLL_TALLY_ENGINE=(str, 'database'),
+                  FLOWBACK_POLL_REFRESH_INTERVAL=(int, 5),
+                  FLOWBACK_POLL_PHASE_INTERVAL=(int, 30),
+                  FLOWBACK_PREDICTION_COVARIANCE=(str, 'sample'),
+                  FLOWBACK_NOTIFICATION_INBOX=(str, 'push'),
+                  FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL=(int, 10)
                   )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -114,6 +123,16 @@ INSTALLED_APPS = [
 ] + env('INTEGRATIONS')
 
 CELERY_BROKER_URL = env('RABBITMQ_BROKER_URL')
+CELERY_BEAT_SCHEDULE = {
+    'poll_phase_transition_process': {
+        'task': 'flowback.poll.tasks.poll_phase_transition_process',
+        'schedule': env('FLOWBACK_POLL_PHASE_INTERVAL'),
+    },
+    'notification_fan_out_process': {
+        'task': 'flowback.notification.tasks.notification_fan_out_process',
+        'schedule': env('FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL'),
+    },
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'flowback.common.documentation.CustomAutoSchema',
@@ -142,6 +161,9 @@ if data := env('FLOWBACK_DEFAULT_GROUP_JOIN'):
 else:
     FLOWBACK_DEFAULT_GROUP_JOIN = []
 
+FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT = env('FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT')  # Seconds in redis
+FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT = env('FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT')  # Seconds in process
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -151,12 +173,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.GroupUserPermissionsCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
 
 MEDIA_ROOT = str(BASE_DIR) + '/media'
 MEDIA_URL = '/media/'
+
+# Keep files uploaded by tests out of the project directory
+if TESTING:
+    MEDIA_ROOT = tempfile.mkdtemp(prefix='flowback_media_')
+
 STATIC_ROOT = str(BASE_DIR) + '/static'
 STATIC_URL = '/static/'
 
@@ -230,6 +258,16 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{env('REDIS_IP')}:{env('REDIS_PORT')}",
+    }
+}
+
+if TESTING:
+    CACHES['default'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -284,6 +322,13 @@ DEFAULT_FROM_EMAIL = env('EMAIL_FROM', default=env('EMAIL_HOST_USER'))
 SCORE_VOTE_CEILING = env('SCORE_VOTE_CEILING')
 SCORE_VOTE_FLOOR = env('SCORE_VOTE_FLOOR')
 FLOWBACK_ALLOW_DYNAMIC_POLL = env('FLOWBACK_ALLOW_DYNAMIC_POLL')
+FLOWBACK_POLL_TALLY_ENGINE = env('FLOWBACK_POLL_TALLY_ENGINE')  # 'database' or 'numpy'
+FLOWBACK_POLL_REFRESH_INTERVAL = env('FLOWBACK_POLL_REFRESH_INTERVAL')  # Seconds between dynamic poll recounts
+FLOWBACK_POLL_PHASE_INTERVAL = env('FLOWBACK_POLL_PHASE_INTERVAL')  # Seconds between poll phase transition checks
+FLOWBACK_PREDICTION_COVARIANCE = env('FLOWBACK_PREDICTION_COVARIANCE')  # 'sample' or 'shrinkage'
+FLOWBACK_NOTIFICATION_INBOX = env('FLOWBACK_NOTIFICATION_INBOX')  # 'push' or 'pull'
+# Seconds between fan-outs of due channel notifications
+FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL = env('FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL')
 
 
 # Logging
@@ -12,6 +12,34 @@ class BaseModel(models.Model):
         abstract = True
 
 
+# Remembers the tracked_fields (attribute names) as loaded from the database,
+# so that signals can tell what a save changes without querying for it
+class TrackedFieldsMixin:
+    tracked_fields: tuple[str, ...] = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = {field: value for field, value in zip(field_names, values)
+                                  if field in cls.tracked_fields}
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.loaded_values_reset(fields=fields)
+
+    # Marks the current values as the stored ones, e.g. after a save
+    def loaded_values_reset(self, fields=None):
+        self.loaded_values = getattr(self, 'loaded_values', {})
+        self.loaded_values.update({field: getattr(self, field) for field in self.tracked_fields
+                                   if fields is None or field in fields})
+
+    # Whether the field differs from the stored value, None when the instance wasn't loaded from the database
+    def field_changed(self, field: str) -> bool | None:
+        loaded_values = getattr(self, 'loaded_values', {})
+        return loaded_values[field] != getattr(self, field) if field in loaded_values else None
+
+
 # Generates a query where only one of the fields is allowed to be set, while all other fields must be null
 def generate_exclusive_q(*fields: str) -> Q:
     queryset_merge = None
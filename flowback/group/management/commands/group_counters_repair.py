@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Subquery, OuterRef, Count, F, Q
+from django.db.models.functions import Coalesce
+
+from flowback.group.models import Group, GroupUser
+from flowback.poll.models import Poll
+
+
+# Recounts the counters on Group that the GroupUser and Poll signals keep, for when rows
+# were changed without signals (bulk updates, raw SQL or restored backups)
+class Command(BaseCommand):
+    help = 'Recount member and poll counters of groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, nargs='+', help='Only repair the given group ids')
+
+    def handle(self, *args, **options):
+        def count(model, group_field: str, **filters):
+            return Coalesce(Subquery(model.objects.filter(**{group_field: OuterRef('id')}, **filters)
+                                     .values(group_field).annotate(count=Count('id')).values('count')), 0)
+
+        counters = dict(member_count=count(GroupUser, 'group'),
+                        active_member_count=count(GroupUser, 'group', active=True),
+                        poll_count=count(Poll, 'created_by__group'),
+                        open_poll_count=count(Poll, 'created_by__group', status=0))
+
+        groups = Group.objects.all()
+        if options['group']:
+            groups = groups.filter(id__in=options['group'])
+
+        # Only touch groups that drifted
+        drifted = groups.alias(**{f'actual_{field}': value for field, value in counters.items()}).filter(
+            Q(*[~Q(**{field: F(f'actual_{field}')}) for field in counters], _connector=Q.OR))
+
+        repaired = drifted.update(**counters)
+        self.stdout.write(f'Repaired {repaired} group(s)')
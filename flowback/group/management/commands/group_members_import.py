@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from flowback.group.services import group_user_bulk_create
+from flowback.user.models import User
+
+
+# Adds users to a group in bulk, e.g. when onboarding an organisation. Users are given by id,
+# email or username, either as arguments or one per line in a file
+class Command(BaseCommand):
+    help = 'Add many users to a group at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('group', type=int, help='Group id to add the users to')
+        parser.add_argument('users', nargs='*', help='User ids, emails or usernames')
+        parser.add_argument('--file', help='File with one user id, email or username per line')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        identifiers = list(options['users'])
+        if options['file']:
+            with open(options['file']) as f:
+                identifiers += [line.strip() for line in f if line.strip()]
+
+        if not identifiers:
+            raise CommandError('No users given')
+
+        ids = [int(identifier) for identifier in identifiers if identifier.isdigit()]
+        user_ids = list(User.objects.filter(Q(id__in=ids)
+                                            | Q(email__in=identifiers)
+                                            | Q(username__in=identifiers)).values_list('id', flat=True))
+
+        added = group_user_bulk_create(group=options['group'], user_ids=user_ids, batch_size=options['batch_size'])
+        self.stdout.write(f'Added {added} of {len(identifiers)} user(s) to group {options["group"]}')
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+def pre_populate_bitmask(apps, schema_editor):
+    GroupPermissions = apps.get_model('group', 'grouppermissions')
+    GroupUser = apps.get_model('group', 'groupuser')
+    permission_names = ('invite_user', 'create_poll', 'poll_fast_forward', 'poll_quorum', 'allow_vote',
+                        'kick_members', 'ban_members', 'create_proposal', 'update_proposal', 'delete_proposal',
+                        'force_delete_poll', 'force_delete_proposal', 'force_delete_comment',
+                        'create_kanban_task', 'update_kanban_task', 'delete_kanban_task')
+
+    def compile_bitmask(get):
+        return sum(1 << i for i, name in enumerate(permission_names) if get(name))
+
+    default_bitmask = compile_bitmask(lambda name: GroupPermissions._meta.get_field(name).default)
+
+    permissions = list(GroupPermissions.objects.all())
+    for permission in permissions:
+        permission.bitmask = compile_bitmask(lambda name: getattr(permission, name))
+
+    GroupPermissions.objects.bulk_update(permissions, fields=['bitmask'], batch_size=1000)
+
+    group_users = list(GroupUser.objects.select_related('permission', 'group__default_permission'))
+    for group_user in group_users:
+        permission = group_user.permission or group_user.group.default_permission
+        group_user.permission_bitmask = permission.bitmask if permission else default_bitmask
+
+    GroupUser.objects.bulk_update(group_users, fields=['permission_bitmask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0026_grouppermissions_poll_fast_forward'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grouppermissions',
+            name='bitmask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='groupuser',
+            name='permission_bitmask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(pre_populate_bitmask, migrations.RunPython.noop),
+    ]
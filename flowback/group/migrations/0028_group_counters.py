@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:32
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def pre_populate_member_counts(apps, schema_editor):
+    Group = apps.get_model('group', 'group')
+    GroupUser = apps.get_model('group', 'groupuser')
+
+    def member_count(**filters):
+        return Coalesce(models.Subquery(GroupUser.objects.filter(group=models.OuterRef('id'), **filters)
+                                        .values('group').annotate(count=models.Count('id')).values('count')), 0)
+
+    Group.objects.update(member_count=member_count(), active_member_count=member_count(active=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0027_permission_bitmask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='active_member_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='open_poll_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='poll_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(pre_populate_member_counts, migrations.RunPython.noop),
+    ]
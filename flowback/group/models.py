@@ -2,7 +2,6 @@ import uuid
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save, post_delete, pre_save
-from django.forms import model_to_dict
 from rest_framework.exceptions import ValidationError
 
 from backend.settings import FLOWBACK_DEFAULT_GROUP_JOIN
@@ -10,14 +9,14 @@ from flowback.chat.models import MessageChannel, MessageChannelParticipant
 from flowback.chat.services import message_channel_create, message_channel_join
 from flowback.comment.models import CommentSection
 from flowback.comment.services import comment_section_create, comment_section_create_model_default
-from flowback.common.models import BaseModel
-from flowback.common.services import get_object
+from flowback.common.models import BaseModel, TrackedFieldsMixin
 from flowback.kanban.models import Kanban
 from flowback.kanban.services import kanban_create, kanban_subscription_create, kanban_subscription_delete
 from flowback.schedule.models import Schedule
 from flowback.schedule.services import create_schedule
 from flowback.user.models import User
 from django.db import models
+from django.db.models import Q, F
 
 
 # Create your models here.
@@ -28,7 +27,9 @@ class GroupFolder(BaseModel):
         return f'{self.id} - {self.name}'
 
 
-class Group(BaseModel):
+class Group(TrackedFieldsMixin, BaseModel):
+    tracked_fields = ('default_permission_id',)
+
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     active = models.BooleanField(default=True)
 
@@ -58,6 +59,16 @@ class Group(BaseModel):
 
     jitsi_room = models.UUIDField(unique=True, default=uuid.uuid4)
 
+    # Counters kept by the GroupUser and Poll signals, repaired by the group_counters_repair command
+    member_count = models.IntegerField(default=0)
+    active_member_count = models.IntegerField(default=0)
+    poll_count = models.IntegerField(default=0)
+    open_poll_count = models.IntegerField(default=0)
+
+    @property
+    def default_permission_bitmask(self) -> int:
+        return self.default_permission.bitmask if self.default_permission else GroupPermissions.default_bitmask()
+
     @classmethod
     def pre_save(cls, instance, raw, using, update_fields, *args, **kwargs):
         if instance.pk is None:
@@ -65,6 +76,10 @@ class Group(BaseModel):
 
     @classmethod
     def post_save(cls, instance, created, update_fields, *args, **kwargs):
+        # New groups have no members to update yet
+        default_permission_changed = not created and instance.field_changed('default_permission_id') is not False
+        instance.loaded_values_reset()
+
         if created:
             instance.schedule = create_schedule(name=instance.name, origin_name='group', origin_id=instance.id)
             instance.kanban = kanban_create(name=instance.name, origin_type='group', origin_id=instance.id)
@@ -80,14 +95,19 @@ class Group(BaseModel):
                 instance.schedule.save()
                 instance.kanban.save()
 
+        # Members without a permission of their own follow the group default
+        if default_permission_changed and (not update_fields or 'default_permission' in update_fields):
+            GroupUser.objects.filter(group=instance, permission__isnull=True
+                                     ).exclude(permission_bitmask=instance.default_permission_bitmask
+                                               ).update(permission_bitmask=instance.default_permission_bitmask)
+
     @classmethod
     def user_post_save(cls, instance: User, created: bool, *args, **kwargs):
         if created and FLOWBACK_DEFAULT_GROUP_JOIN:
-            for group_id in FLOWBACK_DEFAULT_GROUP_JOIN:
-                if get_object(Group, id=group_id, raise_exception=False):
-                    group_user = GroupUser(user=instance, group_id=group_id)
-                    # TODO FIX pre_save check group_user.full_clean()
-                    group_user.save()
+            from flowback.group.services import group_user_bulk_create
+
+            for group_id in Group.objects.filter(id__in=FLOWBACK_DEFAULT_GROUP_JOIN).values_list('id', flat=True):
+                group_user_bulk_create(group=group_id, user_ids=[instance.id])
 
     @classmethod
     def post_delete(cls, instance, *args, **kwargs):
@@ -123,9 +143,69 @@ class GroupPermissions(BaseModel):
     update_kanban_task = models.BooleanField(default=True)
     delete_kanban_task = models.BooleanField(default=True)
 
+    # The permissions above compiled into one integer, one bit each as ordered in permission_bits
+    bitmask = models.BigIntegerField(default=0)
+
+    # New permissions must be appended, existing bitmasks depend on the order
+    permission_bits = {name: 1 << i for i, name in enumerate(('invite_user',
+                                                              'create_poll',
+                                                              'poll_fast_forward',
+                                                              'poll_quorum',
+                                                              'allow_vote',
+                                                              'kick_members',
+                                                              'ban_members',
+                                                              'create_proposal',
+                                                              'update_proposal',
+                                                              'delete_proposal',
+                                                              'force_delete_poll',
+                                                              'force_delete_proposal',
+                                                              'force_delete_comment',
+                                                              'create_kanban_task',
+                                                              'update_kanban_task',
+                                                              'delete_kanban_task'))}
+
     @staticmethod
     def negate_field_perms():
-        return ['id', 'created_at', 'updated_at', 'role_name', 'author']
+        return ['id', 'created_at', 'updated_at', 'role_name', 'author', 'bitmask']
+
+    @classmethod
+    def compile_bitmask(cls, permissions: dict[str, bool]) -> int:
+        return sum(bit for name, bit in cls.permission_bits.items() if permissions.get(name))
+
+    @classmethod
+    def default_bitmask(cls) -> int:
+        return cls.compile_bitmask({name: cls._meta.get_field(name).default for name in cls.permission_bits})
+
+    @classmethod
+    def bitmask_permissions(cls, bitmask: int) -> set[str]:
+        return {name for name, bit in cls.permission_bits.items() if bitmask & bit}
+
+    @classmethod
+    def pre_save(cls, instance, *args, **kwargs):
+        instance.bitmask = cls.compile_bitmask({name: getattr(instance, name) for name in cls.permission_bits})
+
+    @classmethod
+    def post_save(cls, instance, update_fields, *args, **kwargs):
+        if update_fields and 'bitmask' not in update_fields:
+            cls.objects.filter(id=instance.id).update(bitmask=instance.bitmask)
+
+        GroupUser.objects.filter(Q(permission=instance) | Q(permission__isnull=True,
+                                                             group__default_permission=instance)
+                                 ).exclude(permission_bitmask=instance.bitmask
+                                           ).update(permission_bitmask=instance.bitmask)
+
+    # Members who held the role (or the group default) are set to null by now and follow the group default
+    @classmethod
+    def post_delete(cls, instance, *args, **kwargs):
+        group = Group.objects.filter(id=instance.author_id).select_related('default_permission').first()
+        if group:
+            GroupUser.objects.filter(group=group, permission__isnull=True
+                                     ).update(permission_bitmask=group.default_permission_bitmask)
+
+
+pre_save.connect(GroupPermissions.pre_save, sender=GroupPermissions)
+post_save.connect(GroupPermissions.post_save, sender=GroupPermissions)
+post_delete.connect(GroupPermissions.post_delete, sender=GroupPermissions)
 
 
 # Permission Tags for each group, and for user to put on delegators
@@ -139,7 +219,9 @@ class GroupTags(BaseModel):
 
 
 # User information for the specific group
-class GroupUser(BaseModel):
+class GroupUser(TrackedFieldsMixin, BaseModel):
+    tracked_fields = ('active', 'permission_bitmask')
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
     is_admin = models.BooleanField(default=False)
@@ -147,20 +229,13 @@ class GroupUser(BaseModel):
     chat_participant = models.ForeignKey(MessageChannelParticipant, on_delete=models.PROTECT)
     active = models.BooleanField(default=True)
 
-    def check_permission(self, raise_exception: bool = False, **permissions):
-        if self.permission:
-            user_permissions = model_to_dict(self.permission)
-        else:
-            if self.group.default_permission:
-                user_permissions = model_to_dict(self.group.default_permission)
-            else:
-                fields = [field for field in GroupPermissions._meta.get_fields() if not (field.auto_created
-                          or field.name in GroupPermissions.negate_field_perms())]
-                user_permissions = {field.name: field.default for field in fields}
+    permission_bitmask = models.BigIntegerField(default=0)  # Bitmask of the permission, or of the group default
 
+    def check_permission(self, raise_exception: bool = False, **permissions):
         def validate_perms():
             for perm, val in permissions.items():
-                if user_permissions.get(perm) != val:
+                bit = GroupPermissions.permission_bits.get(perm)
+                if bit is None or bool(self.permission_bitmask & bit) != val:
                     yield f"{perm} must be {val}"
 
         failed_permissions = list(validate_perms())
@@ -178,8 +253,33 @@ class GroupUser(BaseModel):
             instance.chat_participant = message_channel_join(user_id=instance.user_id,
                                                              channel_id=instance.group.chat_id)
 
+        instance.permission_bitmask = instance.permission.bitmask if instance.permission \
+            else instance.group.default_permission_bitmask
+
+        # Remembers whether the member got (de)activated, see post_save and the delegation cache.
+        # Only queried for members that weren't loaded from the database
+        instance.active_changed = instance.field_changed('active')
+        if instance.active_changed is None:
+            instance.active_changed = instance.pk is not None and GroupUser.objects.filter(
+                id=instance.pk).exclude(active=instance.active).exists()
+
     @classmethod
     def post_save(cls, instance, created, update_fields, *args, **kwargs):
+        if update_fields and 'permission_bitmask' not in update_fields \
+                and instance.field_changed('permission_bitmask') is not False:
+            cls.objects.filter(id=instance.id).update(permission_bitmask=instance.permission_bitmask)
+
+        instance.loaded_values_reset()
+
+        if created:
+            Group.objects.filter(id=instance.group_id).update(member_count=F('member_count') + 1,
+                                                              active_member_count=F('active_member_count')
+                                                              + int(instance.active))
+
+        elif getattr(instance, 'active_changed', False):
+            Group.objects.filter(id=instance.group_id).update(active_member_count=F('active_member_count')
+                                                              + (1 if instance.active else -1))
+
         if created:
             kanban_subscription_create(kanban_id=instance.user.kanban_id,
                                        target_id=instance.group.kanban_id)
@@ -188,6 +288,9 @@ class GroupUser(BaseModel):
 
     @classmethod
     def post_delete(cls, instance, *args, **kwargs):
+        Group.objects.filter(id=instance.group_id).update(member_count=F('member_count') - 1,
+                                                          active_member_count=F('active_member_count')
+                                                          - int(instance.active))
         kanban_subscription_delete(kanban_id=instance.user.kanban_id,
                                    target_id=instance.group.kanban_id)
         instance.chat_participant.delete()
@@ -1,10 +1,23 @@
 # TODO groups, groupusers, groupinvites, groupuserinvites,
 #  groupdefaultpermission, grouppermissions, grouptags, groupuserdelegates
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
 import django_filters
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Union
+
+from celery.signals import task_prerun, task_postrun
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.db.models import Q, Exists, OuterRef, Count, Case, When, F
 from django.forms import model_to_dict
 
+from backend.settings import FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT, FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT
 from flowback.comment.selectors import comment_list
 from flowback.common.services import get_object
 from flowback.kanban.selectors import kanban_entry_list
@@ -33,51 +46,319 @@ def group_default_permissions(*, group: Union[Group, int]):
     return defaults
 
 
+# Permissions resolved within the current request or celery task, keyed on (user, group) and ('group_user', id).
+# Outside of group_user_permissions_cache every call resolves from the database
+_group_user_permissions = ContextVar('group_user_permissions', default=None)
+
+
+@contextmanager
+def group_user_permissions_cache():
+    token = _group_user_permissions.set({})
+    try:
+        yield
+    finally:
+        _group_user_permissions.reset(token)
+
+
+def group_user_permissions_cache_clear(**kwargs):
+    cache = _group_user_permissions.get()
+    if cache is not None:
+        cache.clear()
+
+
+for sender in (Group, GroupUser, GroupPermissions):
+    post_save.connect(group_user_permissions_cache_clear, sender=sender)
+    post_delete.connect(group_user_permissions_cache_clear, sender=sender)
+
+
+_group_user_permissions_tasks = {}
+
+
+@task_prerun.connect
+def group_user_permissions_task_start(task_id, **kwargs):
+    _group_user_permissions_tasks[task_id] = _group_user_permissions.set({})
+
+
+@task_postrun.connect
+def group_user_permissions_task_end(task_id, **kwargs):
+    if task_id in _group_user_permissions_tasks:
+        _group_user_permissions.reset(_group_user_permissions_tasks.pop(task_id))
+
+
+# Group memberships shared between processes through the cache, keyed on (group, user) and a version that
+# changes with anything affecting every member of a group (roles, the group default, superusers).
+# Every process keeps recently read memberships for FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT seconds in front of it
+_group_membership_local = OrderedDict()
+_group_membership_local_lock = threading.Lock()
+_group_membership_local_size = 10000
+_group_membership_fields = [field.attname for field in GroupUser._meta.concrete_fields]
+
+
+def _group_membership_key(*, group_id: int, user_id: int) -> str:
+    versions = cache.get_many(['group_membership_version', f'group_membership_version_{group_id}'])
+    return (f"group_membership_{versions.get('group_membership_version', 0)}"
+            f"_{versions.get(f'group_membership_version_{group_id}', 0)}_{group_id}_{user_id}")
+
+
+# Returns the active membership row of the user in the group (GroupUser fields, the group creator and whether
+# the user is a superuser), or None when the user isn't in the group. Non-members are cached as well
+def group_membership_get(*, user_id: int, group_id: int) -> dict | None:
+    with _group_membership_local_lock:
+        local = _group_membership_local.get((group_id, user_id))
+        if local and local[0] > time.monotonic():
+            _group_membership_local.move_to_end((group_id, user_id))
+            return local[1]
+
+    key = _group_membership_key(group_id=group_id, user_id=user_id)
+    membership = cache.get(key)
+
+    if membership is None:
+        membership = GroupUser.objects.filter(group_id=group_id, user_id=user_id, active=True).values(
+            *_group_membership_fields,
+            group_created_by_id=F('group__created_by_id'),
+            user_is_superuser=F('user__is_superuser')).first() or False
+        cache.set(key, membership, timeout=FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT)
+
+    with _group_membership_local_lock:
+        _group_membership_local[(group_id, user_id)] = (time.monotonic() + FLOWBACK_GROUP_MEMBERSHIP_LOCAL_TIMEOUT,
+                                                        membership or None)
+        _group_membership_local.move_to_end((group_id, user_id))
+        while len(_group_membership_local) > _group_membership_local_size:
+            _group_membership_local.popitem(last=False)
+
+    return membership or None
+
+
+def group_membership_invalidate(*, group_id: int = None, user_id: int = None):
+    # One membership
+    if group_id and user_id:
+        cache.delete(_group_membership_key(group_id=group_id, user_id=user_id))
+
+        with _group_membership_local_lock:
+            _group_membership_local.pop((group_id, user_id), None)
+
+        return
+
+    # Every membership of a group, or of every group
+    version_key = f'group_membership_version_{group_id}' if group_id else 'group_membership_version'
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, 1, timeout=None)
+
+    with _group_membership_local_lock:
+        _group_membership_local.clear()
+
+
+# Invalidates right away for reads later in the same transaction, and again once committed
+# since concurrent readers may have cached the rows from before the commit in the meantime
+def group_membership_invalidate_on_commit(*, group_id: int = None, user_id: int = None):
+    group_membership_invalidate(group_id=group_id, user_id=user_id)
+    transaction.on_commit(partial(group_membership_invalidate, group_id=group_id, user_id=user_id))
+
+
+def group_membership_group_user_changed(instance: GroupUser, **kwargs):
+    group_membership_invalidate_on_commit(group_id=instance.group_id, user_id=instance.user_id)
+
+
+def group_membership_group_changed(instance: Group, **kwargs):
+    group_membership_invalidate_on_commit(group_id=instance.id)
+
+
+def group_membership_permission_changed(instance: GroupPermissions, **kwargs):
+    group_membership_invalidate_on_commit(group_id=instance.author_id)
+
+
+def group_membership_user_changed(instance: User, update_fields=None, **kwargs):
+    if not update_fields or 'is_superuser' in update_fields:
+        group_membership_invalidate_on_commit()
+
+
+for signal in (post_save, post_delete):
+    signal.connect(group_membership_group_user_changed, sender=GroupUser)
+    signal.connect(group_membership_group_changed, sender=Group)
+    signal.connect(group_membership_permission_changed, sender=GroupPermissions)
+    signal.connect(group_membership_user_changed, sender=User)
+
+
+# Delegation of a group held in memory, per tag the delegators of every delegate pool and the delegate pools
+# of every delegator. Only active delegators are part of it
+class GroupDelegationGraph:
+    def __init__(self, delegations: list[tuple[int, int, int]]):
+        self.pool_delegators: dict[int, dict[int, set[int]]] = {}
+        self.delegator_pools: dict[int, dict[int, set[int]]] = {}
+        self.pools: dict[int, set[int]] = {}
+
+        for tag_id, pool_id, delegator_id in delegations:
+            self.pool_delegators.setdefault(tag_id, {}).setdefault(pool_id, set()).add(delegator_id)
+            self.delegator_pools.setdefault(tag_id, {}).setdefault(delegator_id, set()).add(pool_id)
+            self.pools.setdefault(pool_id, set()).add(delegator_id)
+
+    # Who delegates to whom for the tag, as delegate pool -> delegators
+    def delegations(self, *, tag_id: int) -> dict[int, set[int]]:
+        return self.pool_delegators.get(tag_id, {})
+
+    def delegators(self, *, tag_id: int, pool_id: int) -> set[int]:
+        return self.pool_delegators.get(tag_id, {}).get(pool_id, set())
+
+    def delegate_pools(self, *, tag_id: int, delegator_id: int) -> set[int]:
+        return self.delegator_pools.get(tag_id, {}).get(delegator_id, set())
+
+    # Delegators the pool represents on the tag, leaving out the excluded group users (e.g. direct voters)
+    def mandate(self, *, tag_id: int, pool_id: int, exclude: set[int] = None) -> int:
+        delegators = self.delegators(tag_id=tag_id, pool_id=pool_id)
+        return len(delegators - exclude) if exclude else len(delegators)
+
+    # Delegators of the pool on any tag
+    def pool_delegator_count(self, *, pool_id: int) -> int:
+        return len(self.pools.get(pool_id, ()))
+
+
+# Graphs are shared between processes through the cache under a version per group, which every change to the
+# group's delegation bumps. Processes keep the latest graphs they read and only ask the cache for the version
+_group_delegation_local = OrderedDict()
+_group_delegation_local_lock = threading.Lock()
+_group_delegation_local_size = 100
+
+
+# Versions start from the clock, so a flushed cache never brings back a version a process still holds
+def _group_delegation_version(*, group_id: int) -> int:
+    version = cache.get(f'group_delegation_version_{group_id}')
+    if version is None:
+        cache.add(f'group_delegation_version_{group_id}', time.time_ns(), timeout=None)
+        version = cache.get(f'group_delegation_version_{group_id}')
+
+    return version
+
+
+def group_delegation_graph(*, group_id: int) -> GroupDelegationGraph:
+    version = _group_delegation_version(group_id=group_id)
+
+    with _group_delegation_local_lock:
+        local = _group_delegation_local.get(group_id)
+        if local and local[0] == version:
+            _group_delegation_local.move_to_end(group_id)
+            return local[1]
+
+    key = f'group_delegation_graph_{version}_{group_id}'
+    graph = cache.get(key)
+
+    if graph is None:
+        graph = GroupDelegationGraph(GroupUserDelegator.tags.through.objects.filter(
+            groupuserdelegator__group_id=group_id,
+            groupuserdelegator__delegator__active=True
+        ).values_list('grouptags_id', 'groupuserdelegator__delegate_pool_id', 'groupuserdelegator__delegator_id'))
+        cache.set(key, graph, timeout=FLOWBACK_GROUP_MEMBERSHIP_CACHE_TIMEOUT)
+
+    with _group_delegation_local_lock:
+        _group_delegation_local[group_id] = (version, graph)
+        _group_delegation_local.move_to_end(group_id)
+        while len(_group_delegation_local) > _group_delegation_local_size:
+            _group_delegation_local.popitem(last=False)
+
+    return graph
+
+
+def group_delegation_invalidate(*, group_id: int):
+    try:
+        cache.incr(f'group_delegation_version_{group_id}')
+    except ValueError:
+        cache.set(f'group_delegation_version_{group_id}', time.time_ns(), timeout=None)
+
+
+# Same as group_membership_invalidate_on_commit, a graph read before the commit would otherwise be kept
+def group_delegation_invalidate_on_commit(*, group_id: int):
+    group_delegation_invalidate(group_id=group_id)
+    transaction.on_commit(partial(group_delegation_invalidate, group_id=group_id))
+
+
+# Delegator rows, their tags and tags all change the delegation
+def group_delegation_changed(instance: GroupUserDelegator | GroupTags, created: bool = False, **kwargs):
+    if not created:
+        group_delegation_invalidate_on_commit(group_id=instance.group_id)
+
+
+# Of the members, only (de)activating changes the delegation. Leaving deletes the delegator rows,
+# which invalidates on its own, and new members have no delegation yet
+def group_delegation_group_user_changed(instance: GroupUser, created: bool, **kwargs):
+    if not created and getattr(instance, 'active_changed', False):
+        group_delegation_invalidate_on_commit(group_id=instance.group_id)
+
+
+def group_delegation_tags_changed(instance: GroupUserDelegator | GroupTags, action: str, **kwargs):
+    if action.startswith('post_'):
+        group_delegation_invalidate_on_commit(group_id=instance.group_id)
+
+
+for signal in (post_save, post_delete):
+    for sender in (GroupUserDelegator, GroupTags):
+        signal.connect(group_delegation_changed, sender=sender)
+post_save.connect(group_delegation_group_user_changed, sender=GroupUser)
+m2m_changed.connect(group_delegation_tags_changed, sender=GroupUserDelegator.tags.through)
+
+
+# Loads the group user, from the membership cache when looked up by user and group,
+# returns it with the set of permissions it holds ('admin' and 'creator' included)
+def _group_user_permission_set(*,
+                               user_id: int = None,
+                               group_id: int = None,
+                               group_user_id: int = None) -> tuple[GroupUser, frozenset[str]]:
+    cache = _group_user_permissions.get()
+    key = ('group_user', group_user_id) if group_user_id else (user_id, group_id)
+
+    if cache is not None and key in cache:
+        return cache[key]
+
+    if group_user_id:
+        group_user = get_object(GroupUser.objects.select_related('user', 'group'), id=group_user_id, active=True)
+        is_creator = group_user.group.created_by_id == group_user.user_id or group_user.user.is_superuser
+
+    else:
+        membership = group_membership_get(user_id=user_id, group_id=group_id)
+        if not membership:
+            raise ValidationError('User is not in group')
+
+        group_user = GroupUser.from_db('default', _group_membership_fields,
+                                       [membership[field] for field in _group_membership_fields])
+        is_creator = membership['group_created_by_id'] == group_user.user_id or membership['user_is_superuser']
+
+    permissions = GroupPermissions.bitmask_permissions(group_user.permission_bitmask)
+
+    if is_creator:
+        permissions.add('creator')
+
+    if is_creator or group_user.is_admin:
+        permissions.add('admin')
+
+    resolved = group_user, frozenset(permissions)
+    if cache is not None:
+        cache[('group_user', group_user.id)] = cache[(group_user.user_id, group_user.group_id)] = resolved
+
+    return resolved
+
+
 def group_user_permissions(*,
                            user: Union[User, int] = None,
                            group: Union[Group, int] = None,
                            group_user: [GroupUser, int] = None,
                            permissions: Union[list[str], str] = None,
                            raise_exception: bool = True) -> Union[GroupUser, bool]:
-    if isinstance(user, int):
-        user = get_object(User, id=user)
-
-    if isinstance(group, int):
-        group = get_object(Group, id=group)
-
     permissions = permissions or []
 
     if isinstance(permissions, str):
         permissions = [permissions]
 
     if user and group:
-        group_user = get_object(GroupUser, 'User is not in group', group=group, user=user, active=True)
+        group_user, user_permissions = _group_user_permission_set(user_id=getattr(user, 'id', user),
+                                                                  group_id=getattr(group, 'id', group))
 
     elif group_user:
-        if isinstance(group_user, int):
-            group_user = get_object(GroupUser, id=group_user, active=True)
-
-        elif isinstance(group_user, GroupUser):
-            group_user = get_object(GroupUser, id=group_user.id, active=True)
+        group_user, user_permissions = _group_user_permission_set(group_user_id=getattr(group_user, 'id', group_user))
 
     else:
         raise Exception('group_user_permissions is missing appropiate parameters')
 
-    perobj = GroupPermissions()
-    user_permissions = model_to_dict(group_user.permission) if group_user.permission else group_default_permissions(
-        group=group_user.group)
-
-    # Check if admin permission is present
-    if 'admin' in permissions:
-        if group_user.is_admin or group_user.group.created_by == group_user.user or group_user.user.is_superuser:
-            return group_user
-
-    # Check if creator permission is present
-    if 'creator' in permissions:
-        if group_user.group.created_by == group_user.user or group_user.user.is_superuser:
-            return group_user
-
-    validated_permissions = any([user_permissions.get(key, False) for key in permissions]) or not permissions
+    validated_permissions = any(permission in user_permissions for permission in permissions) or not permissions
     if not validated_permissions:
         if raise_exception:
             raise ValidationError(
@@ -110,8 +391,7 @@ def group_list(*, fetched_by: User, filters=None):
     filters = filters or {}
     joined_groups = Group.objects.filter(id=OuterRef('pk'), groupuser__user__in=[fetched_by])
     qs = _group_get_visible_for(user=fetched_by
-                                ).annotate(joined=Exists(joined_groups),
-                                           member_count=Count('groupuser')
+                                ).annotate(joined=Exists(joined_groups)
                                            ).order_by('created_at').all()
     qs = BaseGroupFilter(filters, qs).qs
     return qs
@@ -128,7 +408,7 @@ def group_kanban_entry_list(*, fetched_by: User, group_id: int, filters=None):
 
 def group_detail(*, fetched_by: User, group_id: int):
     group_user = group_user_permissions(group=group_id, user=fetched_by)
-    return Group.objects.annotate(member_count=Count('groupuser')).get(id=group_user.group.id)
+    return Group.objects.get(id=group_user.group_id)
 
 
 def group_schedule_event_list(*, fetched_by: User, group_id: int, filters=None):
@@ -1,7 +1,8 @@
 from typing import Union
 
 from django.core.mail import send_mass_mail
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, F
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -10,7 +11,8 @@ from rest_framework.exceptions import ValidationError
 
 from flowback.comment.models import Comment
 from flowback.comment.services import comment_create, comment_update, comment_delete
-from flowback.kanban.models import KanbanEntry
+from flowback.chat.models import MessageChannelParticipant
+from flowback.kanban.models import KanbanEntry, KanbanSubscription
 from flowback.notification.services import NotificationManager
 from flowback.schedule.models import ScheduleEvent
 from flowback.schedule.services import ScheduleManager, subscribe_schedule
@@ -19,7 +21,8 @@ from flowback.user.services import user_schedule
 from flowback.user.models import User
 from flowback.group.models import Group, GroupUser, GroupUserInvite, GroupUserDelegator, GroupTags, GroupPermissions, \
     GroupUserDelegate, GroupUserDelegatePool, GroupThread
-from flowback.group.selectors import group_user_permissions
+from flowback.group.selectors import group_user_permissions, \
+    group_membership_invalidate_on_commit, group_delegation_invalidate_on_commit
 from flowback.common.services import model_update, get_object
 
 group_schedule = ScheduleManager(schedule_origin_name='group', possible_origins=['poll'])
@@ -168,6 +171,59 @@ def group_join(*, user: int, group: int) -> Union[GroupUser, GroupUserInvite]:
     return user_status
 
 
+# Adds many users to a group at once without the per-member GroupUser signals: chat participants, members and
+# kanban subscriptions are each inserted with one bulk_create. Inactive members are reactivated and
+# users already in the group are skipped. Returns the amount of users added or reactivated
+def group_user_bulk_create(*, group: int, user_ids: list[int], batch_size: int = 1000) -> int:
+    group = get_object(Group, id=group)
+
+    with transaction.atomic():
+        reactivated_user_ids = list(GroupUser.objects.filter(group=group, user_id__in=user_ids, active=False
+                                                             ).values_list('user_id', flat=True))
+        reactivated_delegators = bool(reactivated_user_ids) and GroupUserDelegator.objects.filter(
+            group=group, delegator__user_id__in=reactivated_user_ids).exists()
+        reactivated = GroupUser.objects.filter(group=group, user_id__in=reactivated_user_ids, active=False
+                                               ).update(active=True)
+
+        users = list(User.objects.filter(id__in=user_ids).exclude(groupuser__group=group
+                                                                  ).values_list('id', 'kanban_id'))
+        new_user_ids = [user_id for user_id, kanban_id in users]
+
+        MessageChannelParticipant.objects.bulk_create([MessageChannelParticipant(user_id=user_id,
+                                                                                 channel_id=group.chat_id)
+                                                       for user_id in new_user_ids],
+                                                      batch_size=batch_size,
+                                                      ignore_conflicts=True)
+        participants = dict(MessageChannelParticipant.objects.filter(channel_id=group.chat_id,
+                                                                     user_id__in=new_user_ids
+                                                                     ).values_list('user_id', 'id'))
+
+        GroupUser.objects.bulk_create([GroupUser(user_id=user_id,
+                                                 group=group,
+                                                 chat_participant_id=participants[user_id],
+                                                 permission_bitmask=group.default_permission_bitmask)
+                                       for user_id in new_user_ids], batch_size=batch_size)
+
+        KanbanSubscription.objects.bulk_create([KanbanSubscription(kanban_id=kanban_id, target_id=group.kanban_id)
+                                                for user_id, kanban_id in users if kanban_id],
+                                               batch_size=batch_size,
+                                               ignore_conflicts=True)
+
+        Group.objects.filter(id=group.id).update(member_count=F('member_count') + len(new_user_ids),
+                                                 active_member_count=F('active_member_count')
+                                                 + len(new_user_ids) + reactivated)
+
+    # The skipped signals would have dropped these. Only the added users' memberships change (none of them
+    # were cached as permissions, which only holds active members), and new members have no delegation yet
+    for user_id in new_user_ids + reactivated_user_ids:
+        group_membership_invalidate_on_commit(group_id=group.id, user_id=user_id)
+
+    if reactivated_delegators:
+        group_delegation_invalidate_on_commit(group_id=group.id)
+
+    return len(new_user_ids) + reactivated
+
+
 def group_user_update(*, user: int, group: int, fetched_by: int, data) -> GroupUser:
     user_to_update = group_user_permissions(group=group, user=fetched_by)
     non_side_effect_fields = []
@@ -349,6 +405,9 @@ def group_user_delegate_update(*, user_id: int, group_id: int, data):
 
     TagsModel.objects.bulk_create(updated_tags)
 
+    # Tag links were replaced in bulk, without m2m signals
+    group_delegation_invalidate_on_commit(group_id=group_id)
+
 
 def group_user_delegate_remove(*, user_id: int, group_id: int, delegate_pool_id: int) -> None:
     delegator = group_user_permissions(group=group_id, user=user_id)
@@ -0,0 +1,52 @@
+from rest_framework.test import APITransactionTestCase
+
+from flowback.group.models import GroupUserDelegator
+from flowback.group.selectors import group_delegation_graph
+from flowback.group.services import group_user_delegate_update, group_user_delegate_remove
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, GroupUserDelegateFactory, GroupTagsFactory
+
+
+class GroupDelegationGraphTest(APITransactionTestCase):
+    def setUp(self):
+        self.group = GroupFactory()
+        self.group_tag = GroupTagsFactory(group=self.group)
+        self.group_user_creator = GroupUserFactory(group=self.group, user=self.group.created_by)
+        (self.delegator_one,
+         self.delegator_two) = GroupUserFactory.create_batch(2, group=self.group)
+        self.delegate = GroupUserDelegateFactory(group=self.group)
+
+        for delegator in [self.delegator_one, self.delegator_two]:
+            GroupUserDelegator.objects.create(delegator=delegator,
+                                              delegate_pool=self.delegate.pool,
+                                              group=self.group).tags.add(self.group_tag)
+
+    def test_delegation_graph(self):
+        pool, tag = self.delegate.pool, GroupTagsFactory(group=self.group)
+
+        graph = group_delegation_graph(group_id=self.group.id)
+        self.assertEqual(graph.delegations(tag_id=self.group_tag.id),
+                         {pool.id: {self.delegator_one.id, self.delegator_two.id}})
+        self.assertEqual(graph.mandate(tag_id=self.group_tag.id, pool_id=pool.id,
+                                       exclude={self.delegator_two.id}), 1)
+
+        with self.assertNumQueries(0):
+            group_delegation_graph(group_id=self.group.id)
+
+        # Members joining or saved without (de)activating keep the graph
+        GroupUserFactory(group=self.group)
+        self.delegator_two.is_admin = True
+        self.delegator_two.save()
+        self.assertIs(group_delegation_graph(group_id=self.group.id), graph)
+
+        # Bulk tag updates, removals and deactivated members all reach the graph
+        group_user_delegate_update(user_id=self.delegator_one.user_id, group_id=self.group.id,
+                                   data=[dict(delegate_pool_id=pool.id, tags=[tag.id])])
+        graph = group_delegation_graph(group_id=self.group.id)
+        self.assertEqual(graph.delegate_pools(tag_id=tag.id, delegator_id=self.delegator_one.id), {pool.id})
+        self.assertEqual(graph.delegators(tag_id=self.group_tag.id, pool_id=pool.id), {self.delegator_two.id})
+
+        group_user_delegate_remove(user_id=self.delegator_one.user_id, group_id=self.group.id,
+                                   delegate_pool_id=pool.id)
+        self.delegator_two.active = False
+        self.delegator_two.save()
+        self.assertEqual(group_delegation_graph(group_id=self.group.id).pool_delegator_count(pool_id=pool.id), 0)
@@ -1,11 +1,15 @@
+import io
 import json
 from pprint import pprint
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from rest_framework.test import APIRequestFactory, force_authenticate, APITransactionTestCase
 
 from flowback.group.models import GroupUser, Group, GroupUserInvite
 from flowback.group.tests.factories import GroupFactory, GroupUserFactory
+from flowback.poll.models import Poll
+from flowback.poll.tests.factories import PollFactory
 from flowback.group.views.group import GroupListApi, GroupCreateApi
 from flowback.group.views.user import GroupInviteApi, GroupJoinApi, GroupInviteAcceptApi, GroupInviteListApi
 from flowback.user.models import User
@@ -160,3 +164,48 @@ class GroupTest(APITransactionTestCase):
             response = view(request, group=group_user.group)
 
             self.assertTrue(bool(response.data.get('results')) == allowed)
+
+
+class GroupCounterTest(APITransactionTestCase):
+    def setUp(self):
+        self.group = GroupFactory()
+        self.group_user_creator = GroupUserFactory(group=self.group, user=self.group.created_by)
+        (self.group_user_one,
+         self.group_user_two,
+         self.group_user_three) = GroupUserFactory.create_batch(3, group=self.group)
+        (self.poll_one,
+         self.poll_two,
+         self.poll_three) = [PollFactory(created_by=x) for x in [self.group_user_creator, self.group_user_one,
+                                                                 self.group_user_two]]
+
+    def test_group_counters(self):
+        self.group.refresh_from_db()
+        self.assertEqual((self.group.member_count, self.group.poll_count, self.group.open_poll_count), (4, 3, 3))
+
+        self.group_user_one.active = False
+        self.group_user_one.save()
+        self.poll_one.status = 1
+        self.poll_one.save()
+        self.poll_one.save()
+        self.poll_two.delete()
+
+        # Closed from an instance loaded from the database
+        poll_three = Poll.objects.get(id=self.poll_three.id)
+        poll_three.status = 1
+        poll_three.save()
+        PollFactory(created_by=self.group_user_three)
+
+        self.group.refresh_from_db()
+        counters = (self.group.member_count, self.group.active_member_count,
+                    self.group.poll_count, self.group.open_poll_count)
+        self.assertEqual(counters, (4, 3, 3, 1))
+
+        # The repair command recounts drifted groups only
+        Group.objects.filter(id=self.group.id).update(member_count=10, open_poll_count=5)
+        out = io.StringIO()
+        call_command('group_counters_repair', stdout=out)
+
+        self.group.refresh_from_db()
+        self.assertEqual((self.group.member_count, self.group.active_member_count,
+                          self.group.poll_count, self.group.open_poll_count), counters)
+        self.assertIn('Repaired 1 group(s)', out.getvalue())
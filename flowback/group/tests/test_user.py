@@ -2,7 +2,14 @@ import json
 
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate, APITransactionTestCase
-from .factories import GroupFactory, GroupUserFactory, GroupUserDelegateFactory
+from .factories import GroupFactory, GroupUserFactory, GroupUserDelegateFactory, GroupPermissionsFactory
+from flowback.chat.models import MessageChannelParticipant
+from flowback.kanban.models import KanbanSubscription
+from flowback.user.tests.factories import UserFactory
+from ..models import GroupUser
+from ..selectors import group_user_permissions, group_user_permissions_cache, group_membership_get, \
+    group_delegation_graph
+from ..services import group_user_bulk_create
 from ..views.user import GroupUserListApi
 
 
@@ -34,3 +41,98 @@ class GroupUserTest(APITransactionTestCase):
         self.assertEqual(data['results'][1].get('is_delegate'), True)
         self.assertEqual(data['results'][2].get('is_delegate'), False)
         self.assertEqual(data['results'][3].get('is_delegate'), False)
+
+    def test_group_user_permissions_cache(self):
+        user, group = self.group_user_one.user, self.group
+
+        with group_user_permissions_cache():
+            with self.assertNumQueries(1):
+                group_user = group_user_permissions(user=user.id, group=group.id, permissions=['create_poll'])
+                group_user_permissions(user=user, group=group, permissions=['allow_vote', 'admin'])
+                group_user_permissions(group_user=group_user.id)
+                self.assertFalse(group_user_permissions(group_user=group_user, permissions=['admin'],
+                                                        raise_exception=False))
+
+            # Saving a group user drops the cached permissions
+            group_user.is_admin = True
+            group_user.save()
+            self.assertEqual(group_user_permissions(user=user, group=group, permissions=['admin']), group_user)
+
+    def test_group_user_permission_bitmask(self):
+        role = GroupPermissionsFactory(author=self.group, allow_vote=False, create_poll=True)
+        self.group_user_one.permission = role
+        self.group_user_one.save()
+
+        self.assertTrue(self.group_user_one.check_permission(allow_vote=False, create_poll=True))
+        self.assertFalse(group_user_permissions(group_user=self.group_user_one, permissions=['allow_vote'],
+                                                raise_exception=False))
+
+        def voters():
+            return {group_user for group_user in GroupUser.objects.filter(group=self.group)
+                    if group_user.check_permission(allow_vote=True)}
+
+        self.assertNotIn(self.group_user_one, voters())
+        self.assertIn(self.group_user_two, voters())
+
+        # Updating the role reaches its members, deleting it falls back to the group default
+        role.allow_vote = True
+        role.save(update_fields=['allow_vote'])
+        self.assertIn(self.group_user_one, voters())
+
+        role.allow_vote = False
+        role.save()
+        role.delete()
+        self.assertIn(self.group_user_one, voters())
+
+    def test_group_membership_cache(self):
+        user_id, group_id = self.group_user_one.user_id, self.group.id
+
+        group_membership_get(user_id=user_id, group_id=group_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(group_membership_get(user_id=user_id, group_id=group_id)['id'], self.group_user_one.id)
+            group_user_permissions(user=user_id, group=group_id, permissions=['allow_vote'])
+
+        # Members leaving and roles changing reach the cache through signals
+        role = GroupPermissionsFactory(author=self.group, allow_vote=False)
+        self.group_user_two.permission = role
+        self.group_user_two.save()
+        self.assertFalse(group_user_permissions(user=self.group_user_two.user_id, group=group_id,
+                                                permissions=['allow_vote'], raise_exception=False))
+
+        role.allow_vote = True
+        role.save()
+        self.assertTrue(group_user_permissions(user=self.group_user_two.user_id, group=group_id,
+                                               permissions=['allow_vote'], raise_exception=False))
+
+        self.group_user_one.delete()
+        self.assertIsNone(group_membership_get(user_id=user_id, group_id=group_id))
+
+
+    def test_group_user_bulk_create(self):
+        users = [UserFactory() for _ in range(20)]
+        self.group_user_two.active = False
+        self.group_user_two.save()
+        self.group.refresh_from_db()
+
+        self.assertIsNone(group_membership_get(user_id=users[0].id, group_id=self.group.id))
+        graph = group_delegation_graph(group_id=self.group.id)
+
+        user_ids = [user.id for user in users] + [self.group_user_one.user_id, self.group_user_two.user_id]
+        with self.assertNumQueries(12):
+            added = group_user_bulk_create(group=self.group.id, user_ids=user_ids)
+
+        self.assertEqual(added, 21)
+        self.assertEqual(GroupUser.objects.filter(group=self.group, active=True).count(), 24)
+        self.assertEqual(MessageChannelParticipant.objects.filter(channel_id=self.group.chat_id,
+                                                                  user__in=users).count(), 20)
+        self.assertEqual(KanbanSubscription.objects.filter(target_id=self.group.kanban_id,
+                                                           kanban__user__in=users).count(), 20)
+
+        member_count, active_member_count = self.group.member_count, self.group.active_member_count
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.member_count, member_count + 20)
+        self.assertEqual(self.group.active_member_count, active_member_count + 21)
+        self.assertTrue(group_user_permissions(user=users[0].id, group=self.group.id, permissions=['allow_vote']))
+
+        # None of the members added are delegators
+        self.assertIs(group_delegation_graph(group_id=self.group.id), graph)
@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
 
 from flowback.group.models import GroupUserDelegator, GroupTags
-from flowback.group.selectors import group_user_delegate_list, group_user_delegate_pool_list
+from flowback.group.selectors import group_user_delegate_list, group_user_delegate_pool_list, group_delegation_graph
 from flowback.group.serializers import GroupUserSerializer
 from flowback.group.services import group_user_delegate, group_user_delegate_update, group_user_delegate_remove, \
     group_user_delegate_pool_create, group_user_delegate_pool_delete
@@ -27,6 +27,10 @@ class GroupUserDelegatePoolListApi(APIView):
         delegates = Delegates(many=True,
                               source='groupuserdelegate_set',
                               read_only=True)
+        delegator_count = serializers.SerializerMethodField()
+
+        def get_delegator_count(self, obj):
+            return group_delegation_graph(group_id=obj.group_id).pool_delegator_count(pool_id=obj.id)
 
     def get(self, request, group: int):
         filter_serializer = self.FilterSerializer(data=request.query_params)
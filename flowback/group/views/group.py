@@ -92,6 +92,9 @@ class GroupDetailApi(APIView):
                       'image',
                       'cover_image',
                       'member_count',
+                      'active_member_count',
+                      'poll_count',
+                      'open_poll_count',
                       'chat_id',
                       'jitsi_room')
 
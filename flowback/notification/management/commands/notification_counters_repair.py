@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flowback.notification.models import Notification, NotificationUnreadCount
+from flowback.notification.services import notification_unread_count_update
+
+
+# Recounts the unread counters that fan-out and mark read keep, for when notifications were changed
+# without the notification services (bulk updates, raw SQL or restored backups)
+class Command(BaseCommand):
+    help = 'Recount unread notification counters of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', help='Only repair the given user ids')
+
+    def handle(self, *args, **options):
+        unread = Notification.objects.filter(read=False, notification_object__timestamp__lte=timezone.now())
+        if options['user']:
+            unread = unread.filter(user_id__in=options['user'])
+
+        # Counters missing for unread notifications are created first
+        NotificationUnreadCount.objects.bulk_create(
+            [NotificationUnreadCount(user_id=user_id, category=category)
+             for user_id, category in unread.values_list('user_id', 'notification_object__channel__category'
+                                                          ).distinct().iterator()],
+            ignore_conflicts=True)
+
+        repaired = notification_unread_count_update(user_ids=options['user'])
+        self.stdout.write(f'Repaired {repaired} counter(s)')
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+# Targeted notifications only have the target's Notification row, broadcasts one per subscriber at the time
+def pre_populate_targeted(apps, schema_editor):
+    NotificationObject = apps.get_model('notification', 'notificationobject')
+    NotificationSubscription = apps.get_model('notification', 'notificationsubscription')
+
+    NotificationObject.objects.annotate(
+        notifications=models.Count('notification', distinct=True),
+        subscribers=models.Subquery(NotificationSubscription.objects.filter(channel=models.OuterRef('channel')
+                                                                            ).values('channel').annotate(
+            count=models.Count('id')).values('count'))
+    ).filter(notifications=1, subscribers__gt=1).update(targeted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0002_notificationobject_related_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationsubscription',
+            name='read_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationobject',
+            name='targeted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(pre_populate_targeted, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notificationobject',
+            index=models.Index(fields=['channel', 'timestamp'], name='notificatio_channel_f4b302_idx'),
+        ),
+    ]
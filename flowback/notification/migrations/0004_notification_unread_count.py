@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def pre_populate_unread_counts(apps, schema_editor):
+    Notification = apps.get_model('notification', 'notification')
+    NotificationUnreadCount = apps.get_model('notification', 'notificationunreadcount')
+
+    unread = Notification.objects.filter(read=False, notification_object__timestamp__lte=django.utils.timezone.now()
+                                         ).values('user_id', 'notification_object__channel__category'
+                                                  ).annotate(count=models.Count('id')).order_by()
+
+    NotificationUnreadCount.objects.bulk_create([NotificationUnreadCount(
+        user_id=row['user_id'],
+        category=row['notification_object__channel__category'],
+        unread=row['count']) for row in unread.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notification', '0003_notification_inbox_read_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationUnreadCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.CharField(max_length=255)),
+                ('unread', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'category')},
+            },
+        ),
+        migrations.RunPython(pre_populate_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Due notifications were fanned out by their scheduled task already, targeted ones have their notification
+def pre_populate_fanned_out(apps, schema_editor):
+    NotificationObject = apps.get_model('notification', 'notificationobject')
+    Notification = apps.get_model('notification', 'notification')
+
+    NotificationObject.objects.filter(models.Q(timestamp__lte=django.utils.timezone.now())
+                                      | models.Exists(Notification.objects.filter(
+                                          notification_object=models.OuterRef('id')))).update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0004_notification_unread_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationobject',
+            name='fanned_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(pre_populate_fanned_out, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notificationobject',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['timestamp'], name='notification_fan_out_idx'),
+        ),
+    ]
@@ -22,16 +22,29 @@ class NotificationObject(BaseModel):
     message = models.TextField()
     timestamp = models.DateTimeField(default=timezone.now)
     channel = models.ForeignKey(NotificationChannel, on_delete=models.CASCADE)
+    # Sent to one user only, who gets it through their Notification row rather than the channel
+    targeted = models.BooleanField(default=False)
+    # Push inbox: whether the channel subscribers got their notifications, see notification_fan_out_process
+    fanned_out = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['channel', 'timestamp']),
+                   models.Index(fields=['timestamp'], condition=models.Q(fanned_out=False),
+                                name='notification_fan_out_idx')]
 
 
 class NotificationSubscription(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     channel = models.ForeignKey(NotificationChannel, on_delete=models.CASCADE)
+    # Pull inbox: notifications in the channel up to this timestamp are read
+    read_until = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('user', 'channel')
 
 
+# Push inbox: one per subscriber of the channel.
+# Pull inbox: only targeted notifications and read state set by the user, overriding the channel read cursor
 class Notification(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     notification_object = models.ForeignKey(NotificationObject, on_delete=models.CASCADE)
@@ -39,3 +52,14 @@ class Notification(BaseModel):
 
     class Meta:
         unique_together = ('user', 'notification_object')
+
+
+# Push inbox: unread notifications of the user per channel category, kept by fan-out and mark read.
+# Repaired by the notification_counters_repair command
+class NotificationUnreadCount(BaseModel):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=255)
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'category')
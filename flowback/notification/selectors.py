@@ -1,7 +1,15 @@
+from collections import Counter
+
 import django_filters
+from django.db.models import Q, F, OuterRef, Subquery, Case, When, Value, BooleanField, IntegerField, QuerySet, \
+    Count
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from .models import NotificationChannel, NotificationObject, Notification, NotificationSubscription
+from backend.settings import FLOWBACK_NOTIFICATION_INBOX
+
+from .models import NotificationChannel, NotificationObject, Notification, NotificationSubscription, \
+    NotificationUnreadCount
 from ..user.models import User
 
 
@@ -34,13 +42,190 @@ class BaseNotificationSubscriptionFilter(django_filters.FilterSet):
     channel_category = django_filters.CharFilter(field_name='channel__category')
 
 
+class BaseNotificationInboxFilter(django_filters.FilterSet):
+    object_id = django_filters.NumberFilter(field_name='id')
+    read = django_filters.BooleanFilter()
+    message = django_filters.CharFilter(lookup_expr='iexact')
+    message__icontains = django_filters.CharFilter(field_name='message', lookup_expr='icontains')
+    timestamp__lt = django_filters.DateFilter(field_name='timestamp', lookup_expr='lt')
+    timestamp__gt = django_filters.DateFilter(field_name='timestamp', lookup_expr='gt')
+
+    channel_sender_type = django_filters.CharFilter(field_name='channel__sender_type')
+    channel_sender_id = django_filters.NumberFilter(field_name='channel__sender_id')
+
+    channel_sender_category = django_filters.CharFilter(field_name='channel__category')
+
+    class Meta:
+        model = NotificationObject
+        fields = dict(id=['exact'],
+                      action=['exact'])
+
+
+# Pull inbox, merges the notification objects of the user's subscribed channels (from the time they subscribed)
+# with the ones the user has a Notification row for, which are the only way targeted notifications come in.
+# Each channel is one range over the (channel, timestamp) index. Read state comes from the user's
+# Notification row when there is one, otherwise from the channel read cursor
+def notification_inbox_list(*, user: User, filters=None):
+    filters = filters or {}
+    subscriptions = NotificationSubscription.objects.filter(user=user).values_list('channel_id',
+                                                                                    'created_at',
+                                                                                    'read_until')
+    overrides = Notification.objects.filter(user=user)
+
+    query = Q(id__in=overrides.values('notification_object_id'))
+    read_cursors = []
+
+    for channel_id, subscribed_at, read_until in subscriptions:
+        query |= Q(channel_id=channel_id, timestamp__gte=subscribed_at, targeted=False)
+
+        if read_until:
+            read_cursors.append(When(channel_id=channel_id, timestamp__lte=read_until, then=Value(True)))
+
+    qs = NotificationObject.objects.filter(query, timestamp__lte=timezone.now()).annotate(
+        read=Coalesce(Subquery(overrides.filter(notification_object=OuterRef('id')).values('read')),
+                      Case(*read_cursors, default=Value(False), output_field=BooleanField()))
+    ).order_by('timestamp')
+
+    return BaseNotificationInboxFilter(filters, qs).qs
+
+
+# Unread notifications of the pull inbox, as listed by notification_inbox_list. Subscribed channels are only
+# read past their read cursor, other notifications are unread when the user's Notification row says so
+def notification_inbox_unread_list(*, user: User):
+    subscriptions = NotificationSubscription.objects.filter(user=user).values_list('channel_id',
+                                                                                    'created_at',
+                                                                                    'read_until')
+    overrides = Notification.objects.filter(user=user)
+
+    query = Q(id__in=overrides.filter(read=False).values('notification_object_id'))
+
+    for channel_id, subscribed_at, read_until in subscriptions:
+        query |= Q(channel_id=channel_id, timestamp__gte=subscribed_at, targeted=False,
+                   **(dict(timestamp__gt=read_until) if read_until else {}))
+
+    return NotificationObject.objects.filter(query, timestamp__lte=timezone.now()).exclude(
+        id__in=overrides.filter(read=True).values('notification_object_id'))
+
+
+class BaseNotificationVirtualFilter(django_filters.FilterSet):
+    # Virtual notifications aren't stored, so never match ids
+    id = django_filters.NumberFilter(method='filter_stored')
+    object_id = django_filters.NumberFilter(method='filter_stored')
+    read = django_filters.BooleanFilter(field_name='virtual_read')
+    message = django_filters.CharFilter(field_name='virtual_message', lookup_expr='iexact')
+    message__icontains = django_filters.CharFilter(field_name='virtual_message', lookup_expr='icontains')
+    action = django_filters.CharFilter(field_name='virtual_action')
+    timestamp__lt = django_filters.DateFilter(field_name='virtual_timestamp', lookup_expr='lt')
+    timestamp__gt = django_filters.DateFilter(field_name='virtual_timestamp', lookup_expr='gt')
+
+    channel_sender_id = django_filters.NumberFilter(field_name='virtual_sender_id')
+
+    def filter_stored(self, queryset, name, value):
+        return queryset.none()
+
+
+# Notifications derived from other models at read time instead of being stored, by (sender_type, category).
+# A source gets the user's subscriptions to its channels and returns querysets annotated with
+# virtual_channel_id, virtual_sender_id, virtual_message, virtual_timestamp and virtual_action
+notification_virtual_sources = {}
+
+
+def notification_virtual_list(*, user: User, filters=None) -> list[QuerySet]:
+    filters = filters or {}
+    querysets = []
+
+    for (sender_type, category), source in notification_virtual_sources.items():
+        # Sources are per channel sender type and category, skip the ones filtered out
+        if filters.get('channel_sender_type', sender_type) != sender_type \
+                or filters.get('channel_sender_category', category) != category:
+            continue
+
+        subscriptions = NotificationSubscription.objects.filter(user=user,
+                                                                channel__sender_type=sender_type,
+                                                                channel__category=category)
+        subscription = subscriptions.filter(channel_id=OuterRef('virtual_channel_id'))
+
+        for qs in source(subscriptions=subscriptions):
+            qs = qs.filter(virtual_timestamp__lte=timezone.now(),
+                           virtual_timestamp__gte=Subquery(subscription.values('created_at'))).annotate(
+                virtual_read=Case(When(virtual_timestamp__lte=Subquery(subscription.values('read_until')),
+                                       then=Value(True)),
+                                  default=Value(False),
+                                  output_field=BooleanField()))
+
+            # Selected in the same order as the stored notifications for the union
+            querysets.append(BaseNotificationVirtualFilter(filters, qs).qs.values(
+                notification_id=Value(None, output_field=IntegerField()),
+                object_id=Value(None, output_field=IntegerField()),
+                notification_message=F('virtual_message'),
+                notification_timestamp=F('virtual_timestamp'),
+                notification_action=F('virtual_action'),
+                notification_channel_id=F('virtual_channel_id'),
+                channel_sender_id=F('virtual_sender_id'),
+                channel_sender_type=Value(sender_type),
+                channel_category=Value(category),
+                notification_read=F('virtual_read')))
+
+    return querysets
+
+
+# The user's notifications, stored ones (per user, or from subscribed channels with a pull inbox)
+# merged with virtual ones, ordered by timestamp
 def notification_list(*, user: User, filters=None):
     filters = filters or {}
-    qs = Notification.objects.filter(user=user,
-                                     notification_object__timestamp__lte=timezone.now()) \
-        .order_by('notification_object__timestamp').all()
 
-    return BaseNotificationFilter(filters, qs).qs
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        qs = notification_inbox_list(user=user, filters=filters).values(
+            notification_id=F('id'),
+            object_id=F('id'),
+            notification_message=F('message'),
+            notification_timestamp=F('timestamp'),
+            notification_action=F('action'),
+            notification_channel_id=F('channel_id'),
+            channel_sender_id=F('channel__sender_id'),
+            channel_sender_type=F('channel__sender_type'),
+            channel_category=F('channel__category'),
+            notification_read=F('read'))
+
+    else:
+        qs = Notification.objects.filter(user=user, notification_object__timestamp__lte=timezone.now())
+        qs = BaseNotificationFilter(filters, qs).qs.values(
+            notification_id=F('id'),
+            object_id=F('notification_object_id'),
+            notification_message=F('notification_object__message'),
+            notification_timestamp=F('notification_object__timestamp'),
+            notification_action=F('notification_object__action'),
+            notification_channel_id=F('notification_object__channel_id'),
+            channel_sender_id=F('notification_object__channel__sender_id'),
+            channel_sender_type=F('notification_object__channel__sender_type'),
+            channel_category=F('notification_object__channel__category'),
+            notification_read=F('read'))
+
+    return qs.order_by().union(*notification_virtual_list(user=user, filters=filters),
+                               all=True).order_by('notification_timestamp')
+
+
+# Unread notifications of the user, in total and per channel category. Push inboxes read the counters kept by
+# fan-out and mark read, pull inboxes count their unread notifications. Virtual notifications are counted as
+# listed, every source counted by the database in the same query
+def notification_unread_count(*, user: User) -> dict:
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        qs = notification_inbox_unread_list(user=user).order_by().values(
+            channel_category=F('channel__category')).annotate(count=Count('id'))
+
+    else:
+        qs = NotificationUnreadCount.objects.filter(user=user, unread__gt=0).values(channel_category=F('category'),
+                                                                                   count=F('unread'))
+
+    virtual = [virtual_qs.values('channel_category').annotate(count=Count('*'))
+               for virtual_qs in notification_virtual_list(user=user, filters=dict(read=False))]
+
+    categories = Counter()
+    for row in qs.union(*virtual, all=True):
+        if row['count']:
+            categories[row['channel_category']] += row['count']
+
+    return dict(total=sum(categories.values()), categories=dict(categories))
 
 
 def notification_subscription_list(*, user: User, filters=None):
@@ -1,11 +1,17 @@
+from collections import Counter
 from datetime import datetime
-from typing import Union
+from typing import Union, Callable
 
-from django.db.models import F
+from django.db import transaction
+from django.db.models import F, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from .models import NotificationChannel, NotificationObject, Notification, NotificationSubscription
+from backend.settings import FLOWBACK_NOTIFICATION_INBOX
+from .models import NotificationChannel, NotificationObject, Notification, NotificationSubscription, \
+    NotificationUnreadCount
+from .selectors import notification_inbox_list, notification_virtual_sources
 from flowback.common.services import get_object
 
 
@@ -28,10 +34,47 @@ def notification_load_channel(*,
 def notification_delete_channel(*, sender_type: str, sender_id: int, category: str = None) -> None:
     channels = NotificationChannel.objects.filter(sender_type=sender_type, sender_id=sender_id,
                                                   category=category).all()
+    user_ids = list(Notification.objects.filter(notification_object__channel__in=channels,
+                                                read=False).values_list('user_id', flat=True).distinct())
     channels.delete()
+    notification_unread_count_update(user_ids=user_ids, categories=[category] if category else None)
     return
 
 
+# Adds amount to the unread counters of the users in the category, creating the missing counters.
+# Counters are only kept for push inboxes
+def notification_unread_count_add(*, user_ids: list[int], category: str, amount: int = 1) -> None:
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        return
+
+    NotificationUnreadCount.objects.bulk_create([NotificationUnreadCount(user_id=user_id, category=category)
+                                                 for user_id in user_ids], ignore_conflicts=True)
+    NotificationUnreadCount.objects.filter(user_id__in=user_ids,
+                                           category=category).update(unread=F('unread') + amount)
+
+
+# Recounts the unread counters of the users (default all) in the categories (default all) from their
+# due notifications, only updating the ones that drifted. Returns the amount of counters updated
+def notification_unread_count_update(*, user_ids: list[int] = None, categories: list[str] = None) -> int:
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        return 0
+
+    counters = NotificationUnreadCount.objects.all()
+    if user_ids is not None:
+        counters = counters.filter(user_id__in=user_ids)
+
+    if categories is not None:
+        counters = counters.filter(category__in=categories)
+
+    unread = Coalesce(Subquery(Notification.objects.filter(user=OuterRef('user'),
+                                                           read=False,
+                                                           notification_object__channel__category=OuterRef('category'),
+                                                           notification_object__timestamp__lte=timezone.now())
+                               .values('user').annotate(count=Count('id')).values('count')), 0)
+
+    return counters.alias(actual_unread=unread).exclude(unread=F('actual_unread')).update(unread=unread)
+
+
 # tag (Action), sender_type (Name), sender_id (identifier)
 # Notification subscription handled outside, notification management handled inside
 def notification_create(*, action: str, category: str, sender_type: str, sender_id: int,
@@ -39,23 +82,24 @@ def notification_create(*, action: str, category: str, sender_type: str, sender_
                         target_user_id: int = None) -> NotificationObject:
     channel = notification_load_channel(category=category, sender_type=sender_type, sender_id=sender_id)
     timestamp = timestamp or timezone.now()
+
+    # Channels may have any amount of subscribers, their notifications are created by the celery beat fan-out
+    # once due, counting them as unread from then on. Pull inboxes read the channel instead
     notification_object = NotificationObject.objects.create(channel=channel,
                                                             action=action,
                                                             message=message,
                                                             timestamp=timestamp,
-                                                            related_id=related_id)
+                                                            related_id=related_id,
+                                                            targeted=bool(target_user_id),
+                                                            fanned_out=bool(target_user_id)
+                                                            or FLOWBACK_NOTIFICATION_INBOX == 'pull')
 
-    if not target_user_id:
-        subscribers = NotificationSubscription.objects.filter(channel=channel).all()
-        Notification.objects.bulk_create([Notification(user=subscriber.user,
-                                                       notification_object=notification_object)
-                                          for subscriber in subscribers])
-
-    else:
+    if target_user_id:
         notification = Notification(user_id=target_user_id,
                                     notification_object=notification_object)
         notification.full_clean()
         notification.save()
+        notification_unread_count_add(user_ids=[target_user_id], category=category)
 
     return notification_object
 
@@ -82,13 +126,83 @@ def notification_delete(*, category: str, sender_type: str, sender_id: int,
     filters = {a: b for a, b in dict(channel=channel, action=action, related_id=related_id, timestamp=timestamp,
                                      timestamp__lt=timestamp__lt, timestamp__gt=timestamp__gt).items() if b is not None}
     notifications = NotificationObject.objects.filter(**filters)
+    user_ids = list(Notification.objects.filter(notification_object__in=notifications,
+                                                read=False).values_list('user_id', flat=True).distinct())
 
     notifications.delete()
+    notification_unread_count_update(user_ids=user_ids, categories=[category])
 
 
+# Push inboxes update the user's notifications. Pull inboxes take notification object ids
+# and store the read state as the user's Notification rows, overriding the channel read cursor
 def notification_mark_read(*, fetched_by: int, notification_ids: list[int], read: bool) -> Notification:
-    notifications = Notification.objects.filter(user_id=fetched_by, id__in=notification_ids).update(read=read)
-    return notifications
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        object_ids = notification_inbox_list(user=fetched_by).filter(id__in=notification_ids
+                                                                      ).values_list('id', flat=True)
+        return Notification.objects.bulk_create([Notification(user_id=fetched_by,
+                                                               notification_object_id=object_id,
+                                                               read=read)
+                                                 for object_id in object_ids],
+                                                update_conflicts=True,
+                                                unique_fields=['user', 'notification_object'],
+                                                update_fields=['read', 'updated_at'])
+
+    # Locked so that concurrent requests don't count the same notifications twice
+    with transaction.atomic():
+        notifications = list(Notification.objects.select_for_update(of=('self',)).filter(
+            user_id=fetched_by, id__in=notification_ids
+        ).exclude(read=read).values_list('id', 'notification_object__channel__category'))
+
+        Notification.objects.filter(id__in=[notification_id for notification_id, category in notifications]
+                                    ).update(read=read)
+
+        for category, count in Counter(category for notification_id, category in notifications).items():
+            notification_unread_count_add(user_ids=[fetched_by], category=category, amount=-count if read else count)
+
+    return len(notifications)
+
+
+# Marks every notification in the channel up to the timestamp (default now) as read. The subscription's read
+# cursor covers pull inboxes and virtual notifications, stored notifications are updated
+def notification_channel_mark_read(*, user_id: int, category: str, sender_type: str, sender_id: int,
+                                   timestamp: datetime = None) -> None:
+    channel = notification_load_channel(category=category,
+                                        sender_type=sender_type,
+                                        sender_id=sender_id,
+                                        create_if_not_exist=False)
+    timestamp = timestamp or timezone.now()
+    subscription = get_object(NotificationSubscription, 'User is not subscribed', user_id=user_id, channel=channel)
+    subscription.read_until = max(subscription.read_until or timestamp, timestamp)
+    subscription.save(update_fields=['read_until', 'updated_at'])
+
+    notifications = Notification.objects.filter(user_id=user_id,
+                                                notification_object__channel=channel,
+                                                notification_object__timestamp__lte=timestamp)
+
+    # Pull inbox overrides up to the cursor are covered by it now, targeted notifications keep their row
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        notifications.filter(notification_object__timestamp__gte=subscription.created_at).delete()
+
+    notifications.update(read=True)
+    notification_unread_count_update(user_ids=[user_id], categories=[category])
+
+
+# Marks every notification of the user up to the timestamp (default now) as read, or the ones in a channel
+# category. Moves the read cursors of the subscriptions forward and updates the stored notifications at once
+def notification_mark_all_read(*, user_id: int, category: str = None, timestamp: datetime = None) -> None:
+    timestamp = timestamp or timezone.now()
+    filters = dict(channel__category=category) if category else {}
+
+    NotificationSubscription.objects.filter(user_id=user_id, **filters).update(
+        read_until=Greatest(Coalesce('read_until', Value(timestamp)), Value(timestamp)))
+
+    Notification.objects.filter(user_id=user_id,
+                                read=False,
+                                notification_object__timestamp__lte=timestamp,
+                                **{f'notification_object__{key}': value for key, value in filters.items()}
+                                ).update(read=True)
+
+    notification_unread_count_update(user_ids=[user_id], categories=[category] if category else None)
 
 
 def notification_channel_subscribe(*,
@@ -103,13 +217,10 @@ def notification_channel_subscribe(*,
     get_object(NotificationSubscription, user_id=user_id, channel=channel,
                error_message='User is already subscribed', reverse=True)
     subscription = NotificationSubscription(user_id=user_id, channel=channel)
-    future_notifications = [Notification(user_id=user_id, notification_object=notification_object)
-                            for notification_object
-                            in NotificationObject.objects.filter(channel=channel,
-                                                                 timestamp__gte=timezone.now()).all()]
-    Notification.objects.bulk_create(future_notifications)
     subscription.full_clean()
     subscription.save()
+
+    # Notifications that aren't due yet reach the new subscriber when they're fanned out
     return subscription
 
 
@@ -133,13 +244,18 @@ class NotificationManager:
         update = 'update'
         delete = 'delete'
 
-    def __init__(self, sender_type: str, possible_categories: list[str]):
+    # virtual_categories maps categories to their virtual notification source (see notification_virtual_sources)
+    def __init__(self, sender_type: str, possible_categories: list[str],
+                 virtual_categories: dict[str, Callable] = None):
         self.sender_type = sender_type
         self.possible_categories = possible_categories
 
+        for category, source in (virtual_categories or {}).items():
+            notification_virtual_sources[(sender_type, category)] = source
+
     def category_is_possible(self, category: Union[str, list[str], set[str]], validation: bool = False):
         categories, failed_categories = [[]]*2
-        if isinstance(category, set):
+        if isinstance(category, (set, list)):
             categories = list(category)
         elif isinstance(category, str):
             categories = [category]
@@ -1,3 +1,85 @@
+import logging
+from itertools import islice
+
+from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from backend.settings import FLOWBACK_NOTIFICATION_INBOX, FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL
+from flowback.notification.models import Notification, NotificationSubscription, NotificationObject
+
+logger = logging.getLogger(__name__)
+
+# Creates the notifications of a due notification object for every subscriber of its channel, streaming
+# subscribers and inserting them chunk_size at a time along with their unread counters. Only the notifications
+# inserted are counted, so running it again for the same object is harmless. Deleted notification objects
+# and ones that aren't due yet are ignored
+@shared_task
+def notification_fan_out(notification_object_id: int, chunk_size: int = 1000):
+    from flowback.notification.services import notification_unread_count_add
+
+    category = NotificationObject.objects.filter(id=notification_object_id, timestamp__lte=timezone.now()
+                                                 ).values_list('channel__category', flat=True).first()
+    if category is None:
+        return
+
+    subscribers = NotificationSubscription.objects.filter(
+        channel__notificationobject=notification_object_id
+    ).exclude(
+        user__notification__notification_object_id=notification_object_id
+    ).order_by('id').values_list('user_id', flat=True).iterator(chunk_size=chunk_size)
+
+    while chunk := list(islice(subscribers, chunk_size)):
+        with transaction.atomic():
+            # Locked so that concurrent fan-outs of the object don't count the same subscribers twice
+            if not list(NotificationObject.objects.select_for_update().filter(id=notification_object_id
+                                                                              ).values_list('id', flat=True)):
+                return
+
+            notified = set(Notification.objects.filter(notification_object_id=notification_object_id,
+                                                       user_id__in=chunk).values_list('user_id', flat=True))
+            chunk = [user_id for user_id in chunk if user_id not in notified]
+
+            Notification.objects.bulk_create([Notification(user_id=user_id,
+                                                           notification_object_id=notification_object_id)
+                                              for user_id in chunk])
+            notification_unread_count_add(user_ids=chunk, category=category)
+
+    NotificationObject.objects.filter(id=notification_object_id).update(fanned_out=True)
+
+
+# Runs on celery beat every FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL seconds. Fans out the channel notifications
+# that became due, oldest first. Timestamps are read on every tick, so shifted and deleted notifications
+# need no task bookkeeping. A failing fan-out is logged and retried on the next tick
+@shared_task
+def notification_fan_out_process(batch_size: int = 100, chunk_size: int = 1000):
+    if FLOWBACK_NOTIFICATION_INBOX == 'pull':
+        return
+
+    # Overlapping ticks would only contend for the same notifications
+    if not cache.add('notification_fan_out_running', True, timeout=FLOWBACK_NOTIFICATION_FAN_OUT_INTERVAL * 10):
+        return
+
+    try:
+        handled = []
+
+        while notification_object_ids := list(NotificationObject.objects.filter(
+                fanned_out=False, timestamp__lte=timezone.now()
+        ).exclude(id__in=handled).order_by('timestamp').values_list('id', flat=True)[:batch_size]):
+            for notification_object_id in notification_object_ids:
+                try:
+                    notification_fan_out(notification_object_id, chunk_size=chunk_size)
+
+                except Exception:
+                    logger.exception('Fan-out of notification object %s failed', notification_object_id)
+
+            handled += notification_object_ids
+
+    finally:
+        cache.delete('notification_fan_out_running')
+
+
 # TODO Fix
 # import json
 #
@@ -1,3 +1,162 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.utils import timezone
+
+from rest_framework.test import APITransactionTestCase, APIRequestFactory, force_authenticate
+
+from flowback.notification.models import Notification, NotificationSubscription, NotificationUnreadCount, \
+    NotificationObject
+from flowback.notification.selectors import notification_inbox_list, notification_unread_count
+from flowback.notification.services import notification_create, notification_load_channel, notification_mark_read, \
+    notification_channel_subscribe, notification_channel_mark_read, notification_mark_all_read, notification_shift
+from flowback.notification.views import NotificationUnreadCountAPI
+from flowback.notification.tasks import notification_fan_out, notification_fan_out_process
+from flowback.user.tests.factories import UserFactory
+
+
+class NotificationFanOutTest(APITransactionTestCase):
+    def setUp(self):
+        self.channel = notification_load_channel(category='poll', sender_type='group', sender_id=1)
+        self.users = UserFactory.create_batch(5)
+        NotificationSubscription.objects.bulk_create([NotificationSubscription(user=user, channel=self.channel)
+                                                      for user in self.users])
+
+    def test_notification_fan_out(self):
+        # Only the notification object is written by the caller
+        with self.assertNumQueries(2):
+            notification_object = notification_create(action='create', category='poll', sender_type='group',
+                                                      sender_id=1, message='Poll created')
+
+        self.assertFalse(Notification.objects.exists())
+
+        # The notification object, one cursor over the subscribers, per chunk the notifications and unread
+        # counters (BEGIN, SELECT FOR UPDATE, SELECT, INSERT, INSERT, UPDATE, COMMIT) and marking it fanned out
+        with self.assertNumQueries(2 + 3 * 7 + 1):
+            notification_fan_out(notification_object.id, chunk_size=2)
+
+        self.assertEqual(set(Notification.objects.values_list('user_id', flat=True)),
+                         {user.id for user in self.users})
+
+        # Running again (e.g. a retried task) doesn't duplicate notifications or count them twice
+        notification_fan_out(notification_object.id)
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertEqual(list(NotificationUnreadCount.objects.values_list('unread', flat=True).distinct()), [1])
+
+        # Scheduled notifications are fanned out by the beat sweep once due, shifted ones at their new time
+        scheduled = notification_create(action='create', category='poll', sender_type='group', sender_id=1,
+                                        message='Poll started', timestamp=timezone.now() + timezone.timedelta(days=1))
+        notification_fan_out_process()
+        self.assertFalse(Notification.objects.filter(notification_object=scheduled).exists())
+
+        notification_shift(category='poll', sender_type='group', sender_id=1, timestamp=scheduled.timestamp,
+                           delta=-timezone.timedelta(days=2))
+        notification_fan_out_process()
+        self.assertEqual(Notification.objects.filter(notification_object=scheduled).count(), 5)
+        self.assertEqual(list(NotificationUnreadCount.objects.values_list('unread', flat=True).distinct()), [2])
+        self.assertFalse(NotificationObject.objects.filter(fanned_out=False).exists())
+
+    def test_notification_unread_count(self):
+        user = self.users[0]
+        notification_load_channel(category='poll_schedule', sender_type='group', sender_id=1)
+        notification_channel_subscribe(user_id=user.id, category='poll_schedule', sender_type='group', sender_id=1)
+
+        for category in ('poll', 'poll', 'poll_schedule'):
+            notification_fan_out(notification_create(action='create', category=category, sender_type='group',
+                                                     sender_id=1, message='Poll created').id)
+
+        # Scheduled notifications aren't counted before they're due
+        scheduled = notification_create(action='create', category='poll', sender_type='group', sender_id=1,
+                                        message='Poll started', timestamp=timezone.now() + timezone.timedelta(days=1))
+        notification_fan_out(scheduled.id)
+
+        # Counters and virtual notifications are counted in one query
+        with self.assertNumQueries(1):
+            unread = notification_unread_count(user=user)
+        self.assertEqual(unread, dict(total=3, categories=dict(poll=2, poll_schedule=1)))
+
+        notification_ids = list(Notification.objects.filter(user=user).values_list('id', flat=True))
+        notification_mark_read(fetched_by=user.id, notification_ids=notification_ids[:2], read=True)
+        notification_mark_read(fetched_by=user.id, notification_ids=notification_ids[:2], read=True)
+        self.assertEqual(notification_unread_count(user=user)['total'], 1)
+
+        notification_mark_read(fetched_by=user.id, notification_ids=notification_ids, read=False)
+        notification_mark_all_read(user_id=user.id, category='poll')
+        self.assertEqual(notification_unread_count(user=user), dict(total=1, categories=dict(poll_schedule=1)))
+
+        # Other subscribers keep their counters
+        self.assertEqual(notification_unread_count(user=self.users[1]), dict(total=2, categories=dict(poll=2)))
+
+        notification_mark_all_read(user_id=user.id)
+        self.assertFalse(Notification.objects.filter(user=user, read=False).exists())
+        self.assertTrue(all(NotificationSubscription.objects.filter(user=user).values_list('read_until', flat=True)))
+
+        factory = APIRequestFactory()
+        request = factory.get('')
+        force_authenticate(request, user=user)
+        response = NotificationUnreadCountAPI.as_view()(request)
+        self.assertEqual(response.data, dict(total=0, categories={}))
+
+
+@mock.patch('flowback.notification.services.FLOWBACK_NOTIFICATION_INBOX', 'pull')
+@mock.patch('flowback.notification.selectors.FLOWBACK_NOTIFICATION_INBOX', 'pull')
+class NotificationInboxTest(APITransactionTestCase):
+    def setUp(self):
+        notification_load_channel(category='poll', sender_type='group', sender_id=1)
+        self.user_one, self.user_two = UserFactory.create_batch(2)
+
+        for user in (self.user_one, self.user_two):
+            notification_channel_subscribe(user_id=user.id, category='poll', sender_type='group', sender_id=1)
+
+    @staticmethod
+    def inbox(user):
+        return list(notification_inbox_list(user=user).values_list('id', 'read'))
+
+    def test_notification_inbox(self):
+        poll_created = notification_create(action='create', category='poll', sender_type='group', sender_id=1,
+                                           message='Poll created')
+        invite = notification_create(action='create', category='invite', sender_type='group', sender_id=1,
+                                     message='Invited', target_user_id=self.user_one.id)
+
+        # Nothing is stored per subscriber
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(self.inbox(self.user_one), [(poll_created.id, False), (invite.id, False)])
+        self.assertEqual(self.inbox(self.user_two), [(poll_created.id, False)])
+        self.assertEqual(notification_unread_count(user=self.user_one),
+                         dict(total=2, categories=dict(poll=1, invite=1)))
+
+        notification_mark_read(fetched_by=self.user_one.id, notification_ids=[poll_created.id], read=True)
+        notification_channel_mark_read(user_id=self.user_two.id, category='poll', sender_type='group', sender_id=1)
+        self.assertEqual(self.inbox(self.user_one), [(poll_created.id, True), (invite.id, False)])
+        self.assertEqual(self.inbox(self.user_two), [(poll_created.id, True)])
+
+        # Marking unread overrides the channel read cursor
+        notification_mark_read(fetched_by=self.user_two.id, notification_ids=[poll_created.id], read=False)
+        self.assertEqual(self.inbox(self.user_two), [(poll_created.id, False)])
+
+        # Counted past the read cursors and from the read state set by the user
+        self.assertEqual(notification_unread_count(user=self.user_one), dict(total=1, categories=dict(invite=1)))
+        self.assertEqual(notification_unread_count(user=self.user_two), dict(total=1, categories=dict(poll=1)))
+
+    def test_notification_inbox_targeted(self):
+        broadcast = notification_create(action='create', category='poll', sender_type='group', sender_id=1,
+                                        message='Poll created')
+        targeted = notification_create(action='create', category='poll', sender_type='group', sender_id=1,
+                                       message='Replied to your comment', target_user_id=self.user_one.id)
+
+        # Targeted notifications in a subscribed channel only reach their target
+        self.assertEqual(self.inbox(self.user_one), [(broadcast.id, False), (targeted.id, False)])
+        self.assertEqual(self.inbox(self.user_two), [(broadcast.id, False)])
+        self.assertEqual(notification_unread_count(user=self.user_one), dict(total=2, categories=dict(poll=2)))
+        self.assertEqual(notification_unread_count(user=self.user_two), dict(total=1, categories=dict(poll=1)))
+
+        # Also once the channel read cursor moved past them
+        notification_channel_mark_read(user_id=self.user_two.id, category='poll', sender_type='group', sender_id=1)
+        self.assertEqual(self.inbox(self.user_two), [(broadcast.id, True)])
+        self.assertEqual(notification_unread_count(user=self.user_two), dict(total=0, categories={}))
+
+        # Notifications marked unread count even from before the user (re)subscribed to the channel
+        notification_mark_read(fetched_by=self.user_one.id, notification_ids=[broadcast.id], read=False)
+        NotificationSubscription.objects.filter(user=self.user_one).update(
+            created_at=timezone.now() + timezone.timedelta(minutes=1))
+        self.assertEqual(self.inbox(self.user_one), [(broadcast.id, False), (targeted.id, False)])
+        self.assertEqual(notification_unread_count(user=self.user_one), dict(total=2, categories=dict(poll=2)))
@@ -2,13 +2,19 @@ from django.urls import path
 
 from .views import (NotificationListAPI,
                     NotificationMarkReadAPI,
+                    NotificationChannelMarkReadAPI,
+                    NotificationMarkAllReadAPI,
+                    NotificationUnreadCountAPI,
                     NotificationUnsubscribeAPI,
                     NotificationSubscriptionListAPI)
 
 
 notification_patterns = [
     path('list', NotificationListAPI.as_view(), name='notification_list'),
+    path('unread', NotificationUnreadCountAPI.as_view(), name='notification_unread_count'),
     path('subscription', NotificationSubscriptionListAPI.as_view(), name='notification_subscription_list'),
     path('read', NotificationMarkReadAPI.as_view(), name='notification_mark_read'),
+    path('read/channel', NotificationChannelMarkReadAPI.as_view(), name='notification_channel_mark_read'),
+    path('read/all', NotificationMarkAllReadAPI.as_view(), name='notification_mark_all_read'),
     path('unsubscribe', NotificationUnsubscribeAPI.as_view(), name='notification_unsubscribe')
 ]
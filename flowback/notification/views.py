@@ -6,8 +6,10 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
-from flowback.notification.selectors import notification_list, notification_subscription_list
-from flowback.notification.services import notification_mark_read, notification_channel_unsubscribe
+from flowback.notification.selectors import notification_list, notification_subscription_list, \
+    notification_unread_count
+from flowback.notification.services import notification_mark_read, notification_channel_unsubscribe, \
+    notification_channel_mark_read, notification_mark_all_read
 
 
 class NotificationListAPI(APIView):
@@ -29,21 +31,23 @@ class NotificationListAPI(APIView):
 
         channel_sender_category = serializers.CharField(required=False)
 
+    # Virtual notifications (e.g. poll timelines) have no id or object_id
     class OutputSerializer(serializers.Serializer):
-        id = serializers.IntegerField()
-        object_id = serializers.IntegerField(source='notification_object_id')
-        message = serializers.CharField(source='notification_object.message')
-        timestamp = serializers.DateTimeField(source='notification_object.timestamp')
-        action = serializers.CharField(source='notification_object.action')
-        channel_sender_id = serializers.IntegerField(source='notification_object.channel.sender_id')
-        channel_sender_type = serializers.CharField(source='notification_object.channel.sender_type')
-        channel_id = serializers.IntegerField(source='notification_object.channel_id')
-        channel_category = serializers.CharField(source='notification_object.channel.category')
-        read = serializers.BooleanField()
+        id = serializers.IntegerField(source='notification_id')
+        object_id = serializers.IntegerField()
+        message = serializers.CharField(source='notification_message')
+        timestamp = serializers.DateTimeField(source='notification_timestamp')
+        action = serializers.CharField(source='notification_action')
+        channel_sender_id = serializers.IntegerField()
+        channel_sender_type = serializers.CharField()
+        channel_id = serializers.IntegerField(source='notification_channel_id')
+        channel_category = serializers.CharField()
+        read = serializers.BooleanField(source='notification_read')
 
     def get(self, request):
         filter_serializer = self.FilterSerializer(data=request.query_params)
         filter_serializer.is_valid(raise_exception=True)
+
         notifications = notification_list(user=request.user, filters=filter_serializer.validated_data)
 
         return get_paginated_response(pagination_class=self.Pagination,
@@ -53,6 +57,16 @@ class NotificationListAPI(APIView):
                                       view=self)
 
 
+class NotificationUnreadCountAPI(APIView):
+    class OutputSerializer(serializers.Serializer):
+        total = serializers.IntegerField()
+        categories = serializers.DictField(child=serializers.IntegerField())
+
+    def get(self, request):
+        unread = notification_unread_count(user=request.user)
+        return Response(self.OutputSerializer(unread).data, status=status.HTTP_200_OK)
+
+
 class NotificationSubscriptionListAPI(APIView):
     class Pagination(LimitOffsetPagination):
         default_limit = 25
@@ -93,6 +107,34 @@ class NotificationMarkReadAPI(APIView):
         return Response(status=status.HTTP_200_OK)
 
 
+class NotificationChannelMarkReadAPI(APIView):
+    class InputSerializer(serializers.Serializer):
+        channel_sender_type = serializers.CharField(source='sender_type')
+        channel_sender_id = serializers.IntegerField(source='sender_id')
+        channel_category = serializers.CharField(source='category')
+        timestamp = serializers.DateTimeField(required=False)
+
+    def post(self, request):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        notification_channel_mark_read(user_id=request.user.id, **serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+
+class NotificationMarkAllReadAPI(APIView):
+    class InputSerializer(serializers.Serializer):
+        channel_category = serializers.CharField(source='category', required=False)
+        timestamp = serializers.DateTimeField(required=False)
+
+    def post(self, request):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        notification_mark_all_read(user_id=request.user.id, **serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+
 class NotificationUnsubscribeAPI(APIView):
     class InputSerializer(serializers.Serializer):
         channel_sender_type = serializers.CharField(source='sender_type')
@@ -0,0 +1,132 @@
+import time
+
+import factory
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
+from flowback.poll.models import PollPredictionStatement, PollPredictionBet, PollPredictionError, \
+    PollPredictorStatistics
+from flowback.poll.tasks import poll_prediction_bet_count
+from flowback.poll.tests.factories import PollFactory
+from flowback.poll.tests.utils import generate_poll_phase_kwargs
+
+
+# Times poll_prediction_bet_count on synthetic predictor populations and reports how close combined_bet gets
+# to the outcome. Every predictor has a fixed bias and noise level, and skips each statement with
+# the given probability. Everything runs inside a transaction that is rolled back afterwards
+class Command(BaseCommand):
+    help = 'Benchmark the prediction bet combiner on synthetic predictors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--predictors', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--history', type=int, nargs='+', default=[10, 100],
+                            help='Decided statements per predictor, the combiner reads at most 100')
+        parser.add_argument('--statements', type=int, default=10, help='Statements in the benchmarked poll')
+        parser.add_argument('--modes', nargs='+', default=['sample', 'shrinkage'],
+                            choices=['sample', 'shrinkage'])
+        parser.add_argument('--bias', type=float, default=0.1, help='Standard deviation of predictor bias')
+        parser.add_argument('--noise', type=float, default=0.2, help='Mean standard deviation of predictor noise')
+        parser.add_argument('--missing', type=float, default=0.2, help='Chance a predictor skips a statement')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        self.stdout.write(f"{'predictors':>10} {'history':>8} {'mode':>10} {'seconds':>9} "
+                          f"{'brier':>7} {'mean brier':>10} {'prob error':>10}")
+
+        with transaction.atomic():
+            group = GroupFactory()
+            group_users = GroupUserFactory.create_batch(
+                max(options['predictors']),
+                group=group,
+                user__username=factory.Sequence(lambda n: f'benchmark_predictor_{n}'),
+                user__email=factory.Sequence(lambda n: f'benchmark_predictor_{n}@example.com'))
+
+            for predictor_count in options['predictors']:
+                predictors = group_users[:predictor_count]
+                bias = rng.normal(0, options['bias'], predictor_count)
+                noise = np.abs(rng.normal(options['noise'], options['noise'] / 2, predictor_count))
+
+                for history_length in options['history']:
+                    for mode in options['modes']:
+                        # Every run gets its own tag so the error histories don't mix
+                        tag = GroupTagsFactory(group=group)
+                        self.generate_history(rng=rng, tag=tag, predictors=predictors, bias=bias, noise=noise,
+                                              history_length=history_length, missing=options['missing'])
+
+                        poll = PollFactory(created_by=predictors[0], tag=tag,
+                                           **generate_poll_phase_kwargs('prediction_bet'))
+                        statements, probabilities, outcomes, bets = self.generate_statements(
+                            rng=rng, poll=poll, predictors=predictors, bias=bias, noise=noise,
+                            count=options['statements'], missing=options['missing'])
+
+                        start = time.perf_counter()
+                        poll_prediction_bet_count(poll_id=poll.id, covariance_mode=mode)
+                        seconds = time.perf_counter() - start
+
+                        combined = np.array(PollPredictionStatement.objects.filter(
+                            id__in=[statement.id for statement in statements]
+                        ).order_by('id').values_list('combined_bet', flat=True), dtype=float)
+                        mean = np.nanmean(bets, axis=0)
+
+                        self.stdout.write(f'{predictor_count:>10} {history_length:>8} {mode:>10} {seconds:>9.3f} '
+                                          f'{np.nanmean((combined - outcomes) ** 2):>7.3f} '
+                                          f'{np.nanmean((mean - outcomes) ** 2):>10.3f} '
+                                          f'{np.nanmean(np.abs(combined - probabilities)):>10.3f}')
+
+            transaction.set_rollback(True)
+
+    # Draws a bet (0 to 5) for every predictor on every statement, NaN where the predictor skipped it
+    @staticmethod
+    def draw_bets(*, rng, probabilities, bias, noise, missing) -> np.ndarray:
+        shape = (len(bias), len(probabilities))
+        bets = np.clip(np.rint((probabilities + bias[:, None] + rng.normal(0, 1, shape) * noise[:, None]) * 5), 0, 5)
+        bets[rng.random(shape) < missing] = np.nan
+
+        return bets
+
+    # Fills the tag's error history directly, which is what the combiner reads for decided statements
+    def generate_history(self, *, rng, tag, predictors, bias, noise, history_length, missing):
+        poll = PollFactory(created_by=predictors[0], tag=tag, **generate_poll_phase_kwargs('prediction_vote'))
+        statements = PollPredictionStatement.objects.bulk_create([
+            PollPredictionStatement(poll=poll, created_by=predictors[0], description=f'history {i}',
+                                    end_date=poll.end_date) for i in range(history_length)])
+
+        probabilities = rng.random(history_length)
+        outcomes = (rng.random(history_length) < probabilities).astype(float)
+        errors = outcomes - self.draw_bets(rng=rng, probabilities=probabilities, bias=bias, noise=noise,
+                                           missing=missing) / 5
+
+        PollPredictionError.objects.bulk_create([
+            PollPredictionError(tag=tag, predictor=predictor, prediction_statement=statement, error=errors[i, j])
+            for i, predictor in enumerate(predictors)
+            for j, statement in enumerate(statements) if not np.isnan(errors[i, j])], batch_size=5000)
+
+        PollPredictorStatistics.objects.bulk_create([
+            PollPredictorStatistics(tag=tag,
+                                    predictor=predictor,
+                                    count=np.count_nonzero(~np.isnan(errors[i])),
+                                    error_sum=np.nansum(errors[i]),
+                                    error_square_sum=np.nansum(errors[i] ** 2),
+                                    recency_weight_sum=np.count_nonzero(~np.isnan(errors[i])),
+                                    recency_accuracy_sum=np.nansum(1 - errors[i] ** 2))
+            for i, predictor in enumerate(predictors)])
+
+    def generate_statements(self, *, rng, poll, predictors, bias, noise, count, missing):
+        statements = PollPredictionStatement.objects.bulk_create([
+            PollPredictionStatement(poll=poll, created_by=predictors[0], description=f'statement {i}',
+                                    end_date=poll.end_date) for i in range(count)])
+
+        probabilities = rng.random(count)
+        outcomes = (rng.random(count) < probabilities).astype(float)
+        bets = self.draw_bets(rng=rng, probabilities=probabilities, bias=bias, noise=noise, missing=missing)
+
+        PollPredictionBet.objects.bulk_create([
+            PollPredictionBet(prediction_statement=statement, created_by=predictor, score=int(bets[i, j]))
+            for i, predictor in enumerate(predictors)
+            for j, statement in enumerate(statements) if not np.isnan(bets[i, j])], batch_size=5000)
+
+        return statements, probabilities, outcomes, bets / 5
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from flowback.poll.models import PollPredictionError, PollPredictorStatistics
+
+
+# Rebuilds the predictor statistics of tags from their error history, for when errors were changed
+# without the prediction services or signals (bulk updates, raw SQL or restored backups)
+class Command(BaseCommand):
+    help = 'Rebuild predictor statistics from the prediction error history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tag', type=int, nargs='+', help='Only repair the given tag ids')
+
+    def handle(self, *args, **options):
+        errors = PollPredictionError.objects.all()
+        statistics = PollPredictorStatistics.objects.all()
+        if options['tag']:
+            errors = errors.filter(tag_id__in=options['tag'])
+            statistics = statistics.filter(tag_id__in=options['tag'])
+
+        tag_ids = set(errors.values_list('tag_id', flat=True).distinct()) | set(statistics.values_list('tag_id',
+                                                                                                        flat=True))
+
+        for tag_id in tag_ids:
+            with transaction.atomic():
+                PollPredictorStatistics.objects.filter(tag_id=tag_id).delete()
+                PollPredictorStatistics.error_update(tag_id=tag_id, errors=[
+                    (predictor_id, error, timestamp, 1)
+                    for predictor_id, error, timestamp in errors.filter(tag_id=tag_id).order_by(
+                        'timestamp').values_list('predictor_id', 'error', 'timestamp')])
+
+        self.stdout.write(f'Repaired {len(tag_ids)} tag(s)')
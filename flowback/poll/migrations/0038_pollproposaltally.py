@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def pre_populate_tallies(apps, schema_editor):
+    PollProposal = apps.get_model('poll', 'pollproposal')
+    PollProposalTally = apps.get_model('poll', 'pollproposaltally')
+    tallies = []
+
+    for proposal in PollProposal.objects.annotate(total_proposals=models.Count('poll__pollproposal')
+                                                  ).select_related('poll'):
+        participants = proposal.participants or 0
+        score = proposal.score or 0
+
+        # Ranking scores are stored relative to the amount of proposals
+        if proposal.poll.poll_type == 1:
+            score -= proposal.total_proposals * participants
+
+        tallies.append(PollProposalTally(proposal=proposal,
+                                         score=score,
+                                         participants=participants,
+                                         blank_votes=proposal.blank_votes or 0,
+                                         positive_votes=proposal.positive_votes or 0))
+
+    PollProposalTally.objects.bulk_create(tallies)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0037_poll_parent_alter_poll_poll_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollProposalTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('score', models.IntegerField(default=0)),
+                ('participants', models.IntegerField(default=0)),
+                ('blank_votes', models.IntegerField(default=0)),
+                ('positive_votes', models.IntegerField(default=0)),
+                ('proposal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally', to='poll.pollproposal')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(pre_populate_tallies, migrations.RunPython.noop),
+    ]
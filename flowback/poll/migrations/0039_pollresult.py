@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0038_pollproposaltally'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.IntegerField()),
+                ('participants', models.IntegerField()),
+                ('total_group_users', models.IntegerField()),
+                ('quorum', models.IntegerField()),
+                ('poll', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='poll.poll')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PollProposalResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('rank', models.IntegerField()),
+                ('score', models.IntegerField(blank=True, null=True)),
+                ('participants', models.IntegerField(blank=True, null=True)),
+                ('blank_votes', models.IntegerField(blank=True, null=True)),
+                ('positive_votes', models.IntegerField(blank=True, null=True)),
+                ('approval_positive', models.IntegerField(default=0)),
+                ('approval_negative', models.IntegerField(default=0)),
+                ('priority', models.IntegerField(default=0)),
+                ('proposal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='poll.pollproposal')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.pollresult')),
+            ],
+            options={
+                'unique_together': {('result', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def pre_populate_prediction_errors(apps, schema_editor):
+    PollPredictionStatement = apps.get_model('poll', 'pollpredictionstatement')
+    PollPredictionBet = apps.get_model('poll', 'pollpredictionbet')
+    PollPredictionError = apps.get_model('poll', 'pollpredictionerror')
+    PollPredictorStatistics = apps.get_model('poll', 'pollpredictorstatistics')
+
+    statements = PollPredictionStatement.objects.filter(poll__tag__isnull=False).annotate(
+        yes=models.Count('pollpredictionstatementvote', filter=models.Q(pollpredictionstatementvote__vote=True)),
+        no=models.Count('pollpredictionstatementvote', filter=models.Q(pollpredictionstatementvote__vote=False))
+    ).filter(models.Q(yes__gt=0) | models.Q(no__gt=0)).select_related('poll')
+
+    errors = []
+    statistics = {}
+    for statement in statements:
+        outcome = 1 if statement.yes > statement.no else 0 if statement.yes < statement.no else 0.5
+
+        for predictor_id, score in PollPredictionBet.objects.filter(prediction_statement=statement
+                                                                    ).values_list('created_by_id', 'score'):
+            error = outcome - score / 5
+            errors.append(PollPredictionError(tag_id=statement.poll.tag_id,
+                                              predictor_id=predictor_id,
+                                              prediction_statement=statement,
+                                              error=error))
+
+            row = statistics.setdefault((statement.poll.tag_id, predictor_id),
+                                        PollPredictorStatistics(tag_id=statement.poll.tag_id,
+                                                                predictor_id=predictor_id))
+            row.count += 1
+            row.error_sum += error
+            row.error_square_sum += error ** 2
+
+    PollPredictionError.objects.bulk_create(errors)
+    PollPredictorStatistics.objects.bulk_create(statistics.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0026_grouppermissions_poll_fast_forward'),
+        ('poll', '0039_pollresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollPredictorStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('count', models.IntegerField(default=0)),
+                ('error_sum', models.FloatField(default=0)),
+                ('error_square_sum', models.FloatField(default=0)),
+                ('predictor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.groupuser')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.grouptags')),
+            ],
+            options={
+                'unique_together': {('tag', 'predictor')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PollPredictionError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('error', models.FloatField()),
+                ('prediction_statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.pollpredictionstatement')),
+                ('predictor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.groupuser')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.grouptags')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'predictor'], name='poll_pollpr_tag_id_1ac4ab_idx')],
+                'unique_together': {('predictor', 'prediction_statement')},
+            },
+        ),
+        migrations.RunPython(pre_populate_prediction_errors, migrations.RunPython.noop),
+    ]
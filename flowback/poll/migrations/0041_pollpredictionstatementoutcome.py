@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def pre_populate_outcomes(apps, schema_editor):
+    PollPredictionStatement = apps.get_model('poll', 'pollpredictionstatement')
+    PollPredictionStatementOutcome = apps.get_model('poll', 'pollpredictionstatementoutcome')
+    outcomes = []
+
+    for statement in PollPredictionStatement.objects.annotate(
+            yes=models.Count('pollpredictionstatementvote', filter=models.Q(pollpredictionstatementvote__vote=True)),
+            no=models.Count('pollpredictionstatementvote', filter=models.Q(pollpredictionstatementvote__vote=False))):
+        outcome = None
+        if statement.yes or statement.no:
+            outcome = 1 if statement.yes > statement.no else 0 if statement.yes < statement.no else 0.5
+
+        outcomes.append(PollPredictionStatementOutcome(prediction_statement=statement,
+                                                       vote_yes=statement.yes,
+                                                       vote_no=statement.no,
+                                                       outcome=outcome,
+                                                       resolved_at=None if outcome is None else statement.end_date))
+
+    PollPredictionStatementOutcome.objects.bulk_create(outcomes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0040_pollpredictionerror'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollPredictionStatementOutcome',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vote_yes', models.IntegerField(default=0)),
+                ('vote_no', models.IntegerField(default=0)),
+                ('outcome', models.FloatField(blank=True, null=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('prediction_statement', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outcome', to='poll.pollpredictionstatement')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(pre_populate_outcomes, migrations.RunPython.noop),
+    ]
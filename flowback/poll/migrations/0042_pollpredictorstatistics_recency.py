@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def pre_populate_recency(apps, schema_editor):
+    PollPredictionError = apps.get_model('poll', 'pollpredictionerror')
+    PollPredictorStatistics = apps.get_model('poll', 'pollpredictorstatistics')
+    half_life = django.utils.timezone.timedelta(days=90)
+
+    PollPredictionError.objects.update(timestamp=models.Subquery(
+        PollPredictionError.objects.filter(id=models.OuterRef('id')).values('prediction_statement__end_date')))
+
+    # Weights are relative to each predictor's latest error
+    statistics = list(PollPredictorStatistics.objects.all())
+    for row in statistics:
+        errors = list(PollPredictionError.objects.filter(tag_id=row.tag_id, predictor_id=row.predictor_id
+                                                         ).values_list('error', 'timestamp'))
+        row.recency_reference = max((timestamp for error, timestamp in errors), default=None)
+        row.recency_weight_sum = sum(2 ** ((timestamp - row.recency_reference) / half_life)
+                                     for error, timestamp in errors)
+        row.recency_accuracy_sum = sum(2 ** ((timestamp - row.recency_reference) / half_life) * (1 - error ** 2)
+                                       for error, timestamp in errors)
+
+    PollPredictorStatistics.objects.bulk_update(statistics, fields=('recency_reference', 'recency_weight_sum',
+                                                                    'recency_accuracy_sum'), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0041_pollpredictionstatementoutcome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollpredictionerror',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='pollpredictorstatistics',
+            name='recency_reference',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pollpredictorstatistics',
+            name='recency_accuracy_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pollpredictorstatistics',
+            name='recency_weight_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(pre_populate_recency, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+def pre_populate_score(apps, schema_editor):
+    PollAreaStatement = apps.get_model('poll', 'pollareastatement')
+    PollAreaStatementVote = apps.get_model('poll', 'pollareastatementvote')
+
+    votes = PollAreaStatementVote.objects.filter(poll_area_statement=models.OuterRef('id')
+                                                 ).values('poll_area_statement')
+    score = votes.annotate(score=models.Count('id', filter=models.Q(vote=True))
+                           - models.Count('id', filter=models.Q(vote=False))).values('score')
+
+    PollAreaStatement.objects.update(score=models.functions.Coalesce(models.Subquery(score), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0042_pollpredictorstatistics_recency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollareastatement',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='pollareastatement',
+            index=models.Index(fields=['poll', '-score'], name='poll_pollar_poll_id_0a71f5_idx'),
+        ),
+        migrations.RunPython(pre_populate_score, migrations.RunPython.noop),
+    ]
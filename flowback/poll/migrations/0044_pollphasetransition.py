@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Boundaries that already passed were handled by the tasks queued at poll creation
+def pre_populate_transitions(apps, schema_editor):
+    Poll = apps.get_model('poll', 'poll')
+    PollPhaseTransition = apps.get_model('poll', 'pollphasetransition')
+    now = django.utils.timezone.now()
+
+    PollPhaseTransition.objects.bulk_create(
+        [PollPhaseTransition(poll_id=poll_id, phase='area_vote')
+         for poll_id in Poll.objects.filter(area_vote_end_date__lte=now).values_list('id', flat=True)]
+        + [PollPhaseTransition(poll_id=poll_id, phase='prediction_bet')
+           for poll_id in Poll.objects.filter(prediction_bet_end_date__lte=now).values_list('id', flat=True)],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0043_pollareastatement_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollPhaseTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('phase', models.CharField(choices=[('area_vote', 'area_vote'), ('prediction_bet', 'prediction_bet')], max_length=32)),
+                ('attempts', models.IntegerField(default=0)),
+                ('failed', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['area_vote_end_date'], name='poll_poll_area_vo_9f1c34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['prediction_bet_end_date'], name='poll_poll_predict_cab6f4_idx'),
+        ),
+        migrations.AddField(
+            model_name='pollphasetransition',
+            name='poll',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.poll'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pollphasetransition',
+            unique_together={('poll', 'phase')},
+        ),
+        migrations.RunPython(pre_populate_transitions, migrations.RunPython.noop),
+    ]
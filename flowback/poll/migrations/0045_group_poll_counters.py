@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:33
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def pre_populate_poll_counts(apps, schema_editor):
+    Group = apps.get_model('group', 'group')
+    Poll = apps.get_model('poll', 'poll')
+
+    def poll_count(**filters):
+        return Coalesce(models.Subquery(Poll.objects.filter(created_by__group=models.OuterRef('id'), **filters)
+                                        .values('created_by__group').annotate(count=models.Count('id'))
+                                        .values('count')), 0)
+
+    Group.objects.update(poll_count=poll_count(), open_poll_count=poll_count(status=0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0028_group_counters'),
+        ('poll', '0044_pollphasetransition'),
+    ]
+
+    operations = [
+        migrations.RunPython(pre_populate_poll_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:20
+
+from django.db import migrations
+
+
+# Timeline notifications are derived from the poll dates now, drop the stored ones
+def delete_poll_timeline_notifications(apps, schema_editor):
+    NotificationObject = apps.get_model('notification', 'notificationobject')
+    NotificationObject.objects.filter(channel__sender_type='poll', channel__category='timeline').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0003_notification_inbox_read_cursor'),
+        ('poll', '0045_group_poll_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_poll_timeline_notifications, migrations.RunPython.noop),
+    ]
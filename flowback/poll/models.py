@@ -1,9 +1,9 @@
 from typing import Union
 
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q, F, Count
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -19,7 +19,7 @@ from flowback.prediction.models import (PredictionBet,
                                         PredictionStatementSegment,
                                         PredictionStatementVote)
 from flowback.comment.services import comment_section_create_model_default
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, TrackedFieldsMixin
 from flowback.group.models import Group, GroupUser, GroupUserDelegatePool, GroupTags
 from flowback.comment.models import CommentSection
 import pgtrigger
@@ -30,7 +30,9 @@ from flowback.user.models import User
 
 
 # Create your models here.
-class Poll(BaseModel):
+class Poll(TrackedFieldsMixin, BaseModel):
+    tracked_fields = ('status',)
+
     class PollType(models.IntegerChoices):
         RANKING = 1, _('ranking')
         FOR_AGAINST = 2, _('for_against')
@@ -176,6 +178,10 @@ class Poll(BaseModel):
                        models.CheckConstraint(check=~Q(Q(poll_type=3) & Q(dynamic=False)),
                                               name='polltypeisscheduleanddynamic_check')]
 
+        # Upcoming phase boundaries for poll_phase_transition_process
+        indexes = [models.Index(fields=['area_vote_end_date']),
+                   models.Index(fields=['prediction_bet_end_date'])]
+
     @property
     def schedule_origin(self):
         return 'group_poll'
@@ -224,14 +230,32 @@ class Poll(BaseModel):
             raise ValidationError(f'Poll is not in {" or ".join(phases)}, currently in {current_phase}')
 
     @classmethod
-    def pre_save(cls, instance, *args, **kwargs):
+    def pre_save(cls, instance, update_fields, *args, **kwargs):
         if not instance.pk:
             instance.message_channel_topic = message_channel_topic_create(channel_id=instance.created_by.group.chat_id,
                                                                           topic_name=f'poll.{instance.id}',
                                                                           hidden=True)
 
+        # Polls don't reopen, so only a save with a closed status can close the poll. The stored status
+        # is only queried for polls that weren't loaded from the database
+        instance.status_closed = False
+        if instance.pk and instance.status != 0 and (update_fields is None or 'status' in update_fields):
+            status_changed = instance.field_changed('status')
+            instance.status_closed = instance.loaded_values['status'] == 0 if status_changed \
+                else status_changed is None and Poll.objects.filter(id=instance.pk, status=0).exists()
+
     @classmethod
     def post_save(cls, instance, created, update_fields, **kwargs):
+        if created:
+            Group.objects.filter(groupuser=instance.created_by_id).update(
+                poll_count=F('poll_count') + 1,
+                open_poll_count=F('open_poll_count') + int(instance.status == 0))
+
+        elif getattr(instance, 'status_closed', False):
+            Group.objects.filter(groupuser=instance.created_by_id).update(open_poll_count=F('open_poll_count') - 1)
+
+        instance.loaded_values_reset(fields=update_fields)
+
         if created and instance.poll_type == cls.PollType.SCHEDULE:
             try:
                 schedule = create_schedule(name='group_poll_schedule', origin_name='group_poll', origin_id=instance.id)
@@ -245,6 +269,9 @@ class Poll(BaseModel):
 
     @classmethod
     def post_delete(cls, instance, **kwargs):
+        Group.objects.filter(groupuser=instance.created_by_id).update(
+            poll_count=F('poll_count') - 1,
+            open_poll_count=F('open_poll_count') - int(instance.status == 0))
         instance.message_channel_topic.delete()
 
         if hasattr(instance, 'schedule'):
@@ -256,6 +283,21 @@ post_save.connect(Poll.post_save, sender=Poll)
 post_delete.connect(Poll.post_delete, sender=Poll)
 
 
+# Marks a phase boundary of a poll as processed, so every transition runs once however often it is picked up
+class PollPhaseTransition(BaseModel):
+    class Phase(models.TextChoices):
+        AREA_VOTE = 'area_vote', _('area_vote')
+        PREDICTION_BET = 'prediction_bet', _('prediction_bet')
+
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
+    phase = models.CharField(max_length=32, choices=Phase.choices)
+    attempts = models.IntegerField(default=0)
+    failed = models.BooleanField(default=False)  # Whether the last attempt raised, retried up to max attempts
+
+    class Meta:
+        unique_together = ('poll', 'phase')
+
+
 class PollTypeSchedule(BaseModel):
     poll = models.OneToOneField(Poll, on_delete=models.CASCADE)
     schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE)
@@ -269,6 +311,7 @@ class PollProposal(BaseModel):
     description = models.TextField(null=True, blank=True)
     attachments = models.ForeignKey(FileCollection, on_delete=models.CASCADE, null=True, blank=True)
 
+    # Per proposal, the (delegated) votes on this proposal. Poll wide participation is Poll.participants
     participants = models.IntegerField(null=True, blank=True)
     blank_votes = models.IntegerField(null=True, blank=True)
     positive_votes = models.IntegerField(null=True, blank=True)
@@ -279,6 +322,52 @@ class PollProposal(BaseModel):
     def schedule_origin(self):
         return 'group_poll_proposal'
 
+    @classmethod
+    def post_save(cls, instance, created, **kwargs):
+        if created:
+            PollProposalTally.objects.get_or_create(proposal=instance)
+
+
+# Running vote totals of a proposal, updated with deltas on every vote write.
+# Ranking scores are stored relative to the amount of proposals in the poll,
+# the proposal score is score + total_proposals * participants
+class PollProposalTally(BaseModel):
+    proposal = models.OneToOneField(PollProposal, on_delete=models.CASCADE, related_name='tally')
+
+    score = models.IntegerField(default=0)
+    participants = models.IntegerField(default=0)
+    blank_votes = models.IntegerField(default=0)
+    positive_votes = models.IntegerField(default=0)
+
+
+post_save.connect(PollProposal.post_save, sender=PollProposal)
+
+
+# Read-only snapshot of a finished poll, written once when the result is set
+class PollResult(BaseModel):
+    poll = models.OneToOneField(Poll, on_delete=models.CASCADE, related_name='snapshot')
+    status = models.IntegerField()
+    participants = models.IntegerField()
+    total_group_users = models.IntegerField()
+    quorum = models.IntegerField()
+
+
+class PollProposalResult(BaseModel):
+    result = models.ForeignKey(PollResult, on_delete=models.CASCADE)
+    proposal = models.OneToOneField(PollProposal, on_delete=models.CASCADE, related_name='snapshot')
+
+    rank = models.IntegerField()
+    score = models.IntegerField(null=True, blank=True)
+    participants = models.IntegerField(null=True, blank=True)
+    blank_votes = models.IntegerField(null=True, blank=True)
+    positive_votes = models.IntegerField(null=True, blank=True)
+    approval_positive = models.IntegerField(default=0)
+    approval_negative = models.IntegerField(default=0)
+    priority = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('result', 'rank')
+
 
 class PollProposalTypeSchedule(BaseModel):
     proposal = models.OneToOneField(PollProposal, on_delete=models.CASCADE)
@@ -397,6 +486,10 @@ class PollVotingTypeForAgainst(BaseModel):
 class PollAreaStatement(BaseModel):
     created_by = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)  # Votes for minus votes against, kept by poll_area_statement_vote_update
+
+    class Meta:
+        indexes = [models.Index(fields=['poll', '-score'])]
 
 
 class PollAreaStatementSegment(BaseModel):
@@ -428,6 +521,25 @@ class PollPredictionStatement(PredictionStatement):
             .filter(segment_count__lt=1) \
             .delete()
 
+    @classmethod
+    def post_save(cls, instance, created, **kwargs):
+        if created:
+            PollPredictionStatementOutcome.objects.get_or_create(prediction_statement=instance)
+
+
+# Vote totals and resolved outcome of a prediction statement, kept up to date by the statement vote services
+class PollPredictionStatementOutcome(BaseModel):
+    prediction_statement = models.OneToOneField(PollPredictionStatement,
+                                                on_delete=models.CASCADE,
+                                                related_name='outcome')
+    vote_yes = models.IntegerField(default=0)
+    vote_no = models.IntegerField(default=0)
+    outcome = models.FloatField(null=True, blank=True)  # 1 if true, 0 if false, 0.5 on a tie, None without votes
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+
+post_save.connect(PollPredictionStatement.post_save, sender=PollPredictionStatement)
+
 
 class PollPredictionStatementSegment(PredictionStatementSegment):
     prediction_statement = models.ForeignKey(PollPredictionStatement, on_delete=models.CASCADE)
@@ -459,6 +571,115 @@ class PollPredictionBet(PredictionBet):
             prediction_statement__pollpredictionstatementsegment__proposal=instance).delete()
 
 
+# Error of a predictor's bet on a statement with a decided outcome, the prediction history of a tag
+class PollPredictionError(BaseModel):
+    tag = models.ForeignKey(GroupTags, on_delete=models.CASCADE)
+    predictor = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
+    prediction_statement = models.ForeignKey(PollPredictionStatement, on_delete=models.CASCADE)
+    error = models.FloatField()  # Outcome minus bet, both between 0 and 1
+    timestamp = models.DateTimeField(default=timezone.now)  # End date of the statement, for recency weights
+
+    class Meta:
+        unique_together = ('predictor', 'prediction_statement')
+        indexes = [models.Index(fields=['tag', 'predictor'])]
+
+    # Takes the errors out of the running statistics with one update per tag, then deletes them
+    @classmethod
+    def statistics_delete(cls, errors: models.QuerySet) -> None:
+        tag_errors = {}
+        for tag_id, predictor_id, error, timestamp in errors.values_list('tag_id', 'predictor_id',
+                                                                         'error', 'timestamp'):
+            tag_errors.setdefault(tag_id, []).append((predictor_id, error, timestamp, -1))
+
+        for tag_id, removed in tag_errors.items():
+            PollPredictorStatistics.error_update(tag_id=tag_id, errors=removed)
+
+        errors.delete()
+
+    # Errors removed along with their statement or poll are taken out of the running statistics at once, before
+    # the cascade. Errors of deleted tags and predictors go along with their statistics
+    @classmethod
+    def statement_pre_delete(cls, instance, *args, **kwargs):
+        cls.statistics_delete(cls.objects.filter(prediction_statement=instance))
+
+    @classmethod
+    def poll_pre_delete(cls, instance, *args, **kwargs):
+        cls.statistics_delete(cls.objects.filter(prediction_statement__poll=instance))
+
+
+pre_delete.connect(PollPredictionError.statement_pre_delete, sender=PollPredictionStatement)
+pre_delete.connect(PollPredictionError.poll_pre_delete, sender=Poll)
+
+
+# Running sums of a predictor's errors within a tag, also used as the tag's predictor leaderboard.
+# Recency weights halve every half life before the predictor's latest error (recency_reference), so they stay
+# between 0 and 1. The weighted sums are scaled down whenever a newer error moves the reference forward
+class PollPredictorStatistics(BaseModel):
+    recency_half_life = timezone.timedelta(days=90)
+
+    tag = models.ForeignKey(GroupTags, on_delete=models.CASCADE)
+    predictor = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+    error_sum = models.FloatField(default=0)
+    error_square_sum = models.FloatField(default=0)
+    recency_reference = models.DateTimeField(null=True, blank=True)
+    recency_weight_sum = models.FloatField(default=0)
+    recency_accuracy_sum = models.FloatField(default=0)  # Sum of recency weight * (1 - squared error)
+
+    @classmethod
+    def recency_weight(cls, timestamp, reference) -> float:
+        return 2 ** ((timestamp - reference) / cls.recency_half_life)
+
+    # Adds (sign 1) or removes (sign -1) errors given as (predictor_id, error, timestamp, sign).
+    # Statistics are only created for added errors, removed ones may belong to predictors being deleted
+    @classmethod
+    def error_update(cls, *, tag_id: int, errors: list[tuple[int, float, timezone.datetime, int]]) -> None:
+        if not errors:
+            return
+
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(tag_id=tag_id, predictor_id=predictor_id)
+                                     for predictor_id in {error[0] for error in errors if error[3] > 0}],
+                                    ignore_conflicts=True)
+            statistics = {row.predictor_id: row for row in cls.objects.select_for_update().filter(
+                tag_id=tag_id, predictor_id__in={error[0] for error in errors})}
+
+            for predictor_id, error, timestamp, sign in errors:
+                row = statistics.get(predictor_id)
+                if not row:
+                    continue
+
+                if row.recency_reference is None or (sign > 0 and timestamp > row.recency_reference):
+                    if row.recency_reference is not None:
+                        scale = cls.recency_weight(row.recency_reference, timestamp)
+                        row.recency_weight_sum *= scale
+                        row.recency_accuracy_sum *= scale
+
+                    row.recency_reference = timestamp
+
+                recency_weight = cls.recency_weight(timestamp, row.recency_reference)
+                row.count += sign
+                row.error_sum += sign * error
+                row.error_square_sum += sign * error ** 2
+                row.recency_weight_sum += sign * recency_weight
+                row.recency_accuracy_sum += sign * recency_weight * (1 - error ** 2)
+
+            cls.objects.bulk_update(statistics.values(), fields=('count', 'error_sum', 'error_square_sum',
+                                                                 'recency_reference', 'recency_weight_sum',
+                                                                 'recency_accuracy_sum'))
+
+    @property
+    def error_mean(self) -> float:
+        return self.error_sum / self.count if self.count else 0
+
+    @property
+    def error_variance(self) -> float:
+        return self.error_square_sum / self.count - self.error_mean ** 2 if self.count else 0
+
+    class Meta:
+        unique_together = ('tag', 'predictor')
+
+
 class PollPriority(BaseModel):
     group_user = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
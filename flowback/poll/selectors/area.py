@@ -30,3 +30,8 @@ def poll_area_statement_list(*, user: User, poll_id: int, filters=None):
                                                                             output_field=models.BooleanField()))
 
     return BasePollAreaStatementFilter(filters, qs).qs
+
+
+# The statement with the highest score, read from the (poll, -score) index
+def poll_area_statement_leading(*, poll_id: int) -> PollAreaStatement | None:
+    return PollAreaStatement.objects.filter(poll_id=poll_id).order_by('-score', 'created_at').first()
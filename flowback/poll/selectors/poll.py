@@ -2,8 +2,8 @@ from typing import Union
 
 import django_filters
 from django.db import models
-from django.db.models import Q, Exists, OuterRef, Count, Sum, Subquery
-from django.db.models.functions import Coalesce
+from django.db.models import Q, Exists, OuterRef, Count, Sum, Subquery, F, Value, Case, When, QuerySet
+from django.db.models.functions import Coalesce, Concat
 from django.utils import timezone
 
 from flowback.comment.models import Comment
@@ -75,3 +75,42 @@ def poll_list(*, fetched_by: User, group_id: Union[int, None], filters=None):
                    total_comments=Count('comment_section__comment', filters=dict(active=True))).all()
 
     return BasePollFilter(filters, qs).qs
+
+
+
+# Virtual 'timeline' notifications of polls, one per phase start following Poll.labels, read from the poll dates.
+# Returns a queryset per date field for notification_virtual_list
+def poll_timeline_notification_list(*, subscriptions) -> list[QuerySet]:
+    def phase(name: str) -> Value:
+        return Value(name.replace('_', ' ').capitalize())
+
+    # (date field, phase started, phase started in dynamic polls)
+    dates = [('start_date', phase('area_vote'), Case(When(poll_type=Poll.PollType.SCHEDULE, then=phase('schedule')),
+                                                     default=phase('dynamic'))),
+             ('area_vote_end_date', phase('proposal'), None),
+             ('proposal_end_date', phase('prediction_statement'), None),
+             ('prediction_statement_end_date', phase('prediction_bet'), None),
+             ('prediction_bet_end_date', phase('delegate_vote'), None),
+             ('delegate_vote_end_date', phase('vote'), None),
+             ('vote_end_date', phase('result'), None),
+             ('end_date', phase('prediction_vote'), phase('result'))]
+
+    polls = Poll.objects.filter(id__in=subscriptions.values('channel__sender_id')).annotate(
+        virtual_channel_id=Subquery(subscriptions.filter(channel__sender_id=OuterRef('id')).values('channel_id')),
+        virtual_sender_id=F('id'),
+        virtual_action=Value('update'))
+
+    querysets = []
+    for field, started, dynamic_started in dates:
+        if dynamic_started:
+            qs = polls.annotate(virtual_phase=Case(When(dynamic=True, then=dynamic_started), default=started))
+        else:
+            qs = polls.filter(dynamic=False).annotate(virtual_phase=started)
+
+        querysets.append(qs.annotate(virtual_timestamp=F(field),
+                                     virtual_message=Concat(Value('Poll '), 'title',
+                                                            Value(' has started '), 'virtual_phase',
+                                                            Value(' phase'),
+                                                            output_field=models.TextField())))
+
+    return querysets
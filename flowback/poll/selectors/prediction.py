@@ -1,13 +1,14 @@
 import django_filters
 from django.db import models
 from django.db.models import Avg, When, F, Case, Count, Q, Exists, Subquery, OuterRef
+from django.db.models.functions import Cast, NullIf
 from django.db.models.fields.related import RelatedField
 from django.db.models.lookups import LessThan
 from django.utils import timezone
 
 from flowback.group.selectors import group_user_permissions
 from flowback.poll.models import PollPredictionStatement, PollPredictionBet, PollPredictionStatementVote, \
-    PollPredictionStatementSegment
+    PollPredictionStatementSegment, PollPredictorStatistics
 from flowback.user.models import User
 
 
@@ -33,8 +34,8 @@ def poll_prediction_statement_list(*, fetched_by: User, group_id: int, filters=N
     score = Case(When(LessThan(F('end_date'), timezone.now()),
                  then=Avg('pollpredictionbet__score')),
                  default=None, output_field=models.FloatField())
-    vote_yes = Count(F('pollpredictionstatementvote'), filter=Q(pollpredictionstatementvote__vote=True))
-    vote_no = Count(F('pollpredictionstatementvote'), filter=Q(pollpredictionstatementvote__vote=False))
+    vote_yes = F('outcome__vote_yes')
+    vote_no = F('outcome__vote_no')
     user_prediction_bet = PollPredictionBet.objects.filter(prediction_statement=OuterRef('pk'),
                                                            created_by=group_user).values('score')
     user_vote = PollPredictionStatementVote.objects.filter(prediction_statement=OuterRef('pk'),
@@ -70,3 +71,35 @@ def poll_prediction_bet_list(*, fetched_by: User, group_id: int = None, filters=
     qs = PollPredictionBet.objects.filter(prediction_statement__created_by__group_id=group_id,
                                           created_by__user=fetched_by).all()
     return BasePollPredictionFilter(filters, qs).qs
+
+
+# poll_predictor_leaderboard
+class BasePollPredictorLeaderboardFilter(django_filters.FilterSet):
+    order_by = django_filters.OrderingFilter(fields=(('brier_score', 'brier_score_asc'),
+                                                     ('-brier_score', 'brier_score_desc'),
+                                                     ('recency_accuracy', 'recency_accuracy_asc'),
+                                                     ('-recency_accuracy', 'recency_accuracy_desc'),
+                                                     ('count', 'count_asc'),
+                                                     ('-count', 'count_desc')))
+    user_id = django_filters.NumberFilter(field_name='predictor__user_id')
+
+    class Meta:
+        model = PollPredictorStatistics
+        fields = dict(tag_id=['exact'],
+                      count=['gt', 'lt'])
+
+
+# Reads the running statistics kept by poll_prediction_error_update, so no bets are scanned here
+def poll_predictor_leaderboard(*, fetched_by: User, group_id: int, filters=None):
+    filters = filters or {}
+    group_user_permissions(group=group_id, user=fetched_by)
+
+    brier_score = F('error_square_sum') / Cast('count', models.FloatField())
+    recency_accuracy = F('recency_accuracy_sum') / NullIf('recency_weight_sum', 0.0)
+
+    qs = PollPredictorStatistics.objects.filter(tag__group_id=group_id, count__gt=0
+                                                ).annotate(brier_score=brier_score,
+                                                           recency_accuracy=recency_accuracy
+                                                           ).order_by('brier_score', '-count')
+
+    return BasePollPredictorLeaderboardFilter(filters, qs).qs
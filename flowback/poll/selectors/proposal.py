@@ -4,7 +4,7 @@ from django.db import models
 from flowback.common.filters import NumberInFilter, ExistsFilter
 from django.db.models import F, Subquery, Count, Func, Sum, OuterRef
 from flowback.common.services import get_object
-from flowback.poll.models import Poll, PollProposal, PollVotingTypeCardinal, PollProposalPriority
+from flowback.poll.models import Poll, PollProposal, PollVotingTypeCardinal, PollProposalPriority, PollResult
 from flowback.user.models import User
 from flowback.group.selectors import group_user_permissions
 
@@ -14,8 +14,8 @@ class BasePollProposalFilter(django_filters.FilterSet):
     created_by_user_id_list = NumberInFilter(field_name='created_by__user_id')
     order_by = django_filters.OrderingFilter(fields=(('created_at', 'created_at_asc'),
                                                      ('-created_at', 'created_at_desc'),
-                                                     ('score', 'score_asc'),
-                                                     ('-score', 'score_desc'),
+                                                     ('result_score', 'score_asc'),
+                                                     ('-result_score', 'score_desc'),
                                                      ('approval', 'approval_asc'),
                                                      ('-approval', 'approval_desc')))
     has_attachments = ExistsFilter(field_name='attachments')
@@ -70,29 +70,42 @@ def poll_proposal_list(*, fetched_by: User, poll_id: int, filters=None):
         if not poll.public:
             group_user_permissions(group=poll.created_by.group.id, user=fetched_by)
 
-        positive_subquery = PollVotingTypeCardinal.objects.filter(author__poll=poll, score__gt=0
-                                                                  ).annotate(count=Func(F('id'),
-                                                                                        function='Count')
-                                                                             ).values('count')
-        negative_subquery = PollVotingTypeCardinal.objects.filter(author__poll=poll, score__lt=0
-                                                                  ).annotate(count=Func(F('id'),
-                                                                                        function='Count')
-                                                                             ).values('count')
-
         filters = filters or {}
-        qs = (PollProposal.objects.filter(created_by__group_id=poll.created_by.group.id, poll=poll)
-              .annotate(approval_positive=Subquery(positive_subquery),
-                        approval_negative=Subquery(negative_subquery))
-              .annotate(approval=F('approval_positive') - F('approval_negative'),
-                        priority=Sum('pollproposalpriority__score',
-                                     output_field=models.IntegerField(),
-                                     default=0),
-                        user_priority=Subquery(
-                            PollProposalPriority.objects.filter(proposal=OuterRef('id'),
-                                                                group_user__user=fetched_by).values('score'),
-                            output_field=models.IntegerField())
-                        )
-              .order_by(F('score').desc(nulls_last=True)).all())
+        qs = PollProposal.objects.filter(created_by__group_id=poll.created_by.group.id, poll=poll)
+
+        # Finished polls are served from their PollResult snapshot, without any live aggregates
+        if PollResult.objects.filter(poll=poll).exists():
+            qs = qs.annotate(**{f'result_{field}': F(f'snapshot__{field}')
+                                for field in ('score', 'participants', 'blank_votes', 'positive_votes')},
+                             approval_positive=F('snapshot__approval_positive'),
+                             approval_negative=F('snapshot__approval_negative'),
+                             priority=F('snapshot__priority')
+                             ).order_by('snapshot__rank')
+
+        else:
+            def approval_subquery(**kwargs):
+                return Subquery(PollVotingTypeCardinal.objects.filter(proposal=OuterRef('id'),
+                                                                      author__isnull=False,
+                                                                      **kwargs
+                                                                      ).annotate(count=Func(F('id'),
+                                                                                            function='Count')
+                                                                                 ).values('count'))
+
+            qs = qs.annotate(**{f'result_{field}': F(field)
+                                for field in ('score', 'participants', 'blank_votes', 'positive_votes')},
+                             approval_positive=approval_subquery(score__gt=0),
+                             approval_negative=approval_subquery(score__lt=0),
+                             priority=Sum('pollproposalpriority__score',
+                                          output_field=models.IntegerField(),
+                                          default=0)
+                             ).order_by(F('score').desc(nulls_last=True))
+
+        qs = (qs.annotate(approval=F('approval_positive') - F('approval_negative'),
+                          user_priority=Subquery(
+                              PollProposalPriority.objects.filter(proposal=OuterRef('id'),
+                                                                  group_user__user=fetched_by).values('score'),
+                              output_field=models.IntegerField())
+                          ).all())
 
         if poll.poll_type == Poll.PollType.SCHEDULE:
             return BasePollProposalScheduleFilter(filters, qs).qs
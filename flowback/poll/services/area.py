@@ -1,4 +1,6 @@
 from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 
 from flowback.common.services import get_object, model_update
@@ -47,9 +49,17 @@ def poll_area_statement_vote_update(user_id: int, poll_id: int, tag: int, vote:
 
     poll.check_phase('area_vote', 'dynamic')
 
-    # Create or Update
-    PollAreaStatementVote.objects.update_or_create(created_by=group_user,
-                                                   poll_area_statement=poll_area_statement,
-                                                   defaults=dict(vote=vote))
+    # Create or Update, moving the statement score by the difference to the previous vote
+    with transaction.atomic():
+        previous_vote = PollAreaStatementVote.objects.select_for_update().filter(
+            created_by=group_user, poll_area_statement=poll_area_statement).values_list('vote', flat=True).first()
+
+        PollAreaStatementVote.objects.update_or_create(created_by=group_user,
+                                                       poll_area_statement=poll_area_statement,
+                                                       defaults=dict(vote=vote))
+
+        score = (1 if vote else -1) - (0 if previous_vote is None else 1 if previous_vote else -1)
+        if score:
+            PollAreaStatement.objects.filter(id=poll_area_statement.id).update(score=F('score') + score)
 
     return poll_area_statement
@@ -6,18 +6,21 @@ from flowback.files.services import upload_collection
 from flowback.group.services import group_notification, group_schedule
 from flowback.notification.services import NotificationManager
 from flowback.poll.models import Poll, PollProposal, PollPriority
+from flowback.poll.selectors.poll import poll_timeline_notification_list
 from flowback.group.selectors import group_user_permissions
 from django.utils import timezone
 from datetime import datetime
 
-from flowback.poll.services.vote import poll_proposal_vote_count
-from flowback.poll.tasks import poll_area_vote_count, poll_prediction_bet_count
+from flowback.poll.services.vote import poll_proposal_vote_count, poll_result_snapshot_create
+from flowback.poll.tasks import poll_refresh_schedule
 from flowback.user.models import User
 
+# Timeline notifications are virtual, derived from the poll dates when listed
 poll_notification = NotificationManager(sender_type='poll', possible_categories=['timeline',
                                                                                  'poll',
                                                                                  'comment_self',
-                                                                                 'comment_all'])
+                                                                                 'comment_all'],
+                                        virtual_categories=dict(timeline=poll_timeline_notification_list))
 
 
 def poll_notification_subscribe(*, user_id: int, poll_id: int, categories: list[str]):
@@ -117,15 +120,8 @@ def poll_create(*, user_id: int,
                               timestamp=start_date,
                               related_id=poll.id)
 
-    poll_area_vote_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.area_vote_end_date)
-    poll_prediction_bet_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.prediction_bet_end_date)
-
-    # Poll notification
-    for date, name, phase in poll.labels:
-        poll_notification.create(sender_id=poll.id,
-                                 action=poll_notification.Action.update,
-                                 category='timeline',
-                                 message=f'Poll {poll.title} has started {phase.replace("_", " ").capitalize()} phase')
+    # Poll notification, the timeline channel has nothing stored but is subscribed to
+    poll_notification.load_channel(sender_id=poll.id, category='timeline')
 
     if poll_type == Poll.PollType.SCHEDULE:
         group_notification.create(sender_id=group_id,
@@ -169,31 +165,10 @@ def poll_delete(*, user_id: int, poll_id: int) -> None:
     else:
         group_user_permissions(group_user=group_user, permissions=['admin', 'force_delete_poll'])
 
-    # Remove future notifications
+    # Remove future notifications, the timeline goes with the poll
     if poll.current_phase == 'waiting':
         group_notification.delete(sender_id=group_id, category='poll', related_id=poll.id)
 
-    def delete_notifications_after(phase):
-        poll_notification.delete(sender_id=poll_id,
-                                 category='timeline',
-                                 timestamp__gt=phase)
-
-    match poll.current_phase:
-        case 'waiting':
-            delete_notifications_after(poll.proposal_end_date)
-        case 'proposal':
-            delete_notifications_after(poll.prediction_statement_end_date)
-        case 'area_vote':
-            delete_notifications_after(poll.area_vote_end_date)
-        case 'prediction_bet':
-            delete_notifications_after(poll.prediction_bet_end_date)
-        case 'delegate_vote':
-            delete_notifications_after(poll.delegate_vote_end_date)
-        case 'vote':
-            delete_notifications_after(poll.vote_end_date)
-        case 'result':
-            delete_notifications_after(poll.end_date)
-
     if poll.attachments:
         poll.attachments.delete()
 
@@ -232,13 +207,6 @@ def poll_fast_forward(*, user_id: int, poll_id: int, phase: str):
     poll.full_clean()
     poll.save()
 
-    # TODO update/remove previous celery tasks
-    poll_area_vote_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.area_vote_end_date)
-    poll_prediction_bet_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.prediction_bet_end_date)
-
-    poll_notification.shift(sender_id=poll_id,
-                            category='timeline',
-                            delta=time_difference)
     group_notification.shift(sender_id=group_user.group.id,
                              category='poll_schedule',
                              related_id=poll.id,
@@ -252,9 +220,12 @@ def poll_finish(*, poll_id: int) -> None:
         raise ValidationError("Poll is already finished")
 
     poll_proposal_vote_count(poll_id=poll_id)
+    poll.refresh_from_db()
     poll.result = True
     poll.save()
 
+    poll_result_snapshot_create(poll=poll)
+
 
 def poll_refresh(*, poll_id: int) -> None:
     poll = get_object(Poll, id=poll_id)
@@ -265,14 +236,17 @@ def poll_refresh(*, poll_id: int) -> None:
     if poll.status:
         raise ValidationError("Attempted to refresh a poll that's already finished")
 
-    poll_proposal_vote_count(poll_id=poll_id)
+    poll_refresh_schedule(poll_id)
 
 
-# TODO setup celery
+# Dynamic polls are recounted in the background, clients get the last counted results meanwhile
 def poll_refresh_cheap(*, poll_id: int) -> None:
     poll = get_object(Poll, id=poll_id)
 
-    if (poll.dynamic and not poll.status) or (not poll.status and timezone.now() >= poll.end_date):
+    if poll.dynamic and not poll.status and timezone.now() < poll.end_date:
+        poll_refresh_schedule(poll_id)
+
+    elif not poll.status and timezone.now() >= poll.end_date:
         poll_proposal_vote_count(poll_id=poll_id)
         poll.refresh_from_db()
 
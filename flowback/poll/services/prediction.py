@@ -1,5 +1,6 @@
 from typing import Union
 
+from django.db import transaction
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
@@ -7,6 +8,9 @@ from ..models import (PollPredictionBet,
                       PollPredictionStatement,
                       PollPredictionStatementSegment,
                       PollPredictionStatementVote,
+                      PollPredictionStatementOutcome,
+                      PollPredictionError,
+                      PollPredictorStatistics,
                       Poll, PollProposal)
 from ...common.services import get_object, model_update
 from ...group.selectors import group_user_permissions
@@ -119,6 +123,9 @@ def poll_prediction_bet_delete(user: Union[int, User], prediction_statement_id:
 
     prediction.delete()
 
+    # Keeps the error history in line with the remaining bets
+    poll_prediction_error_update(prediction_statement=prediction.prediction_statement)
+
 
 def poll_prediction_statement_vote_create(user: Union[int, User], prediction_statement_id: int, vote: bool):
     prediction_statement = get_object(PollPredictionStatement, id=prediction_statement_id)
@@ -129,8 +136,13 @@ def poll_prediction_statement_vote_create(user: Union[int, User], prediction_sta
     prediction_vote = PollPredictionStatementVote(created_by=group_user,
                                                   prediction_statement=prediction_statement,
                                                   vote=vote)
-    prediction_vote.full_clean()
-    prediction_vote.save()
+    with transaction.atomic():
+        prediction_vote.full_clean()
+        prediction_vote.save()
+
+        poll_prediction_statement_outcome_update(prediction_statement=prediction_statement,
+                                                 vote_yes=int(vote),
+                                                 vote_no=int(not vote))
 
 
 def poll_prediction_statement_vote_update(user: Union[int, User],
@@ -146,9 +158,16 @@ def poll_prediction_statement_vote_update(user: Union[int, User],
         raise ValidationError('Prediction statement vote not created by user')
 
     non_side_effect_fields = ['vote']
-    prediction_statement_vote, has_updated = model_update(instance=prediction_statement_vote,
-                                                          fields=non_side_effect_fields,
-                                                          data=data)
+    with transaction.atomic():
+        prediction_statement_vote, has_updated = model_update(instance=prediction_statement_vote,
+                                                              fields=non_side_effect_fields,
+                                                              data=data)
+
+        if has_updated:
+            vote = prediction_statement_vote.vote
+            poll_prediction_statement_outcome_update(prediction_statement=prediction_statement_vote.prediction_statement,
+                                                     vote_yes=1 if vote else -1,
+                                                     vote_no=-1 if vote else 1)
 
     return prediction_statement_vote
 
@@ -163,4 +182,76 @@ def poll_prediction_statement_vote_delete(user: Union[int, User], prediction_sta
     if prediction_statement_vote.created_by != group_user:
         raise ValidationError('Prediction statement vote not created by user')
 
-    prediction_statement_vote.delete()
+    with transaction.atomic():
+        prediction_statement_vote.delete()
+
+        vote = prediction_statement_vote.vote
+        poll_prediction_statement_outcome_update(prediction_statement=prediction_statement_vote.prediction_statement,
+                                                 vote_yes=-int(vote),
+                                                 vote_no=-int(not vote))
+
+
+# Moves the vote totals of a statement and resolves its outcome,
+# 1 if the statement came true, 0 if it didn't and 0.5 on a tie, None while nobody has voted
+def poll_prediction_statement_outcome_update(*,
+                                             prediction_statement: PollPredictionStatement,
+                                             vote_yes: int,
+                                             vote_no: int) -> PollPredictionStatementOutcome:
+    with transaction.atomic():
+        PollPredictionStatementOutcome.objects.get_or_create(prediction_statement=prediction_statement)
+        outcome = PollPredictionStatementOutcome.objects.select_for_update().get(
+            prediction_statement=prediction_statement)
+        outcome.vote_yes += vote_yes
+        outcome.vote_no += vote_no
+
+        resolved = None
+        if outcome.vote_yes or outcome.vote_no:
+            resolved = 1 if outcome.vote_yes > outcome.vote_no else 0 if outcome.vote_yes < outcome.vote_no else 0.5
+
+        resolution_changed = resolved != outcome.outcome
+        if resolution_changed:
+            outcome.outcome = resolved
+            outcome.resolved_at = None if resolved is None else timezone.now()
+
+        outcome.save()
+
+        if resolution_changed:
+            poll_prediction_error_update(prediction_statement=prediction_statement)
+
+    return outcome
+
+
+# Rewrites the errors of every bet on the statement after its outcome changed, and moves the running statistics
+# and leaderboard of each predictor in the poll tag. The old errors are taken out and the new ones added
+# with one statistics update each, however many bets there are
+def poll_prediction_error_update(*, prediction_statement: PollPredictionStatement) -> None:
+    tag_id = prediction_statement.poll.tag_id
+
+    if not tag_id:
+        return
+
+    with transaction.atomic():
+        errors = PollPredictionError.objects.select_for_update().filter(prediction_statement=prediction_statement)
+        old_errors = dict(errors.values_list('predictor_id', 'error'))
+
+        outcome = PollPredictionStatementOutcome.objects.filter(prediction_statement=prediction_statement
+                                                                ).values_list('outcome', flat=True).first()
+        new_errors = {} if outcome is None else {
+            predictor_id: outcome - score / 5
+            for predictor_id, score in PollPredictionBet.objects.filter(prediction_statement=prediction_statement
+                                                                        ).values_list('created_by_id', 'score')}
+
+        if old_errors == new_errors:
+            return
+
+        PollPredictionError.statistics_delete(errors)
+        PollPredictionError.objects.bulk_create([PollPredictionError(tag_id=tag_id,
+                                                                     predictor_id=predictor_id,
+                                                                     prediction_statement=prediction_statement,
+                                                                     error=error,
+                                                                     timestamp=prediction_statement.end_date)
+                                                 for predictor_id, error in new_errors.items()])
+
+        PollPredictorStatistics.error_update(tag_id=tag_id,
+                                             errors=[(predictor_id, error, prediction_statement.end_date, 1)
+                                                     for predictor_id, error in new_errors.items()])
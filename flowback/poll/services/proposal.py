@@ -67,7 +67,7 @@ def poll_proposal_create(*, user_id: int, poll_id: int,
 def poll_proposal_delete(*, user_id: int, proposal_id: int) -> None:
     proposal = get_object(PollProposal, id=proposal_id)
     group_user = group_user_permissions(group=proposal.created_by.group, user=user_id)
-    poll_refresh_cheap(poll_id=proposal.poll.id)  # TODO get celery
+    poll_refresh_cheap(poll_id=proposal.poll.id)
 
     if proposal.created_by == group_user and group_user.check_permission(delete_proposal=True):
         proposal.poll.check_phase('proposal', 'dynamic')
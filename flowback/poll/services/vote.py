@@ -1,13 +1,18 @@
-from django.db import models
-from django.db.models import Sum, Q, Count, F, OuterRef, Subquery, When, Case
+from collections import defaultdict
+
+import numpy as np
+from django.db import models, transaction
+from django.db.models import Sum, Q, Count, F, OuterRef, Subquery, When, Case, Value
+from django.db.models.functions import Coalesce
 from rest_framework.exceptions import ValidationError
 
-from backend.settings import SCORE_VOTE_CEILING, SCORE_VOTE_FLOOR
+from backend.settings import SCORE_VOTE_CEILING, SCORE_VOTE_FLOOR, FLOWBACK_POLL_TALLY_ENGINE
 from flowback.common.services import get_object
 from flowback.group.models import GroupUserDelegatePool, GroupUser
 from flowback.poll.models import Poll, PollProposal, PollVoting, PollVotingTypeRanking, PollDelegateVoting, \
-    PollVotingTypeForAgainst, PollVotingTypeCardinal, PollPriority
-from flowback.group.selectors import group_user_permissions
+    PollVotingTypeForAgainst, PollVotingTypeCardinal, PollPriority, PollProposalTally, PollResult, PollProposalResult, \
+    PollProposalPriority
+from flowback.group.selectors import group_user_permissions, group_delegation_graph
 from flowback.group.services import group_schedule
 from django.utils import timezone
 
@@ -22,73 +27,83 @@ def poll_proposal_vote_update(*, user_id: int, poll_id: int, data: dict) -> None
 
     poll.check_phase('vote', 'dynamic', 'schedule')
 
-    if poll.poll_type == Poll.PollType.RANKING:
+    with transaction.atomic():
+        poll_vote = PollVoting.objects.select_for_update().filter(created_by=group_user, poll=poll).first()
+        old_ballot = poll_vote_ballot(poll=poll, vote=poll_vote)
+
+        # Delete votes if no proposals are registered
         if not data['proposals']:
             PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
 
-        proposals = poll.pollproposal_set.filter(id__in=[x for x in data['proposals']]).all()
+        elif poll.poll_type == Poll.PollType.RANKING:
+            proposals = poll.pollproposal_set.filter(id__in=[x for x in data['proposals']]).all()
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
 
-        poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_ranking = [PollVotingTypeRanking(author=poll_vote,
-                                                   proposal_id=proposal,
-                                                   priority=len(data['proposals']) - priority)
-                             for priority, proposal in enumerate(data['proposals'])]
-        PollVotingTypeRanking.objects.filter(author=poll_vote).delete()
-        PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
+            poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
+            poll_vote_ranking = [PollVotingTypeRanking(author=poll_vote,
+                                                       proposal_id=proposal,
+                                                       priority=len(data['proposals']) - priority)
+                                 for priority, proposal in enumerate(data['proposals'])]
+            PollVotingTypeRanking.objects.filter(author=poll_vote).delete()
+            PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
 
-    elif poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
+        elif poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
 
-        if SCORE_VOTE_CEILING is not None and any([score >= SCORE_VOTE_CEILING for score in data['scores']]):
-            raise ValidationError(f'Voting scores exceeds ceiling bounds (currently set at {SCORE_VOTE_CEILING})')
+            if SCORE_VOTE_CEILING is not None and any([score >= SCORE_VOTE_CEILING for score in data['scores']]):
+                raise ValidationError(f'Voting scores exceeds ceiling bounds (currently set at {SCORE_VOTE_CEILING})')
 
-        if SCORE_VOTE_FLOOR is not None and any([score <= SCORE_VOTE_FLOOR for score in data['scores']]):
-            raise ValidationError(f'Voting scores exceeds floor bounds (currently set at {SCORE_VOTE_FLOOR})')
+            if SCORE_VOTE_FLOOR is not None and any([score <= SCORE_VOTE_FLOOR for score in data['scores']]):
+                raise ValidationError(f'Voting scores exceeds floor bounds (currently set at {SCORE_VOTE_FLOOR})')
 
-        # Delete votes if no polls are registered
-        if not data['proposals']:
-            PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
+            if len(data['scores']) != len(data['proposals']):
+                raise ValidationError("The amount of votes don't match the amount of polls")
 
-        if len(data['scores']) != len(data['proposals']):
-            raise ValidationError("The amount of votes don't match the amount of polls")
+            proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+            poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
+            poll_vote_cardinal = [PollVotingTypeCardinal(author=poll_vote,
+                                                         proposal_id=data['proposals'][i],
+                                                         raw_score=data['scores'][i])
+                                  for i in range(len(data['proposals']))]
 
-        user_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_cardinal = [PollVotingTypeCardinal(author=user_vote,
-                                                     proposal_id=data['proposals'][i],
-                                                     raw_score=data['scores'][i])
-                              for i in range(len(data['proposals']))]
+            PollVotingTypeCardinal.objects.filter(author=poll_vote).delete()
+            PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
 
-        PollVotingTypeCardinal.objects.filter(author=user_vote).delete()
-        PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
+        elif poll.poll_type == Poll.PollType.SCHEDULE:
+            proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
 
-    elif poll.poll_type == Poll.PollType.SCHEDULE:
-        if not data['proposals']:
-            PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+            poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
+            poll_vote_schedule = [PollVotingTypeForAgainst(author=poll_vote,
+                                                           proposal_id=proposal,
+                                                           vote=True)
+                                  for proposal in data['proposals']]
+            PollVotingTypeForAgainst.objects.filter(author=poll_vote).delete()
+            PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+        else:
+            raise ValidationError('Unknown poll type')
 
-        poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_schedule = [PollVotingTypeForAgainst(author=poll_vote,
-                                                       proposal_id=proposal,
-                                                       vote=True)
-                              for proposal in data['proposals']]
-        PollVotingTypeForAgainst.objects.filter(author=poll_vote).delete()
-        PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
+        voted = bool(data['proposals'])
+        had_voted = bool(old_ballot)
+        participants = int(voted) - int(had_voted)
 
-    else:
-        raise ValidationError('Unknown poll type')
+        # Delegates stop representing the user while the user has a vote of their own
+        if participants:
+            participants += poll_delegator_mandate_update(poll=poll, group_user=group_user, change=-participants)
+
+        poll_proposal_tally_update(poll=poll,
+                                   old_ballot=old_ballot,
+                                   new_ballot=poll_vote_ballot(poll=poll, vote=poll_vote if voted else None))
+
+        if participants:
+            Poll.objects.filter(id=poll.id).update(participants=F('participants') + participants)
 
 
 # TODO update in future for delegate pool
@@ -102,230 +117,418 @@ def poll_proposal_delegate_vote_update(*, user_id: int, poll_id: int, data) -> N
 
     poll.check_phase('delegate_vote', 'dynamic', 'schedule')
 
-    if poll.poll_type == Poll.PollType.RANKING:
+    with transaction.atomic():
+        poll_vote = PollDelegateVoting.objects.select_for_update().filter(created_by=delegate_pool, poll=poll).first()
+        old_ballot = poll_vote_ballot(poll=poll, vote=poll_vote)
+        old_mandate = poll_vote.mandate if poll_vote else 0
+
+        # Delete votes if no proposals are registered
         if not data['proposals']:
             PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+        elif poll.poll_type == Poll.PollType.RANKING:
+            proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
+
+            poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
+            poll_vote_ranking = [PollVotingTypeRanking(author_delegate=poll_vote,
+                                                       proposal_id=proposal,
+                                                       priority=len(data['proposals']) - priority)
+                                 for priority, proposal in enumerate(data['proposals'])]
+            PollVotingTypeRanking.objects.filter(author_delegate=poll_vote).delete()
+            PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
+
+        elif poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
+            if len(data['scores']) != len(data['proposals']):
+                raise ValidationError("The amount of votes don't match the amount of polls")
+
+            proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
+
+            poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
+            poll_vote_cardinal = [PollVotingTypeCardinal(author_delegate=poll_vote,
+                                                         proposal_id=data['proposals'][i],
+                                                         raw_score=data['scores'][i])
+                                  for i in range(len(data['proposals']))]
+
+            PollVotingTypeCardinal.objects.filter(author_delegate=poll_vote).delete()
+            PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
+
+        elif poll.poll_type == Poll.PollType.SCHEDULE:
+            proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+
+            if len(proposals) != len(data['proposals']):
+                raise ValidationError('Not all proposals are available to vote for')
+
+            poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
+            poll_vote_schedule = [PollVotingTypeForAgainst(author_delegate=poll_vote,
+                                                           proposal_id=proposal,
+                                                           vote=True)
+                                  for proposal in data['proposals']]
+            PollVotingTypeForAgainst.objects.filter(author_delegate=poll_vote).delete()
+            PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
+
+        else:
+            raise ValidationError('Unknown poll type')
+
+        new_mandate = 0
+        if data['proposals']:
+            new_mandate = poll_delegate_mandate(poll=poll, delegate_pool=delegate_pool)
+            PollDelegateVoting.objects.filter(id=poll_vote.id).update(mandate=new_mandate)
+
+        poll_proposal_tally_update(poll=poll,
+                                   old_ballot=old_ballot,
+                                   new_ballot=poll_vote_ballot(poll=poll,
+                                                               vote=poll_vote if data['proposals'] else None),
+                                   old_weight=old_mandate,
+                                   new_weight=new_mandate)
+
+        if new_mandate != old_mandate:
+            Poll.objects.filter(id=poll.id).update(participants=F('participants') + new_mandate - old_mandate)
+
+
+# Builds the (delegate_pool -> mandate) table of a poll from the group's delegation graph.
+# Delegators who voted by themselves, or are no longer active, are not part of any mandate
+def poll_delegate_mandate_resolve(*, poll: Poll, delegate_pool_ids: list[int] = None) -> dict[int, int]:
+    if delegate_pool_ids is None:
+        delegate_pool_ids = PollDelegateVoting.objects.filter(poll=poll).values_list('created_by_id', flat=True)
+
+    mandates = dict.fromkeys(delegate_pool_ids, 0)
+
+    if not poll.tag_id or not mandates:
+        return mandates
+
+    graph = group_delegation_graph(group_id=poll.created_by.group_id)
+    direct_voters = set(PollVoting.objects.filter(poll=poll).values_list('created_by_id', flat=True))
+
+    return {delegate_pool_id: graph.mandate(tag_id=poll.tag_id, pool_id=delegate_pool_id, exclude=direct_voters)
+            for delegate_pool_id in mandates}
+
+
+# Returns the delegators the delegate pool represents on the poll
+def poll_delegate_mandate(*, poll: Poll, delegate_pool: GroupUserDelegatePool) -> int:
+    return poll_delegate_mandate_resolve(poll=poll, delegate_pool_ids=[delegate_pool.id])[delegate_pool.id]
+
+
+# Moves the mandate of a delegator on every delegate vote representing them, returns the total mandate change
+def poll_delegator_mandate_update(*, poll: Poll, group_user: GroupUser, change: int) -> int:
+    if not poll.tag_id:
+        return 0
+
+    delegate_pools = group_delegation_graph(group_id=group_user.group_id).delegate_pools(tag_id=poll.tag_id,
+                                                                                        delegator_id=group_user.id)
+    delegate_votes = list(PollDelegateVoting.objects.select_for_update().filter(poll=poll,
+                                                                                created_by__in=delegate_pools))
+
+    for delegate_vote in delegate_votes:
+        poll_proposal_tally_update(poll=poll,
+                                   old_ballot=[],
+                                   new_ballot=poll_vote_ballot(poll=poll, vote=delegate_vote),
+                                   new_weight=change)
+
+    PollDelegateVoting.objects.filter(id__in=[vote.id for vote in delegate_votes]
+                                      ).update(mandate=F('mandate') + change)
+
+    return change * len(delegate_votes)
+
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+# Returns the votes of a voter as (proposal_id, score) pairs.
+# Ranking scores are relative to the amount of proposals in the poll, see PollProposalTally
+def poll_vote_ballot(*, poll: Poll, vote: PollVoting | PollDelegateVoting | None) -> list[tuple[int, int]]:
+    if vote is None:
+        return []
 
-        poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_ranking = [PollVotingTypeRanking(author_delegate=poll_vote,
-                                                   proposal_id=proposal,
-                                                   priority=len(data['proposals']) - priority)
-                             for priority, proposal in enumerate(data['proposals'])]
-        PollVotingTypeRanking.objects.filter(author_delegate=poll_vote).delete()
-        PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
+    author = 'author_delegate' if isinstance(vote, PollDelegateVoting) else 'author'
+
+    if poll.poll_type == Poll.PollType.RANKING:
+        votes = PollVotingTypeRanking.objects.filter(**{author: vote}).values_list('proposal_id', 'priority')
+        return [(proposal_id, priority - len(votes)) for proposal_id, priority in votes]
 
     elif poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
+        return list(PollVotingTypeCardinal.objects.filter(**{author: vote}).values_list('proposal_id', 'raw_score'))
+
+    elif poll.poll_type == Poll.PollType.SCHEDULE:
+        votes = PollVotingTypeForAgainst.objects.filter(**{author: vote}).values_list('proposal_id', 'vote')
+        return [(proposal_id, 1 if vote else -1) for proposal_id, vote in votes]
+
+    return []
+
+
+# Applies the difference between an old and a new ballot to PollProposalTally with one UPDATE,
+# each ballot weighs as much as the mandate of the voter. Dynamic polls show the new totals right away
+def poll_proposal_tally_update(*,
+                               poll: Poll,
+                               old_ballot: list[tuple[int, int]],
+                               new_ballot: list[tuple[int, int]],
+                               old_weight: int = 1,
+                               new_weight: int = 1) -> None:
+    deltas = defaultdict(lambda: dict(score=0, participants=0, blank_votes=0, positive_votes=0))
+
+    for ballot, weight in ((old_ballot, -old_weight), (new_ballot, new_weight)):
+        for proposal_id, score in ballot:
+            delta = deltas[proposal_id]
+            delta['score'] += score * weight
+            delta['participants'] += weight
+
+            # Ranking votes always score above zero once the amount of proposals is added
+            if poll.poll_type == Poll.PollType.RANKING or score > 0:
+                delta['positive_votes'] += weight
+
+            elif score == 0:
+                delta['blank_votes'] += weight
+
+    deltas = {proposal_id: delta for proposal_id, delta in deltas.items() if any(delta.values())}
+
+    if not deltas:
+        return
+
+    def delta_case(field: str):
+        return Case(*[When(proposal_id=proposal_id, then=Value(delta[field]))
+                      for proposal_id, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=models.IntegerField())
+
+    PollProposalTally.objects.filter(proposal_id__in=deltas.keys()).update(
+        **{field: F(field) + delta_case(field)
+           for field in ('score', 'participants', 'blank_votes', 'positive_votes')})
+
+    if poll.dynamic:
+        poll_proposal_tally_sync(poll=poll)
+
+
+# Copies the running totals from PollProposalTally to the proposals of the poll
+def poll_proposal_tally_sync(*, poll: Poll) -> None:
+    tally = PollProposalTally.objects.filter(proposal=OuterRef('id'))
+    score = Subquery(tally.values('score'))
+
+    if poll.poll_type == Poll.PollType.RANKING:
+        score = score + poll.pollproposal_set.count() * Subquery(tally.values('participants'))
+
+    PollProposal.objects.filter(poll=poll).update(score=score,
+                                                  participants=Subquery(tally.values('participants')),
+                                                  blank_votes=Subquery(tally.values('blank_votes')),
+                                                  positive_votes=Subquery(tally.values('positive_votes')))
 
-        # Delete votes if no polls are registered
-        if not data['proposals']:
-            PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
 
-        if len(data['scores']) != len(data['proposals']):
-            raise ValidationError("The amount of votes don't match the amount of polls")
+# Calculates the score of every vote in the poll, one UPDATE for user votes and one for delegate votes.
+# Delegate votes are multiplied by the mandate saved on their PollDelegateVoting account
+def poll_vote_score_update(*, poll: Poll, total_proposals: int) -> None:
+    mandate = PollDelegateVoting.objects.filter(id=OuterRef('author_delegate')).values('mandate')
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+    if poll.poll_type == Poll.PollType.RANKING:
+        # Score is the amount of proposals ranked below the vote, counted from the bottom of every proposal
+        def ranking_score(author: str):
+            ranked = PollVotingTypeRanking.objects.filter(**{author: OuterRef(author)}).values(author).annotate(
+                total=Count('id')).values('total')
+            return total_proposals - (Subquery(ranked) - F('priority'))
 
-        pool_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_cardinal = [PollVotingTypeCardinal(author_delegate=pool_vote,
-                                                     proposal_id=data['proposals'][i],
-                                                     score=data['scores'][i])
-                              for i in range(len(data['proposals']))]
+        PollVotingTypeRanking.objects.filter(author__poll=poll).update(score=ranking_score('author'))
+        PollVotingTypeRanking.objects.filter(author_delegate__poll=poll).update(
+            score=ranking_score('author_delegate') * Subquery(mandate))
 
-        PollVotingTypeCardinal.objects.filter(author_delegate=pool_vote).delete()
-        PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
+    elif poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
+        PollVotingTypeCardinal.objects.filter(author__poll=poll).update(score=F('raw_score'))
+        PollVotingTypeCardinal.objects.filter(author_delegate__poll=poll).update(
+            score=F('raw_score') * Subquery(mandate))
 
     elif poll.poll_type == Poll.PollType.SCHEDULE:
-        if not data['proposals']:
-            PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
+        vote_score = Case(When(vote=True, then=1), default=-1, output_field=models.IntegerField())
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+        PollVotingTypeForAgainst.objects.filter(author__poll=poll).update(score=vote_score)
+        PollVotingTypeForAgainst.objects.filter(author_delegate__poll=poll).update(
+            score=vote_score * Subquery(mandate))
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
 
-        poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_schedule = [PollVotingTypeForAgainst(author_delegate=poll_vote,
-                                                       proposal_id=proposal,
-                                                       vote=True)
-                              for proposal in enumerate(data['proposals'])]
-        PollVotingTypeForAgainst.objects.filter(author_delegate=poll_vote).delete()
-        PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
+# Summarizes the votes of every proposal in the poll with one aggregate query and saves them with one bulk update.
+# User votes weigh one while delegate votes weigh as much as their mandate
+def poll_proposal_score_update(*, poll: Poll, voting_type_class) -> None:
+    vote = voting_type_class._meta.model_name
+    weight = Case(When(**{f'{vote}__author__isnull': False}, then=1),
+                  default=F(f'{vote}__author_delegate__mandate'),
+                  output_field=models.IntegerField())
+
+    proposals = list(PollProposal.objects.filter(poll=poll).annotate(
+        total_score=Sum(f'{vote}__score'),
+        total_participants=Sum(weight, default=0),
+        total_blank_votes=Sum(weight, filter=Q(**{f'{vote}__score': 0}), default=0),
+        total_positive_votes=Sum(weight, filter=Q(**{f'{vote}__score__gt': 0}), default=0)))
 
+    for proposal in proposals:
+        proposal.score = proposal.total_score
+        proposal.participants = proposal.total_participants
+        proposal.blank_votes = proposal.total_blank_votes
+        proposal.positive_votes = proposal.total_positive_votes
+
+    poll_proposal_score_save(poll=poll, proposals=proposals)
+
+
+# Loads the votes of a ranking or cardinal poll once as a voter x proposal matrix and sums it with NumPy.
+# User votes weigh one while delegate votes weigh as much as their mandate, keyed by PollDelegateVoting id
+def poll_proposal_matrix_score_update(*, poll: Poll, delegate_mandates: dict[int, int]) -> None:
+    proposals = list(PollProposal.objects.filter(poll=poll).order_by('id'))
+    proposal_ids = np.array([proposal.id for proposal in proposals], dtype=np.int64)
+
+    if poll.poll_type == Poll.PollType.RANKING:
+        voting_type_class, raw_score = PollVotingTypeRanking, 'priority'
     else:
-        raise ValidationError('Unknown poll type')
+        voting_type_class, raw_score = PollVotingTypeCardinal, 'raw_score'
 
+    # Delegate votes are keyed by their negated PollDelegateVoting id to share one voter axis with user votes
+    votes = voting_type_class.objects.filter(proposal__poll=poll).annotate(
+        voter=Coalesce('author_id', -F('author_delegate_id'))).values_list('voter', 'proposal_id', raw_score)
+    votes = np.array(list(votes), dtype=np.int64).reshape(-1, 3)
 
-def poll_proposal_vote_count(*, poll_id: int) -> None:
+    voters, voter_index = np.unique(votes[:, 0], return_inverse=True)
+    proposal_index = np.searchsorted(proposal_ids, votes[:, 1])
+
+    matrix = np.zeros((len(voters), len(proposals)), dtype=np.int64)
+    voted = np.zeros((len(voters), len(proposals)), dtype=bool)
+    matrix[voter_index, proposal_index] = votes[:, 2]
+    voted[voter_index, proposal_index] = True
+
+    weights = np.array([1 if voter > 0 else delegate_mandates.get(-voter, 0) for voter in voters],
+                       dtype=np.int64)[:, np.newaxis]
+
+    # Borda style, the lowest ranked proposal of a ballot is worth the amount of unranked proposals plus one
+    if poll.poll_type == Poll.PollType.RANKING:
+        matrix = len(proposals) - voted.sum(axis=1, keepdims=True) + matrix
+
+    matrix = np.where(voted, matrix, 0)
+    score = (matrix * weights).sum(axis=0)
+    participants = (voted * weights).sum(axis=0)
+    blank_votes = ((voted & (matrix == 0)) * weights).sum(axis=0)
+    positive_votes = ((voted & (matrix > 0)) * weights).sum(axis=0)
+    has_votes = voted.any(axis=0)
+
+    for i, proposal in enumerate(proposals):
+        proposal.score = int(score[i]) if has_votes[i] else None
+        proposal.participants = int(participants[i])
+        proposal.blank_votes = int(blank_votes[i])
+        proposal.positive_votes = int(positive_votes[i])
+
+    poll_proposal_score_save(poll=poll, proposals=proposals)
+
+
+# Saves the counted proposals with one bulk update and resynchronizes their running totals
+def poll_proposal_score_save(*, poll: Poll, proposals: list[PollProposal]) -> None:
+    PollProposal.objects.bulk_update(proposals, fields=('score', 'participants', 'blank_votes', 'positive_votes'))
+
+    # Ranking scores are stored relative to the amount of proposals
+    relative_score = len(proposals) if poll.poll_type == Poll.PollType.RANKING else 0
+    PollProposalTally.objects.bulk_create([PollProposalTally(proposal=proposal,
+                                                             score=(proposal.score or 0)
+                                                             - relative_score * proposal.participants,
+                                                             participants=proposal.participants,
+                                                             blank_votes=proposal.blank_votes,
+                                                             positive_votes=proposal.positive_votes)
+                                           for proposal in proposals],
+                                          update_conflicts=True,
+                                          unique_fields=('proposal',),
+                                          update_fields=('score', 'participants', 'blank_votes', 'positive_votes'))
+
+
+def poll_proposal_vote_count(*, poll_id: int, engine: str = None) -> None:
     poll = get_object(Poll, id=poll_id)
     group = poll.created_by.group
     total_proposals = poll.pollproposal_set.count()
+    voting_type_class = {Poll.PollType.RANKING: PollVotingTypeRanking,
+                         Poll.PollType.CARDINAL: PollVotingTypeCardinal,
+                         Poll.PollType.VOTE: PollVotingTypeCardinal,
+                         Poll.PollType.SCHEDULE: PollVotingTypeForAgainst}.get(poll.poll_type)
 
-    def save_participants_count(voting_type_class):
-        blank_votes = voting_type_class.objects.filter(author__poll=poll, score=0).count()
-        blank_votes += voting_type_class.objects.filter(
-            author_delegate__poll=poll, score=0
-        ).annotate(total_blank_votes=Subquery(mandate_subquery)).aggregate(blank_votes=Sum('total_blank_votes')
-                                                                           ).get('total_blank_votes') or 0
-
-        participants = voting_type_class.objects.filter(author__poll=poll).count()
-        participants += voting_type_class.objects.filter(author_delegate__poll=poll
-                                                         ).annotate(participants=Subquery(mandate_subquery)
-                                                                    ).aggregate(total_participants=Sum(participants)
-                                                                                ).get('total_participants') or 0
-
-        positive_votes = voting_type_class.objects.filter(author__poll=poll, score__gt=0
-                                                          ).count()
-        positive_votes += voting_type_class.objects.filter(author_delegate__poll=poll, score__gt=0
-                                                           ).annotate(
-            positive_votes=Subquery(mandate_subquery)).aggregate(total_positive_votes=Sum('positive_votes')
-                                                                 ).get('total_positive_votes') or 0
-
-        PollProposal.objects.filter(poll=poll).update(blank_votes=blank_votes,
-                                                      participants=participants,
-                                                      positive_votes=positive_votes)
-
-    # Count mandate for each delegate, multiply it by score
-    # TODO Redundant
-    mandate = GroupUserDelegatePool.objects.filter(polldelegatevoting__poll=poll).aggregate(
-        mandate=Count('groupuserdelegator',
-                      filter=~Q(groupuserdelegator__delegator__pollvoting__poll=poll
-                                ) & Q(groupuserdelegator__tags__in=[poll.tag]
-                                      ) & Q(groupuserdelegator__delegator__active=True)
-                      ))['mandate']
-
-    mandate_subquery = GroupUserDelegatePool.objects.filter(id=OuterRef('author_delegate__created_by')).annotate(
-        mandate=Count('groupuserdelegator',
-                      filter=~Q(groupuserdelegator__delegator__pollvoting__poll=poll
-                                ) & Q(groupuserdelegator__tags__in=[poll.tag]
-                                      ) & Q(groupuserdelegator__delegator__active=True)
-                      )).values('mandate')
-
-    # Count mandate for each delegate, save it to PollDelegateVoting account
-    total_mandate = PollDelegateVoting.objects.filter(id=OuterRef('id')).annotate(
-        total_mandate=Count('created_by__groupuserdelegator',
-                      filter=~Q(created_by__groupuserdelegator__delegator__pollvoting__poll=poll
-                                ) & Q(created_by__groupuserdelegator__tags__in=[poll.tag]
-                                      ) & Q(created_by__groupuserdelegator__delegator__active=True)
-                      )).values('total_mandate')
-
-    PollDelegateVoting.objects.update(mandate=Subquery(total_mandate))
-
-    if poll.poll_type == Poll.PollType.RANKING:
-        if poll.tag:
-            delegate_votes = PollVotingTypeRanking.objects.filter(author_delegate__poll=poll).values('pk').annotate(
-                score=(total_proposals - (Count('author_delegate__pollvotingtyperanking') - F('priority'))
-                       ) * Subquery(mandate_subquery))
+    with transaction.atomic():
+        # Count mandate for each delegate once, save it to PollDelegateVoting account for the vote scores
+        mandates = poll_delegate_mandate_resolve(poll=poll)
+        delegate_votes = list(PollDelegateVoting.objects.filter(poll=poll))
 
-            # Set score to the same as priority for user votes
-            user_votes = PollVotingTypeRanking.objects.filter(author__poll=poll
-                                                              ).values('pk').annotate(
-                score=total_proposals - (Count('author__pollvotingtyperanking') - F('priority')))
+        for delegate_vote in delegate_votes:
+            delegate_vote.mandate = mandates[delegate_vote.created_by_id]
 
-            for i in user_votes:
-                PollVotingTypeRanking.objects.filter(id=i['pk']).update(score=i['score'])
+        PollDelegateVoting.objects.bulk_update(delegate_votes, fields=('mandate',))
+        mandate = sum(mandates.values())
 
-            for i in delegate_votes:
-                PollVotingTypeRanking.objects.filter(id=i['pk']).update(score=i['score'])
+        if poll.tag and voting_type_class:
+            poll_vote_score_update(poll=poll, total_proposals=total_proposals)
 
-            # TODO make this work, replace both above
-            # PollVotingTypeRanking.objects.bulk_update(delegate_votes | user_votes, fields=('score',))
+            if (engine or FLOWBACK_POLL_TALLY_ENGINE) == 'numpy' and voting_type_class != PollVotingTypeForAgainst:
+                poll_proposal_matrix_score_update(poll=poll,
+                                                  delegate_mandates={delegate_vote.id: delegate_vote.mandate
+                                                                     for delegate_vote in delegate_votes})
 
-            # Update scores on each proposal, Summarize both regular votes and delegate votes
-            proposals = PollProposal.objects.filter(poll_id=poll_id).values('pk') \
-                .annotate(score=Sum('pollvotingtyperanking__score'))
+            else:
+                poll_proposal_score_update(poll=poll, voting_type_class=voting_type_class)
 
-            for i in proposals:
-                PollProposal.objects.filter(id=i['pk']).update(score=i['score'])
+            poll.participants = mandate + PollVoting.objects.filter(poll=poll).count()
 
-            save_participants_count(PollVotingTypeRanking)
+            if poll.poll_type == Poll.PollType.SCHEDULE:
+                poll.participants = poll.participants or 1
 
-            # TODO make this work aswell, replace above
-            # PollProposal.objects.bulk_update(proposals, fields=('score',))
+            poll.save()
 
-            poll.participants = mandate + PollVoting.objects.filter(poll=poll).all().count()
+        total_group_users = group.member_count
+        quorum = (poll.quorum if poll.quorum is not None else group.default_quorum) / 100
+
+        if poll.finished and not poll.result:
+            if poll.poll_type == Poll.PollType.SCHEDULE:
+                winning_proposal = PollProposal.objects.filter(
+                    poll_id=poll_id).order_by('-score', '-pollproposaltypeschedule__event__start_date').first()
+                if winning_proposal:
+                    event = winning_proposal.pollproposaltypeschedule.event
+                    create_event(schedule_id=group.schedule_id,
+                                 title=poll.title,
+                                 start_date=event.start_date,
+                                 end_date=event.end_date,
+                                 origin_name=poll.schedule_origin,
+                                 origin_id=poll.id,
+                                 description=poll.description)
+
+            poll.status = 1 if poll.participants > total_group_users * quorum else -1
+            poll.result = True
             poll.save()
 
-    if poll.poll_type in [Poll.PollType.CARDINAL, Poll.PollType.VOTE]:
-        if poll.tag:
-            # Calculate user scores
-            # user_weight = PollVoting.objects.filter(id=OuterRef('author'), poll=poll
-            #                                         ).annotate(weight=Sum('pollvotingtypecardinal__raw_score')
-            #                                                    ).values('weight')
-            PollVotingTypeCardinal.objects.filter(author__isnull=False,
-                                                  proposal__poll=poll).update(score=F('raw_score'))
-            # delegate_weight = PollDelegateVoting.objects.filter(id=OuterRef('author_delegate'), poll=poll
-            #                                                 ).annotate(weight=Sum('pollvotingtypecardinal__raw_score')
-            #                                                            ).values('weight')
-            # Calculate delegate scores
-            delegate_scores = PollVotingTypeCardinal.objects.filter(id=OuterRef('id')).annotate(
-                final_score=F('raw_score') * F('author_delegate__mandate')).values('final_score')
-            PollVotingTypeCardinal.objects.filter(author_delegate__isnull=False, proposal__poll=poll
-                                                  ).update(score=Subquery(delegate_scores))
-
-            proposal_scores = PollProposal.objects.filter(id=OuterRef('id')).annotate(final_score=Sum('pollvotingtypecardinal__score')).values('final_score')
-            PollProposal.objects.update(score=Subquery(proposal_scores))
-
-            save_participants_count(PollVotingTypeCardinal)
-
-    if poll.poll_type == Poll.PollType.SCHEDULE:
-        if poll.tag:
-            delegate_votes = PollVotingTypeForAgainst.objects.filter(author_delegate__poll=poll).values('pk').annotate(
-                score=(Count('author_delegate__pollvotingtypeforagainst',
-                             filter=Q(vote=True)) * Subquery(mandate_subquery) -
-                       Count('author_delegate__pollvotingtypeforagainst',
-                             filter=Q(vote=False)) * Subquery(mandate_subquery)))
-
-            # Set score to the same as priority for user votes
-            user_votes = PollVotingTypeForAgainst.objects.filter(author__poll=poll, vote=True).values('pk', 'vote')
-
-            for i in user_votes:
-                PollVotingTypeForAgainst.objects.filter(id=i['pk']).update(score=int(i['vote']))
-
-            for i in delegate_votes:
-                PollVotingTypeForAgainst.objects.filter(id=i['pk']).update(score=int(i['vote']))
-
-            # TODO make this work, replace both above (Copied from ranking comment)
-            # PollVotingTypeSchedule.objects.bulk_update(delegate_votes | user_votes, fields=('score',))
-
-            # Update scores on each proposal, Summarize both regular votes and delegate votes
-            proposals = PollProposal.objects.filter(poll_id=poll_id).values('pk') \
-                .annotate(score=Sum('pollvotingtypeforagainst__score'))
-
-            for i in proposals:
-                PollProposal.objects.filter(id=i['pk']).update(score=i['score'])
-
-            # TODO make this work aswell, replace above
-            # PollProposal.objects.bulk_update(proposals, fields=('score',))
-
-            poll.participants = (mandate + PollVoting.objects.filter(poll=poll).all().count()) or 1
-
-    total_group_users = GroupUser.objects.filter(group=group).count()
-    quorum = (poll.quorum if poll.quorum is not None else group.default_quorum) / 100
-
-    if poll.finished and not poll.result:
-        if poll.poll_type == Poll.PollType.SCHEDULE:
-            winning_proposal = PollProposal.objects.filter(
-                poll_id=poll_id).order_by('-score', '-pollproposaltypeschedule__event__start_date').first()
-            if winning_proposal:
-                event = winning_proposal.pollproposaltypeschedule.event
-                create_event(schedule_id=group.schedule_id,
-                             title=poll.title,
-                             start_date=event.start_date,
-                             end_date=event.end_date,
-                             origin_name=poll.schedule_origin,
-                             origin_id=poll.id,
-                             description=poll.description)
-
-        poll.status = 1 if poll.participants > total_group_users * quorum else -1
-        poll.result = True
-        poll.save()
+            poll_result_snapshot_create(poll=poll, total_group_users=total_group_users)
+
+
+# Freezes the outcome of a finished poll into PollResult, later reads of the poll are served from it
+def poll_result_snapshot_create(*, poll: Poll, total_group_users: int = None) -> PollResult | None:
+    if PollResult.objects.filter(poll=poll).exists():
+        return None
+
+    group = poll.created_by.group
+    if total_group_users is None:
+        total_group_users = group.member_count
+
+    priority = PollProposalPriority.objects.filter(proposal=OuterRef('id')).values('proposal').annotate(
+        priority=Sum('score')).values('priority')
+    proposals = PollProposal.objects.filter(poll=poll).annotate(
+        priority=Coalesce(Subquery(priority), 0),
+        approval_positive=Count('pollvotingtypecardinal', filter=Q(pollvotingtypecardinal__author__isnull=False,
+                                                                   pollvotingtypecardinal__score__gt=0)),
+        approval_negative=Count('pollvotingtypecardinal', filter=Q(pollvotingtypecardinal__author__isnull=False,
+                                                                   pollvotingtypecardinal__score__lt=0))
+    ).order_by(F('score').desc(nulls_last=True), 'id')
+
+    result = PollResult(poll=poll,
+                        status=poll.status,
+                        participants=poll.participants,
+                        total_group_users=total_group_users,
+                        quorum=poll.quorum if poll.quorum is not None else group.default_quorum)
+    result.full_clean()
+    result.save()
+
+    PollProposalResult.objects.bulk_create([PollProposalResult(result=result,
+                                                               proposal=proposal,
+                                                               rank=rank,
+                                                               score=proposal.score,
+                                                               participants=proposal.participants,
+                                                               blank_votes=proposal.blank_votes,
+                                                               positive_votes=proposal.positive_votes,
+                                                               approval_positive=proposal.approval_positive,
+                                                               approval_negative=proposal.approval_negative,
+                                                               priority=proposal.priority)
+                                            for rank, proposal in enumerate(proposals, start=1)])
+
+    return result
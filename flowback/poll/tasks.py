@@ -1,25 +1,37 @@
-import random
+import logging
+
 from celery import shared_task
 from django.contrib.postgres.aggregates import ArrayAgg
-from django.db import models
-from django.db.models import Count, Q, Sum, OuterRef, Case, When, F, Subquery
-from django.db.models.functions import Cast
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from django.utils import timezone
 
+from backend.settings import FLOWBACK_POLL_REFRESH_INTERVAL, FLOWBACK_PREDICTION_COVARIANCE, \
+    FLOWBACK_POLL_PHASE_INTERVAL
 from flowback.common.services import get_object
-from flowback.group.models import GroupTags, GroupUser
+from flowback.group.models import GroupTags
 from flowback.poll.models import Poll, PollAreaStatement, PollPredictionBet, PollPredictionStatementVote, \
-    PollPredictionStatement
+    PollPredictionStatement, PollPredictionError, PollPredictorStatistics, PollPhaseTransition
+from flowback.poll.selectors.area import poll_area_statement_leading
+from flowback.poll.services.vote import poll_proposal_vote_count
+from flowback.prediction.utils import prediction_error_covariance, prediction_error_covariance_shrunk, \
+    prediction_combined_weights
 
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Phase transition tasks queued with an eta (from before poll_phase_transition_process took over) go through
+# poll_phase_transition_run like the process does, so that a boundary is only ever handled once.
+# Called directly, e.g. by the process, they run the transition itself
+@shared_task(bind=True)
+def poll_area_vote_count(self, poll_id: int):
+    if not self.request.called_directly:
+        return poll_phase_transition_run(poll_id=poll_id, phase=PollPhaseTransition.Phase.AREA_VOTE)
 
-@shared_task
-def poll_area_vote_count(poll_id: int):
     poll = get_object(Poll, id=poll_id)
-    statement = PollAreaStatement.objects.filter(poll=poll).annotate(
-        result=Count('pollareastatementvote', filter=Q(pollareastatementvote__vote=True)) -
-               Count('pollareastatementvote', filter=Q(pollareastatementvote__vote=False))).order_by('-result').first()
+    statement = poll_area_statement_leading(poll_id=poll.id)
 
     if statement:
         tag = GroupTags.objects.filter(pollareastatementsegment__poll_area_statement_id=statement).first()
@@ -32,161 +44,192 @@ def poll_area_vote_count(poll_id: int):
     return poll
 
 
-@shared_task
-def poll_prediction_bet_count(poll_id: int):
+# Loads the bets of every predictor in the poll on the given statements with one query,
+# returns the predictor ids and a predictor x statement matrix of bets (0 to 1) with NaN for missing bets
+def poll_prediction_bet_matrix(*, poll: Poll, statement_ids: list[int]) -> tuple[list[int], np.ndarray]:
+    predictors = PollPredictionBet.objects.filter(prediction_statement__poll=poll).values('created_by_id')
+    bets = np.array(list(PollPredictionBet.objects.filter(prediction_statement_id__in=statement_ids,
+                                                          created_by_id__in=predictors
+                                                          ).values_list('created_by_id',
+                                                                        'prediction_statement_id',
+                                                                        'score')),
+                    dtype=np.int64).reshape(-1, 3)
+
+    predictor_ids, predictor_index = np.unique(bets[:, 0], return_inverse=True)
+    statement_index = {statement_id: i for i, statement_id in enumerate(statement_ids)}
+
+    matrix = np.full((len(predictor_ids), len(statement_ids)), np.nan)
+    matrix[predictor_index, [statement_index[statement_id] for statement_id in bets[:, 1]]] = bets[:, 2] / 5
+
+    return predictor_ids.tolist(), matrix
+
+
+@shared_task(bind=True)
+def poll_prediction_bet_count(self, poll_id: int, covariance_mode: str = None):
+    if not self.request.called_directly:
+        return poll_phase_transition_run(poll_id=poll_id, phase=PollPhaseTransition.Phase.PREDICTION_BET)
+
     # For one prediction, assuming no bias and stationary predictors
     history_limit = 100
 
-    # Get every predictor participating in poll
-    timestamp = timezone.now()  # Avoid new bets causing list to be offset
     poll = get_object(Poll, id=poll_id)
-    predictors = GroupUser.objects.filter(pollpredictionbet__prediction_statement__poll=poll).all()
-
-    # Get list of previous outcomes in a given area (poll)
-    statements = PollPredictionStatement.objects.filter(
-        Q(poll__tag=poll.tag,
-          poll__end_date__lte=timestamp,
-          created_at__lte=timestamp) | Q(poll=poll)
-    ).annotate(
-        outcome_sum=Sum(Case(When(pollpredictionstatementvote__vote=True, then=1),
-                             When(pollpredictionstatementvote__vote=False, then=-1),
-                             default=0,
-                             output_field=models.IntegerField())),
-        outcome=Case(When(outcome_sum__gt=0, then=1),
-                     When(outcome_sum__lt=0, then=0),
-                     default=0.5,
-                     output_field=models.FloatField())
-    ).order_by('-created_at').all()
-
-    previous_outcomes = list(statements.filter(~Q(poll=poll)).values_list('outcome', flat=True))
-    previous_outcome_avg = 0 if len(previous_outcomes) == 0 else sum(previous_outcomes) / len(previous_outcomes)
-    # statement_history = statements.filter(~Q(poll=poll)).all()
-    poll_statements = statements.filter(poll=poll).all()
-
-    current_bets = []
-    previous_bets = []
-    for predictor in predictors:
-        # get each bet predictor does, order by previous_outcomes
-        bet_subquery = PollPredictionBet.objects.filter(prediction_statement=OuterRef('id'),
-                                                        created_by=predictor
-                                                        ).annotate(
-            real_score=Cast(F('score'), models.FloatField()) / 5).values('real_score')
-        bets = statements.annotate(user_bets=Subquery(bet_subquery)).all()
-
-        current_bets.append(list(bets.filter(poll=poll).values_list('user_bets', flat=True)))
-        previous_bets.append(list(bets.filter(~Q(poll=poll)).values_list('user_bets', flat=True)))
-
-    #     # TODO get all current_bets for every statement in poll, bets needs to be counted once
-    #
-    #     predictor_bets.append(bets)
-
-    # Get bets
-
-    # Get list of bets in the given poll, ordered
-    #   - if any bet missing, dismiss count
-
-    # Small decimal (AT LEAST a magnitude below 10^(-6))
-    small_decimal = 10 ** -7
-
-    # Current bets by each predictor for one given statement, in order
-    #   (first equal to predictor 1 bets, 2 to 2 bets etc.)
-    # IMPORTANT: do not append the current bet until AFTER the combined bet has been calculated
-    #   and saved and there is an outcome
-    # current_bets = np.array([[0.99], [0.9]])
-
-    # Create lists of predictor bets in order (matching outcomes, None for missing),
-    #   don't include ongoing bets (max 100)
-    # If the determinant of a predictor bets list is zero then set the first value to the smallest non zero value
-    # TODO future test combinations of values
-    # previous_bets = [[0, 1, 0.7, 0, 1], [0, 0.2, 1, 0, 0.8]]
-    print(current_bets)
-    print(previous_outcomes)
-    print(previous_bets)
-
-    bias_adjustments = []  # Assume previous_bets matches order of current_bets
+    poll_statements = list(PollPredictionStatement.objects.filter(poll=poll).order_by('-created_at'))
+
+    # Bets on the poll as predictors x statements, NaN where a predictor didn't bet
+    predictor_ids, current_bets = poll_prediction_bet_matrix(poll=poll,
+                                                             statement_ids=[statement.id
+                                                                            for statement in poll_statements])
+
+    # Errors of the predictors on the latest decided statements in the tag, from the prediction error history
+    errors = PollPredictionError.objects.filter(tag=poll.tag, predictor_id__in=predictor_ids
+                                                ).exclude(prediction_statement__poll=poll)
+    history = list(PollPredictionStatement.objects.filter(
+        Exists(errors.filter(prediction_statement=OuterRef('id')))
+    ).order_by('-created_at').values_list('id', flat=True)[:history_limit])
 
     # If there's no previous bets then do nothing
-    if len(previous_bets) == 0 or len(previous_bets[0]) == 0:
-        print("No previous bets found, returning", sum(sum(bets) for bets in current_bets) / len(current_bets))
-        return 0 if len(current_bets) == 0 else sum(sum(bets) for bets in current_bets) / len(current_bets)
+    if not history:
+        return 0 if current_bets.size == 0 else float(np.nanmean(current_bets))
+
+    errors = np.array(list(errors.filter(prediction_statement_id__in=history
+                                         ).values_list('predictor_id', 'prediction_statement_id', 'error')),
+                      dtype=float).reshape(-1, 3)
+    history_index = {statement_id: i for i, statement_id in enumerate(history)}
+
+    predictor_errors = np.full((len(predictor_ids), len(history)), np.nan)
+    predictor_errors[np.searchsorted(predictor_ids, errors[:, 0]),
+                     [history_index[statement_id] for statement_id in errors[:, 1].astype(int)]] = errors[:, 2]
+
+    # A predictor's bias is their mean error over the whole tag history
+    statistics = {row.predictor_id: row for row in PollPredictorStatistics.objects.filter(
+        tag=poll.tag, predictor_id__in=predictor_ids)}
+    bias_adjustments = np.array([statistics[predictor_id].error_mean if predictor_id in statistics else 0
+                                 for predictor_id in predictor_ids])
+
+    if (covariance_mode or FLOWBACK_PREDICTION_COVARIANCE) == 'shrinkage':
+        covariance = prediction_error_covariance_shrunk(predictor_errors)
+    else:
+        covariance = prediction_error_covariance(predictor_errors)
+
+    bet_weights = prediction_combined_weights(covariance)
 
-    # Calculation below
     for i, statement in enumerate(poll_statements):
-        predictor_errors = []
-        for bets in previous_bets:
-            bets_trimmed = [i for i in bets if i is not None]
-            bias_adjustments.append(0 if len(bets) == 0 else previous_outcome_avg - (sum(bets_trimmed) /
-                                                                                     len(bets_trimmed)))
+        bets = current_bets[:, i] + bias_adjustments
+        has_bet = ~np.isnan(bets)
+
+        if not has_bet.any():
+            continue
 
-            predictor_errors.append(np.array([previous_outcomes[i] - bets[i]
-                                              if bets[i] is not None
-                                              else None for i in range(len(previous_outcomes))]))
+        # Predictors who didn't bet on the statement are left out, the remaining weights are scaled back to one
+        weights = bet_weights[has_bet]
+        combined_bet = float(np.dot(weights, bets[has_bet]) / weights.sum()) if weights.sum() \
+            else float(bets[has_bet].mean())
 
-        # If a predictor has not bet on a certain prediction then their bet will be None for said prediction
-        def drop_incomparable_values(arr_1, arr_2):
-            drop_list = []
+        # Weights may be negative when predictors outnumber their shared history, keep the result a probability
+        statement.combined_bet = min(max(combined_bet, 0), 1)
+        statement.save()
 
-            for i in range(len(arr_1)):
-                if arr_1[i] is None or arr_2[i] is None:
-                    drop_list.append(i)
 
-            arr_1 = np.delete(arr_1, drop_list)
-            arr_2 = np.delete(arr_2, drop_list)
+# Schedules a recount of the poll, every call within FLOWBACK_POLL_REFRESH_INTERVAL shares the same recount.
+# Returns whether a new recount got scheduled
+def poll_refresh_schedule(poll_id: int) -> bool:
+    if not cache.add(f'poll_refresh_scheduled_{poll_id}', True, timeout=FLOWBACK_POLL_REFRESH_INTERVAL):
+        return False
 
-            return arr_1, arr_2
+    poll_refresh.apply_async(kwargs=dict(poll_id=poll_id), countdown=FLOWBACK_POLL_REFRESH_INTERVAL)
+    return True
 
-        def covariance(arr_1, arr_2):
-            covariance_array = [(arr_1[i] - np.mean(arr_1)) * (arr_2[i] - np.mean(arr_2)) for i in range(len(arr_1))]
-            return (1 / len(arr_1)) * sum(covariance_array)
 
-        covariance_matrix = []
-        for k in range(len(predictor_errors)):
-            row = []
+@shared_task
+def poll_refresh(poll_id: int):
+    # Votes from here on are counted by the next refresh
+    cache.delete(f'poll_refresh_scheduled_{poll_id}')
 
-            for j in range(len(predictor_errors)):
-                comparable_errors = drop_incomparable_values(predictor_errors[k], predictor_errors[j])
-                row.append(covariance(comparable_errors[0], comparable_errors[1]))
+    if not Poll.objects.filter(id=poll_id, status=0).exists():
+        return
 
-            covariance_matrix.append(row)
+    # Never count the same poll in parallel, retry after the running recount instead
+    if not cache.add(f'poll_refresh_running_{poll_id}', True, timeout=FLOWBACK_POLL_REFRESH_INTERVAL * 60):
+        poll_refresh_schedule(poll_id)
+        return
 
-        np_covariance_matrix = np.array(covariance_matrix)
+    try:
+        poll_proposal_vote_count(poll_id=poll_id)
 
-        # The inverse only exists when the determinant is non-zero, this can be made sure of by changing small decimals
-        if np.linalg.det(np_covariance_matrix) == 0:
-            determinant_is_zero = True
-            print("Zero determinant")
+    finally:
+        cache.delete(f'poll_refresh_running_{poll_id}')
 
-            while determinant_is_zero:
-                for m in range(np_covariance_matrix.shape[0]):
-                    for j in range(np_covariance_matrix.shape[0]):
-                        np_covariance_matrix[m][j] += small_decimal * [-1, 1][random.randint(0, 1)]
 
-                det = np.linalg.det(np_covariance_matrix)
-                if det != 0:
-                    determinant_is_zero = False
+# Phase boundaries handled by poll_phase_transition_process, with the date field that ends them
+poll_phase_transitions = {PollPhaseTransition.Phase.AREA_VOTE: ('area_vote_end_date', poll_area_vote_count),
+                          PollPhaseTransition.Phase.PREDICTION_BET: ('prediction_bet_end_date',
+                                                                     poll_prediction_bet_count)}
+poll_phase_transition_max_attempts = 5
 
-        inverse_covariance_matrix = np.linalg.inv(np_covariance_matrix)
 
-        column_one_vector = np.array([[1]] * inverse_covariance_matrix.shape[0])
-        row_one_vector = np.array([1] * inverse_covariance_matrix.shape[0])
+# Runs the phase transition of the poll once its boundary passed, unless it already ran. The poll's transition
+# row is claimed under a lock, a failing transition is logged and rolled back while the attempt is kept, to be
+# retried up to poll_phase_transition_max_attempts. Returns the transition's result, None when it didn't run
+def poll_phase_transition_run(*, poll_id: int, phase: str):
+    field, task = poll_phase_transitions[phase]
+    result = None
 
-        nominator = np.matmul(inverse_covariance_matrix, column_one_vector)
+    with transaction.atomic():
+        if not Poll.objects.filter(id=poll_id, **{f'{field}__lte': timezone.now()}).exists():
+            return None
 
-        denominator_vector = np.matmul(inverse_covariance_matrix, row_one_vector)
-        denominator = np.matmul(row_one_vector, denominator_vector)
+        transition, created = PollPhaseTransition.objects.select_for_update().get_or_create(poll_id=poll_id,
+                                                                                            phase=phase)
+        if not (created or transition.failed) or transition.attempts >= poll_phase_transition_max_attempts:
+            return None
 
-        bet_weights = nominator * (1 / denominator)
-        transposed_bet_weights = np.transpose(bet_weights)
+        try:
+            with transaction.atomic():
+                result = task(poll_id=poll_id)
 
-        combined_bet = float(np.matmul(transposed_bet_weights,
-                                       [bet[i] + bias_adjustments[i] for bet in current_bets])[0])
+            transition.failed = False
 
-        # Sanity check
-        check = np.matmul(transposed_bet_weights, row_one_vector)
-        if (check[0] > 1 + small_decimal) or (0.99 + small_decimal > check[0]):
-            print(f"Error with weights: {check[0]:.4f}")
+        except Exception:
+            logger.exception('Phase transition %s of poll %s failed', phase, poll_id)
+            transition.failed = True
 
-        print(combined_bet)
+        transition.attempts += 1
+        transition.save()
 
-        statement.combined_bet = combined_bet
-        statement.save()
+    return result
+
+
+# Runs on celery beat every FLOWBACK_POLL_PHASE_INTERVAL seconds. Finds the polls that passed a phase boundary
+# without a finished transition record, oldest first, and handles them in batches. Poll dates are read on every
+# tick, so fast forwarded and deleted polls need no task bookkeeping. A failing transition is logged and retried
+# on later ticks, up to poll_phase_transition_max_attempts, without holding up the polls behind it
+@shared_task
+def poll_phase_transition_process(batch_size: int = 100):
+    # Overlapping ticks would only contend for the same polls
+    if not cache.add('poll_phase_transition_running', True, timeout=FLOWBACK_POLL_PHASE_INTERVAL * 10):
+        return
+
+    try:
+        for phase, (field, _) in poll_phase_transitions.items():
+            handled = []
+
+            while True:
+                poll_ids = list(Poll.objects.filter(
+                    **{f'{field}__lte': timezone.now()}
+                ).exclude(
+                    Q(id__in=handled) | Exists(PollPhaseTransition.objects.filter(
+                        Q(failed=False) | Q(attempts__gte=poll_phase_transition_max_attempts),
+                        poll=OuterRef('id'),
+                        phase=phase))
+                ).order_by(field).values_list('id', flat=True)[:batch_size])
+
+                for poll_id in poll_ids:
+                    poll_phase_transition_run(poll_id=poll_id, phase=phase)
+
+                handled += poll_ids
+
+                if len(poll_ids) < batch_size:
+                    break
+
+    finally:
+        cache.delete('poll_phase_transition_running')
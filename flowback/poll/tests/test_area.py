@@ -5,7 +5,7 @@ from rest_framework.test import APIRequestFactory, force_authenticate, APITransa
 from flowback.group.models import GroupUser, GroupTags
 from flowback.group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
 from flowback.poll.models import Poll, PollAreaStatementSegment, PollAreaStatementVote
-from flowback.poll.selectors.area import poll_area_statement_list
+from flowback.poll.selectors.area import poll_area_statement_list, poll_area_statement_leading
 from flowback.poll.tasks import poll_area_vote_count
 from flowback.poll.tests.factories import PollFactory
 from flowback.poll.tests.utils import generate_poll_phase_kwargs
@@ -95,6 +95,34 @@ class PollAreaTest(APITransactionTestCase):
 
         # Check if Counting votes work
         winning_tag = GroupTags.objects.filter(pollareastatementsegment__poll_area_statement=area_statement_one).first()
-        tag = poll_area_vote_count.apply(kwargs=dict(poll_id=self.poll.id)).get().tag
+        tag = poll_area_vote_count(poll_id=self.poll.id).tag
 
         self.assertEqual(winning_tag.name, tag.name)
+
+    def test_area_statement_score(self):
+        def vote(group_user: GroupUser, tag: GroupTags, vote: bool):
+            return poll_area_statement_vote_update(user_id=group_user.user.id,
+                                                   poll_id=self.poll.id,
+                                                   tag=tag.id,
+                                                   vote=vote)
+
+        area_statement_one = vote(group_user=self.group_user_one, tag=self.group_tag_one, vote=True)
+        vote(group_user=self.group_user_two, tag=self.group_tag_one, vote=True)
+        area_statement_two = vote(group_user=self.group_user_three, tag=self.group_tag_two, vote=True)
+
+        area_statement_one.refresh_from_db()
+        self.assertEqual(area_statement_one.score, 2)
+        self.assertEqual(poll_area_statement_leading(poll_id=self.poll.id), area_statement_one)
+
+        # Changing a vote moves the score by two, voting the same again doesn't move it
+        vote(group_user=self.group_user_one, tag=self.group_tag_one, vote=False)
+        vote(group_user=self.group_user_two, tag=self.group_tag_one, vote=False)
+        vote(group_user=self.group_user_two, tag=self.group_tag_one, vote=False)
+
+        area_statement_one.refresh_from_db()
+        self.assertEqual(area_statement_one.score, -2)
+        self.assertEqual(poll_area_statement_leading(poll_id=self.poll.id), area_statement_two)
+
+        # The phase end resolves the leader without counting the votes again
+        tag = poll_area_vote_count(poll_id=self.poll.id).tag
+        self.assertEqual(tag, self.group_tag_two)
@@ -1,17 +1,24 @@
 import json
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate, APITransactionTestCase
 from .factories import PollFactory, PollPriorityFactory
 
 from .utils import generate_poll_phase_kwargs
-from ..models import Poll, PollPriority
+from ..models import Poll, PollPriority, PollPhaseTransition
 from ..selectors.poll import poll_list
 from ..views.poll import PollListApi, PollCreateAPI, PollUpdateAPI, PollDeleteAPI, PollPriorityUpdateAPI
 from ..models import Poll
-from ..services.poll import poll_fast_forward
+from ..services.poll import poll_fast_forward, poll_notification, poll_notification_subscribe
+from ..tasks import poll_area_vote_count, poll_phase_transition_process, poll_phase_transition_max_attempts
 from ...files.tests.factories import FileSegmentFactory
+from ...notification.models import NotificationObject, NotificationSubscription
+from ...notification.selectors import notification_list, notification_unread_count
+from ...notification.services import notification_channel_mark_read
+from ...notification.views import NotificationListAPI
 from ...group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
 from ...user.models import User
 
@@ -141,6 +148,118 @@ class PollTest(APITransactionTestCase):
         poll.refresh_from_db()
         self.assertEqual('vote', poll.current_phase)
 
+    def test_poll_phase_transition_process(self):
+        poll = PollFactory(created_by__is_admin=True,
+                           allow_fast_forward=True,
+                           poll_type=4,
+                           dynamic=False,
+                           **generate_poll_phase_kwargs('proposal'))
+
+        poll_phase_transition_process(batch_size=1)
+        self.assertEqual(set(PollPhaseTransition.objects.values_list('poll_id', 'phase')), {(poll.id, 'area_vote')})
+
+        # Fast forwarding is picked up on the next tick, processed phases aren't run again
+        poll_fast_forward(user_id=poll.created_by.user.id, poll_id=poll.id, phase='vote')
+        poll_phase_transition_process(batch_size=1)
+        poll_phase_transition_process(batch_size=1)
+
+        self.assertEqual(set(PollPhaseTransition.objects.values_list('poll_id', 'phase')),
+                         {(poll.id, 'area_vote'), (poll.id, 'prediction_bet')})
+
+    def test_poll_phase_transition_process_failure(self):
+        failing_poll = PollFactory(poll_type=4, dynamic=False, **generate_poll_phase_kwargs('prediction_statement'))
+        poll = PollFactory(poll_type=4, dynamic=False, **generate_poll_phase_kwargs('proposal'))
+        transitioned = []
+
+        def area_vote_count(poll_id: int):
+            if poll_id == failing_poll.id:
+                raise Exception('Transition failed')
+
+            transitioned.append(poll_id)
+
+        transitions = {PollPhaseTransition.Phase.AREA_VOTE: ('area_vote_end_date', area_vote_count)}
+        with mock.patch.dict('flowback.poll.tasks.poll_phase_transitions', transitions, clear=True):
+            # The failing poll comes first, the polls behind it still transition
+            poll_phase_transition_process(batch_size=1)
+            self.assertIn(poll.id, transitioned)
+            self.assertNotIn(failing_poll.id, transitioned)
+
+            failed = PollPhaseTransition.objects.get(poll=failing_poll)
+            self.assertEqual((failed.failed, failed.attempts), (True, 1))
+            self.assertFalse(PollPhaseTransition.objects.get(poll=poll).failed)
+
+            # Retried on later ticks until it runs out of attempts
+            for i in range(poll_phase_transition_max_attempts + 1):
+                poll_phase_transition_process(batch_size=1)
+
+            failed.refresh_from_db()
+            self.assertEqual(failed.attempts, poll_phase_transition_max_attempts)
+            self.assertEqual(transitioned.count(poll.id), 1)
+
+    def test_poll_phase_transition_queued_task(self):
+        poll = PollFactory(poll_type=4, dynamic=False, **generate_poll_phase_kwargs('proposal'))
+        upcoming_poll = PollFactory(poll_type=4, dynamic=False, **generate_poll_phase_kwargs('area_vote'))
+        transitioned = []
+
+        def area_vote_count(poll_id: int):
+            transitioned.append(poll_id)
+
+        transitions = {PollPhaseTransition.Phase.AREA_VOTE: ('area_vote_end_date', area_vote_count)}
+        with mock.patch.dict('flowback.poll.tasks.poll_phase_transitions', transitions, clear=True):
+            # Tasks still queued with an eta claim the same transition as the process, so they run it only once
+            poll_area_vote_count.apply(kwargs=dict(poll_id=poll.id))
+            poll_phase_transition_process(batch_size=1)
+            poll_area_vote_count.apply(kwargs=dict(poll_id=poll.id))
+
+            # A task whose eta is ahead of the poll's rescheduled boundary leaves it to the process
+            poll_area_vote_count.apply(kwargs=dict(poll_id=upcoming_poll.id))
+
+        self.assertEqual(transitioned, [poll.id])
+        self.assertFalse(PollPhaseTransition.objects.filter(poll=upcoming_poll).exists())
+
+    def test_poll_timeline_notifications(self):
+        poll = PollFactory(created_by__is_admin=True, allow_fast_forward=True, poll_type=4, dynamic=False,
+                           **generate_poll_phase_kwargs('delegate_vote'))
+        user = poll.created_by.user
+        poll_notification.load_channel(sender_id=poll.id, category='timeline')
+        poll_notification_subscribe(user_id=user.id, poll_id=poll.id, categories=['timeline'])
+        NotificationSubscription.objects.filter(user=user).update(created_at=poll.start_date - timezone.timedelta(days=1))
+
+        def timeline():
+            return [(x['notification_message'], x['notification_timestamp'], x['notification_read'])
+                    for x in notification_list(user=user, filters=dict(channel_sender_category='timeline'))]
+
+        # Nothing is stored, phases that started are listed from the poll dates
+        self.assertFalse(NotificationObject.objects.filter(channel__category='timeline').exists())
+        self.assertEqual([message for message, timestamp, read in timeline()],
+                         [f'Poll {poll.title} has started {phase} phase'
+                          for phase in ['Area vote', 'Proposal', 'Prediction statement', 'Prediction bet',
+                                        'Delegate vote']])
+
+        # Phases follow the poll dates when fast forwarding, read state follows the channel read cursor
+        notification_channel_mark_read(user_id=user.id, category='timeline', sender_type='poll', sender_id=poll.id,
+                                       timestamp=poll.proposal_end_date + timezone.timedelta(minutes=1))
+        poll_fast_forward(user_id=user.id, poll_id=poll.id, phase='result')
+        poll.refresh_from_db()
+
+        self.assertEqual([(timestamp, read) for message, timestamp, read in timeline()][-3:],
+                         [(poll.prediction_bet_end_date, True),
+                          (poll.delegate_vote_end_date, False),
+                          (poll.vote_end_date, False)])
+        self.assertEqual(notification_unread_count(user=user),
+                         dict(total=2, categories=dict(timeline=2)))
+
+        # Listed alongside stored notifications, with their filters and pagination
+        factory = APIRequestFactory()
+        request = factory.get('', data=dict(limit=2))
+        force_authenticate(request, user=user)
+        response = NotificationListAPI.as_view()(request)
+
+        # The endpoint lists unread notifications unless read is given
+        self.assertEqual(response.data['count'], len([read for message, timestamp, read in timeline() if not read]))
+        self.assertEqual(response.data['results'][0]['channel_category'], 'timeline')
+        self.assertIsNone(response.data['results'][0]['id'])
+
     def delete_poll(self, poll: Poll, user: User):
         factory = APIRequestFactory()
         view = PollDeleteAPI.as_view()
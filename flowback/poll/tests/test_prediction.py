@@ -1,17 +1,24 @@
+import io
 import json
 import random
 
+import numpy as np
+
+from django.core.management import call_command
 from django.utils import timezone
 from rest_framework.test import APIRequestFactory, force_authenticate, APITransactionTestCase
 
 from flowback.group.models import GroupUser
-from flowback.group.tests.factories import GroupFactory, GroupUserFactory
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
 from flowback.poll.models import Poll, PollPredictionStatement, PollPredictionStatementSegment, PollPredictionBet, \
-    PollPredictionStatementVote
-from flowback.poll.tasks import poll_prediction_bet_count
+    PollPredictionStatementVote, PollPredictionError, PollPredictorStatistics
+from flowback.poll.services.prediction import poll_prediction_statement_outcome_update
+from flowback.poll.tasks import poll_prediction_bet_count, poll_prediction_bet_matrix
 from flowback.poll.tests.factories import PollFactory, PollPredictionBetFactory, PollProposalFactory, \
     PollPredictionStatementFactory, PollPredictionStatementSegmentFactory, PollPredictionStatementVoteFactory
 from flowback.poll.tests.utils import generate_poll_phase_kwargs
+from flowback.prediction.utils import prediction_error_covariance, prediction_combined_weights, \
+    prediction_error_covariance_shrunk
 
 from flowback.poll.views.prediction import (PollPredictionStatementCreateAPI,
                                             PollPredictionStatementDeleteAPI,
@@ -22,7 +29,8 @@ from flowback.poll.views.prediction import (PollPredictionStatementCreateAPI,
                                             PollPredictionStatementVoteUpdateAPI,
                                             PollPredictionStatementVoteDeleteAPI,
                                             PollPredictionStatementListAPI,
-                                            PollPredictionBetListAPI)
+                                            PollPredictionBetListAPI,
+                                            PollPredictorLeaderboardAPI)
 
 
 class PollPredictionStatementTest(APITransactionTestCase):
@@ -265,8 +273,14 @@ class PollPredictionStatementTest(APITransactionTestCase):
             PollPredictionStatementVoteFactory(prediction_statement=statement,
                                                created_by=bet_user.group_user,
                                                vote=bet_user.vote)
+            poll_prediction_statement_outcome_update(prediction_statement=statement,
+                                                     vote_yes=int(bet_user.vote),
+                                                     vote_no=int(not bet_user.vote))
 
     def test_poll_prediction_combined_bet(self):
+        tag = GroupTagsFactory(group=self.group)
+        Poll.objects.filter(id=self.poll.id).update(tag=tag)
+
         # Make random previous bets
         poll_one_bets = [self.BetUser(group_user=self.user_prediction_caster_one,
                                       score=4,
@@ -278,7 +292,7 @@ class PollPredictionStatementTest(APITransactionTestCase):
                                       score=0,
                                       vote=False)]
 
-        poll = PollFactory(created_by=self.user_group_creator, **generate_poll_phase_kwargs('prediction_vote'))
+        poll = PollFactory(created_by=self.user_group_creator, tag=tag, **generate_poll_phase_kwargs('prediction_vote'))
         self.generate_previous_bet(poll=poll, bet_users=poll_one_bets)
 
         poll_two_bets = [self.BetUser(group_user=self.user_prediction_caster_one,
@@ -291,7 +305,7 @@ class PollPredictionStatementTest(APITransactionTestCase):
                                       score=5,
                                       vote=True)]
 
-        poll = PollFactory(created_by=self.user_group_creator, **generate_poll_phase_kwargs('prediction_vote'))
+        poll = PollFactory(created_by=self.user_group_creator, tag=tag, **generate_poll_phase_kwargs('prediction_vote'))
         self.generate_previous_bet(poll=poll, bet_users=poll_two_bets)
 
         # Calculate combined_bet
@@ -304,3 +318,125 @@ class PollPredictionStatementTest(APITransactionTestCase):
                                                                                  self.user_prediction_caster_three]]
 
         poll_prediction_bet_count(poll_id=self.poll.id)
+
+    def test_poll_prediction_combined_bet_weights(self):
+        errors = np.array([[0.1, -0.2, 0.3, np.nan],
+                           [0.2, -0.1, np.nan, 0.4],
+                           [-0.3, 0.2, 0.1, 0.0]])
+
+        covariance = prediction_error_covariance(errors)
+        self.assertAlmostEqual(covariance[0][2], np.cov(errors[0, :3], errors[2, :3], bias=True)[0][1])
+        self.assertAlmostEqual(covariance[0][1], np.cov(errors[0, :2], errors[1, :2], bias=True)[0][1])
+
+        weights = prediction_combined_weights(covariance)
+        self.assertAlmostEqual(weights.sum(), 1)
+
+        # Singular covariance still gives weights
+        self.assertAlmostEqual(prediction_combined_weights(np.ones((3, 3))).sum(), 1)
+
+        self.test_poll_prediction_combined_bet()
+        self.prediction_statement.refresh_from_db()
+        self.assertIsNotNone(self.prediction_statement.combined_bet)
+
+        statement_ids = [self.prediction_statement.id,
+                         *PollPredictionStatement.objects.exclude(poll=self.poll).values_list('id', flat=True)]
+        predictor_ids, bets = poll_prediction_bet_matrix(poll=self.poll, statement_ids=statement_ids)
+        self.assertEqual(bets.shape, (3, len(statement_ids)))
+        self.assertEqual(predictor_ids, sorted([self.user_prediction_caster_one.id,
+                                                self.user_prediction_caster_two.id,
+                                                self.user_prediction_caster_three.id]))
+        self.assertFalse(np.isnan(bets[:, 0]).any())
+
+    def test_poll_prediction_combined_bet_shrinkage(self):
+        # Two predictors with identical errors make the sample covariance singular
+        errors = np.array([[0.1, -0.2, 0.3],
+                           [0.1, -0.2, 0.3],
+                           [-0.3, 0.2, np.nan]])
+
+        covariance = prediction_error_covariance_shrunk(errors)
+        self.assertTrue(np.array_equal(covariance, prediction_error_covariance_shrunk(errors)))
+        self.assertNotEqual(np.linalg.det(covariance), 0)
+        self.assertAlmostEqual(prediction_combined_weights(covariance).sum(), 1)
+
+        # A predictor without any error has zero variance, which shrinking alone leaves singular
+        errors[0] = 0
+        self.assertEqual(np.linalg.matrix_rank(prediction_error_covariance_shrunk(errors)), len(errors))
+
+        self.test_poll_prediction_combined_bet()
+        poll_prediction_bet_count(poll_id=self.poll.id, covariance_mode='shrinkage')
+        self.prediction_statement.refresh_from_db()
+        combined_bet = self.prediction_statement.combined_bet
+
+        poll_prediction_bet_count(poll_id=self.poll.id, covariance_mode='shrinkage')
+        self.prediction_statement.refresh_from_db()
+        self.assertEqual(self.prediction_statement.combined_bet, combined_bet)
+
+    def test_poll_prediction_error_history(self):
+        self.test_poll_prediction_combined_bet()
+
+        # Caster one bet 4/5 on a statement voted false and 2/5 on a statement voted true
+        statistics = PollPredictorStatistics.objects.get(predictor=self.user_prediction_caster_one)
+        self.assertEqual(statistics.count, 2)
+        self.assertAlmostEqual(statistics.error_mean, ((0 - 0.8) + (1 - 0.4)) / 2)
+
+        # Flipping the outcome of a statement moves the history along
+        statement = PollPredictionError.objects.filter(predictor=self.user_prediction_caster_one
+                                                       ).order_by('prediction_statement__created_at'
+                                                                  ).first().prediction_statement
+        outcome = poll_prediction_statement_outcome_update(prediction_statement=statement, vote_yes=2, vote_no=-2)
+        self.assertEqual(outcome.outcome, 1)
+        self.assertIsNotNone(outcome.resolved_at)
+
+        statistics.refresh_from_db()
+        self.assertEqual(statistics.count, 2)
+        self.assertAlmostEqual(statistics.error_mean, ((1 - 0.8) + (1 - 0.4)) / 2)
+        self.assertEqual(PollPredictionError.objects.filter(prediction_statement=statement).count(), 3)
+
+        # Deleting the statement takes its errors out of the statistics, as a rebuild from the history would
+        statement.delete()
+        statistics.refresh_from_db()
+        self.assertEqual(statistics.count, 1)
+        self.assertAlmostEqual(statistics.error_mean, 1 - 0.4)
+
+        recency_accuracy = statistics.recency_accuracy_sum / statistics.recency_weight_sum
+        call_command('poll_predictor_statistics_repair', stdout=io.StringIO())
+        statistics = PollPredictorStatistics.objects.get(predictor=self.user_prediction_caster_one)
+        self.assertEqual(statistics.count, 1)
+        self.assertAlmostEqual(statistics.error_mean, 1 - 0.4)
+        self.assertAlmostEqual(statistics.recency_accuracy_sum / statistics.recency_weight_sum, recency_accuracy)
+        self.assertLessEqual(statistics.recency_weight_sum, 1)
+
+        # Deleting the poll takes the rest of its errors out at once, as a rebuild would
+        self.poll.delete()
+        counts = dict(PollPredictorStatistics.objects.values_list('predictor_id', 'count'))
+        call_command('poll_predictor_statistics_repair', stdout=io.StringIO())
+        self.assertEqual(dict(PollPredictorStatistics.objects.values_list('predictor_id', 'count')), counts)
+        self.assertEqual(sum(counts.values()), PollPredictionError.objects.count())
+
+    def test_poll_predictor_leaderboard(self):
+        self.test_poll_prediction_combined_bet()
+
+        factory = APIRequestFactory()
+        view = PollPredictorLeaderboardAPI.as_view()
+
+        request = factory.get('', data=dict(order_by='brier_score_asc'))
+        force_authenticate(request, user=self.user_prediction_creator.user)
+        response = view(request, group_id=self.group.id)
+        results = response.data['results']
+
+        # Caster three got both statements right, caster one was off by 0.8 and 0.6
+        self.assertEqual([row['predictor']['id'] for row in results], [self.user_prediction_caster_three.id,
+                                                                       self.user_prediction_caster_two.id,
+                                                                       self.user_prediction_caster_one.id])
+        self.assertEqual([row['count'] for row in results], [2, 2, 2])
+        self.assertAlmostEqual(results[2]['brier_score'], (0.8 ** 2 + 0.6 ** 2) / 2)
+        self.assertAlmostEqual(results[0]['recency_accuracy'], 1)
+        self.assertTrue(0 < results[2]['recency_accuracy'] < 1)
+
+    def test_benchmark_prediction(self):
+        out = io.StringIO()
+        call_command('benchmark_prediction', predictors=[5], history=[4], statements=3, stdout=out)
+
+        # One row per covariance mode under the header, and nothing is left behind
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertFalse(PollPredictionError.objects.exists())
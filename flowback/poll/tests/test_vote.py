@@ -1,19 +1,23 @@
 from pprint import pprint
 
+from django.core.cache import cache
 from django.db.models import Sum
 from rest_framework.test import APIRequestFactory, force_authenticate, APITransactionTestCase
 from .factories import PollFactory, PollProposalFactory, PollPriorityFactory
 from .utils import generate_poll_phase_kwargs
 from ..models import PollDelegateVoting, PollVotingTypeCardinal, Poll, PollProposal, PollVoting, \
-    PollVotingTypeForAgainst, PollPriority
+    PollVotingTypeForAgainst, PollPriority, PollVotingTypeRanking, PollResult
 from ..selectors.poll import poll_list
-from ..services.vote import poll_proposal_vote_count
+from ..selectors.proposal import poll_proposal_list
+from ..tasks import poll_refresh_schedule, poll_refresh
+from ..services.vote import poll_proposal_vote_count, poll_proposal_vote_update, poll_proposal_delegate_vote_update
 from ..views.poll import PollListApi, PollPriorityUpdateAPI
 from ..views.vote import (PollProposalDelegateVoteUpdateAPI,
                           PollProposalVoteUpdateAPI,
                           PollProposalVoteListAPI,
                           DelegatePollVoteListAPI)
 from ...files.tests.factories import FileSegmentFactory
+from ...group.models import GroupUserDelegator
 from ...group.tests.factories import GroupFactory, GroupUserFactory, GroupUserDelegateFactory, GroupTagsFactory
 from ...user.models import User
 
@@ -120,6 +124,42 @@ class PollVoteTest(APITransactionTestCase):
         self.assertEqual(self.poll_cardinal_proposal_two.score, 164)
         self.assertEqual(self.poll_cardinal_proposal_three.score, 59)
 
+    def test_vote_count_cardinal_snapshot(self):
+        # Scores stay below SCORE_VOTE_CEILING
+        votes = [(self.group_user_two, [self.poll_cardinal_proposal_two, self.poll_cardinal_proposal_three], [78, 22]),
+                 (self.group_user_one, [self.poll_cardinal_proposal_three, self.poll_cardinal_proposal_one], [23, 98]),
+                 (self.group_user_three, [self.poll_cardinal_proposal_three, self.poll_cardinal_proposal_two], [14, 86])]
+        for group_user, proposals, scores in votes:
+            response = self.cardinal_vote_update(group_user.user, self.poll_cardinal, proposals, scores)
+            self.assertEqual(response.status_code, 200, response.data)
+
+        Poll.objects.filter(id=self.poll_cardinal.id).update(**generate_poll_phase_kwargs('result'))
+        poll_proposal_vote_count(poll_id=self.poll_cardinal.id)
+
+        result = PollResult.objects.get(poll=self.poll_cardinal)
+        self.assertEqual(result.participants, 3)
+        self.assertEqual(list(result.pollproposalresult_set.order_by('rank').values_list('proposal_id', 'score')),
+                         [(self.poll_cardinal_proposal_two.id, 164),
+                          (self.poll_cardinal_proposal_one.id, 98),
+                          (self.poll_cardinal_proposal_three.id, 59)])
+
+        # Later votes can't change a finished poll's snapshot
+        poll_proposal_vote_count(poll_id=self.poll_cardinal.id)
+        self.assertEqual(PollResult.objects.get(poll=self.poll_cardinal).id, result.id)
+
+        proposals = poll_proposal_list(fetched_by=self.group_user_one.user, poll_id=self.poll_cardinal.id)
+        self.assertEqual([proposal.id for proposal in proposals], [self.poll_cardinal_proposal_two.id,
+                                                                   self.poll_cardinal_proposal_one.id,
+                                                                   self.poll_cardinal_proposal_three.id])
+        self.assertEqual(proposals[2].approval_positive, 3)
+
+        # Results are read from the snapshot even when the live proposal changes
+        snapshot = result.pollproposalresult_set.get(proposal=self.poll_cardinal_proposal_two)
+        PollProposal.objects.filter(id=self.poll_cardinal_proposal_two.id).update(score=0, participants=0)
+        proposal = poll_proposal_list(fetched_by=self.group_user_one.user, poll_id=self.poll_cardinal.id)[0]
+        self.assertEqual((proposal.result_score, proposal.result_participants), (164, snapshot.participants))
+        self.assertNotEqual(snapshot.participants, 0)
+
     @staticmethod
     def schedule_vote_update(user: User, poll: Poll, proposals: list[PollProposal]):
         factory = APIRequestFactory()
@@ -236,3 +276,131 @@ class PollDelegateVoteTest(APITransactionTestCase):
 
         votes = PollDelegateVoting.objects.get(created_by=self.delegate.pool).pollvotingtypecardinal_set
         self.assertEqual(votes.filter(id__in=data['proposals']).count(), 2)
+
+
+class PollVoteCountTest(APITransactionTestCase):
+    def setUp(self):
+        self.group = GroupFactory()
+        self.group_tag = GroupTagsFactory(group=self.group)
+        self.group_user_creator = GroupUserFactory(group=self.group, user=self.group.created_by)
+        (self.group_user_one,
+         self.group_user_two,
+         self.delegator_one,
+         self.delegator_two) = GroupUserFactory.create_batch(4, group=self.group)
+        self.delegate = GroupUserDelegateFactory(group=self.group)
+
+        # Both delegators delegate to the same pool, delegator_two votes by themselves
+        for delegator in [self.delegator_one, self.delegator_two]:
+            GroupUserDelegator.objects.create(delegator=delegator,
+                                              delegate_pool=self.delegate.pool,
+                                              group=self.group).tags.add(self.group_tag)
+
+        self.poll = PollFactory(created_by=self.group_user_creator, poll_type=Poll.PollType.RANKING,
+                                tag=self.group_tag, dynamic=False, **generate_poll_phase_kwargs('vote'))
+        (self.proposal_one,
+         self.proposal_two,
+         self.proposal_three) = PollProposalFactory.create_batch(3, created_by=self.group_user_creator,
+                                                                 poll=self.poll)
+
+    @staticmethod
+    def rank(poll_vote, proposals: list[PollProposal], delegate: bool = False):
+        author = 'author_delegate' if delegate else 'author'
+        PollVotingTypeRanking.objects.bulk_create([PollVotingTypeRanking(**{author: poll_vote},
+                                                                         proposal=proposal,
+                                                                         priority=len(proposals) - i)
+                                                   for i, proposal in enumerate(proposals)])
+
+    def test_vote_count_ranking(self):
+        self.rank(PollVoting.objects.create(created_by=self.group_user_one, poll=self.poll),
+                  [self.proposal_one, self.proposal_two])
+        self.rank(PollVoting.objects.create(created_by=self.group_user_two, poll=self.poll),
+                  [self.proposal_two, self.proposal_three, self.proposal_one])
+        self.rank(PollVoting.objects.create(created_by=self.delegator_two, poll=self.poll),
+                  [self.proposal_three])
+        self.rank(PollDelegateVoting.objects.create(created_by=self.delegate.pool, poll=self.poll),
+                  [self.proposal_three, self.proposal_one], delegate=True)
+
+        poll_proposal_vote_count(poll_id=self.poll.id)
+
+        # Only delegator_one is represented by the delegate
+        self.assertEqual(PollDelegateVoting.objects.get(poll=self.poll).mandate, 1)
+
+        for proposal in [self.proposal_one, self.proposal_two, self.proposal_three]:
+            proposal.refresh_from_db()
+
+        self.assertEqual(self.proposal_one.score, 3 + 1 + 2)
+        self.assertEqual(self.proposal_two.score, 2 + 3)
+        self.assertEqual(self.proposal_three.score, 2 + 3 + 3)
+        self.assertEqual(self.proposal_one.participants, 3)
+        self.assertEqual(self.proposal_two.participants, 2)
+        self.assertEqual(self.proposal_three.participants, 3)
+        self.assertEqual(self.proposal_three.positive_votes, 3)
+
+        self.poll.refresh_from_db()
+        self.assertEqual(self.poll.participants, 4)
+
+    def test_vote_count_dynamic_live(self):
+        self.poll.dynamic = True
+        self.poll.save()
+
+        def live_results():
+            return list(PollProposal.objects.filter(poll=self.poll).order_by('id').values_list(
+                'score', 'participants', 'blank_votes', 'positive_votes'))
+
+        poll_proposal_delegate_vote_update(user_id=self.delegate.group_user.user.id, poll_id=self.poll.id,
+                                           data=dict(proposals=[self.proposal_three.id, self.proposal_one.id]))
+        self.assertEqual(PollDelegateVoting.objects.get(poll=self.poll).mandate, 2)
+
+        for group_user, proposals in [(self.group_user_one, [self.proposal_one, self.proposal_two]),
+                                      (self.group_user_two, [self.proposal_two, self.proposal_three]),
+                                      (self.delegator_two, [self.proposal_three]),
+                                      (self.group_user_two, [self.proposal_two, self.proposal_three,
+                                                             self.proposal_one])]:
+            poll_proposal_vote_update(user_id=group_user.user.id, poll_id=self.poll.id,
+                                      data=dict(proposals=[x.id for x in proposals]))
+
+        # Removing a vote hands the user back to the delegate
+        poll_proposal_vote_update(user_id=self.delegator_one.user.id, poll_id=self.poll.id,
+                                  data=dict(proposals=[self.proposal_one.id]))
+        poll_proposal_vote_update(user_id=self.delegator_one.user.id, poll_id=self.poll.id,
+                                  data=dict(proposals=[]))
+
+        live = live_results()
+        participants = Poll.objects.get(id=self.poll.id).participants
+        self.assertEqual(PollDelegateVoting.objects.get(poll=self.poll).mandate, 1)
+
+        poll_proposal_vote_count(poll_id=self.poll.id)
+
+        self.assertEqual(live, live_results())
+        self.assertEqual(live[0], (3 + 1 + 2, 3, 0, 3))
+        self.assertEqual(participants, Poll.objects.get(id=self.poll.id).participants)
+
+    def test_vote_count_numpy_engine(self):
+        self.test_vote_count_ranking()
+
+        def results():
+            return list(PollProposal.objects.filter(poll=self.poll).order_by('id').values_list(
+                'score', 'participants', 'blank_votes', 'positive_votes'))
+
+        database_results = results()
+        PollProposal.objects.filter(poll=self.poll).update(score=None, participants=None)
+        poll_proposal_vote_count(poll_id=self.poll.id, engine='numpy')
+
+        self.assertEqual(database_results, results())
+
+    def test_vote_count_refresh_coalesced(self):
+        self.rank(PollVoting.objects.create(created_by=self.group_user_one, poll=self.poll),
+                  [self.proposal_one, self.proposal_two])
+
+        self.assertTrue(poll_refresh_schedule(self.poll.id))
+        self.assertFalse(poll_refresh_schedule(self.poll.id))
+
+        # A running refresh of the same poll postpones the next one
+        cache.add(f'poll_refresh_running_{self.poll.id}', True)
+        poll_refresh(self.poll.id)
+        self.assertIsNone(PollProposal.objects.get(id=self.proposal_one.id).score)
+
+        cache.delete(f'poll_refresh_running_{self.poll.id}')
+        poll_refresh(self.poll.id)
+        self.assertEqual(PollProposal.objects.get(id=self.proposal_one.id).score, 3)
+        self.assertTrue(poll_refresh_schedule(self.poll.id))
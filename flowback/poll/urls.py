@@ -17,6 +17,7 @@ from .views.vote import (PollProposalVoteListAPI,
 from .views.comment import PollCommentListAPI, PollCommentCreateAPI, PollCommentUpdateAPI, PollCommentDeleteAPI
 from .views.prediction import (PollPredictionStatementListAPI,
                                PollPredictionBetListAPI,
+                               PollPredictorLeaderboardAPI,
                                PollPredictionStatementCreateAPI,
                                PollPredictionStatementDeleteAPI,
                                PollPredictionBetCreateAPI,
@@ -33,6 +34,8 @@ group_poll_patterns = [
 
     path('prediction/statement/list', PollPredictionStatementListAPI.as_view(), name='poll_prediction_statement_list'),
     path('prediction/bet/list', PollPredictionBetListAPI.as_view(), name='poll_prediction_bet_list'),
+    path('prediction/predictor/leaderboard', PollPredictorLeaderboardAPI.as_view(),
+         name='poll_predictor_leaderboard'),
 ]
 
 poll_patterns = [
@@ -26,6 +26,7 @@ class PollAreaStatementListAPI(APIView):
             tag_name = serializers.CharField(source='tag.name')
 
         vote = serializers.BooleanField(allow_null=True)
+        score = serializers.IntegerField()
         tags = SegmentSerializer(many=True, source='pollareastatementsegment_set')
 
     def get(self, request, poll_id: int):
@@ -210,7 +210,7 @@ class PollUpdateAPI(APIView):
     def post(self, request, poll: int):
         serializer = self.InputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        poll_refresh_cheap(poll_id=poll)  # TODO get celery
+        poll_refresh_cheap(poll_id=poll)
         poll_update(user_id=request.user.id, poll_id=poll, data=serializer.validated_data)
         return Response(status=status.HTTP_200_OK)
 
@@ -230,7 +230,7 @@ class PollFastForwardAPI(APIView):
 @extend_schema(tags=['poll'])
 class PollDeleteAPI(APIView):
     def post(self, request, poll: int):
-        poll_refresh_cheap(poll_id=poll)  # TODO get celery
+        poll_refresh_cheap(poll_id=poll)
         poll_delete(user_id=request.user.id, poll_id=poll)
         return Response(status=status.HTTP_200_OK)
 
@@ -302,7 +302,7 @@ class PollDelegatesListAPI(APIView):
     def get(self, request, poll: int):
         filter_serializer = self.FilterSerializer(data=request.query_params)
         filter_serializer.is_valid(raise_exception=True)
-        poll_refresh_cheap(poll_id=poll)  # TODO get celery
+        poll_refresh_cheap(poll_id=poll)
 
         delegates = poll_delegates_list(fetched_by=request.user, poll_id=poll,
                                         filters=filter_serializer.validated_data)
@@ -6,7 +6,8 @@ from rest_framework.views import APIView, Response
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
 from flowback.group.serializers import GroupUserSerializer
 
-from ..selectors.prediction import poll_prediction_statement_list, poll_prediction_bet_list
+from ..selectors.prediction import poll_prediction_statement_list, poll_prediction_bet_list, \
+    poll_predictor_leaderboard
 from ..services.prediction import (poll_prediction_statement_create,
                                    poll_prediction_statement_delete,
                                    poll_prediction_bet_create,
@@ -105,6 +106,46 @@ class PollPredictionBetListAPI(APIView):
         )
 
 
+@extend_schema(tags=['poll'])
+class PollPredictorLeaderboardAPI(APIView):
+    class Pagination(LimitOffsetPagination):
+        max_limit = 100
+        default_limit = 25
+
+    class FilterSerializer(serializers.Serializer):
+        tag_id = serializers.IntegerField(required=False)
+        user_id = serializers.IntegerField(required=False)
+        count__gt = serializers.IntegerField(required=False)
+        count__lt = serializers.IntegerField(required=False)
+        order_by = serializers.ChoiceField(required=False,
+                                           choices=['brier_score_asc', 'brier_score_desc',
+                                                    'recency_accuracy_asc', 'recency_accuracy_desc',
+                                                    'count_asc', 'count_desc'])
+
+    class OutputSerializer(serializers.Serializer):
+        tag_id = serializers.IntegerField()
+        tag_name = serializers.CharField(source='tag.name')
+        predictor = GroupUserSerializer()
+        count = serializers.IntegerField()
+        brier_score = serializers.FloatField()
+        recency_accuracy = serializers.FloatField(allow_null=True)
+
+    def get(self, request, group_id: int):
+        filter_serializer = self.FilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+
+        leaderboard = poll_predictor_leaderboard(fetched_by=request.user, group_id=group_id,
+                                                 filters=filter_serializer.validated_data)
+
+        return get_paginated_response(
+            pagination_class=self.Pagination,
+            serializer_class=self.OutputSerializer,
+            queryset=leaderboard,
+            request=request,
+            view=self
+        )
+
+
 @extend_schema(tags=['poll'])
 class PollPredictionStatementCreateAPI(APIView):
     class InputSerializer(serializers.Serializer):
@@ -48,7 +48,7 @@ class PollProposalListAPI(APIView):
         title = serializers.CharField()
         description = serializers.CharField()
         attachments = FileSerializer(many=True, source="attachments.filesegment_set", allow_null=True)
-        score = serializers.IntegerField()
+        score = serializers.IntegerField(source='result_score')
         priority = serializers.IntegerField()
         user_priority = serializers.IntegerField()
 
@@ -74,7 +74,7 @@ class PollProposalListAPI(APIView):
             raise ValidationError('Unsupported poll type')
 
         filter_serializer.is_valid(raise_exception=True)
-        poll_refresh_cheap(poll_id=poll.id)  # TODO get celery
+        poll_refresh_cheap(poll_id=poll.id)
         proposals = poll_proposal_list(fetched_by=request.user, poll_id=poll.id,
                                        filters=filter_serializer.validated_data)
 
@@ -120,7 +120,7 @@ class PollProposalCreateAPI(APIView):
             serializer = self.InputSerializerDefault(data=request.data)
 
         serializer.is_valid(raise_exception=True)
-        poll_refresh_cheap(poll_id=poll.id)  # TODO get celery
+        poll_refresh_cheap(poll_id=poll.id)
         proposal = poll_proposal_create(user_id=request.user.id, poll_id=poll.id, **serializer.validated_data)
         return Response(status=status.HTTP_200_OK, data=proposal.id)
 
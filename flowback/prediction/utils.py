@@ -0,0 +1,71 @@
+import numpy as np
+
+
+# Pairwise-complete covariance of predictor errors (predictors x predictions), NaN marks a missing bet.
+# Every pair of predictors is only compared on the predictions both of them bet on
+def prediction_error_covariance(errors: np.ndarray) -> np.ndarray:
+    has_bet = ~np.isnan(errors)
+    values = np.where(has_bet, errors, 0.0)
+    has_bet = has_bet.astype(float)
+
+    comparable = has_bet @ has_bet.T
+    sum_products = values @ values.T
+    sum_values = values @ has_bet.T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = (sum_products - sum_values * sum_values.T / comparable) / comparable
+
+    # Predictors without common predictions don't covary
+    return np.nan_to_num(covariance, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+# Minimum variance weights w = C^-1 1 / (1^T C^-1 1), summing up to one.
+# Solves C x = 1 instead of inverting C, singular matrices fall back to the least squares solution
+def prediction_combined_weights(covariance: np.ndarray) -> np.ndarray:
+    ones = np.ones(covariance.shape[0])
+
+    try:
+        solution = np.linalg.solve(covariance, ones)
+    except np.linalg.LinAlgError:
+        solution = np.linalg.lstsq(covariance, ones, rcond=None)[0]
+
+    total = solution.sum()
+    if not np.isfinite(total) or abs(total) < 1e-12:
+        return ones / len(ones)
+
+    return solution / total
+
+
+# Ridge added to the shrunk covariance, relative to the mean predictor variance
+prediction_covariance_ridge = 1e-6
+
+
+# Ledoit-Wolf style shrinkage of the pairwise covariance towards its diagonal.
+# The intensity follows from how noisy each covariance estimate is, so predictors with few
+# shared predictions lean on their own variance. Shrinking alone keeps predictors with zero variance
+# singular, a small ridge on the diagonal keeps the result invertible. Deterministic for the same errors
+def prediction_error_covariance_shrunk(errors: np.ndarray) -> np.ndarray:
+    covariance = prediction_error_covariance(errors)
+
+    has_bet = ~np.isnan(errors)
+    with np.errstate(invalid='ignore'):
+        centered = np.where(has_bet, errors - np.nanmean(errors, axis=1, keepdims=True), 0.0)
+
+    comparable = has_bet.astype(float) @ has_bet.T.astype(float)
+    squares = centered ** 2
+
+    # Estimated variance of every covariance entry, zero where predictors share no predictions
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.nan_to_num((squares @ squares.T / comparable - covariance ** 2) / comparable,
+                                 nan=0.0, posinf=0.0, neginf=0.0)
+
+    off_diagonal = ~np.eye(covariance.shape[0], dtype=bool)
+    spread = (covariance[off_diagonal] ** 2).sum()
+    intensity = 1.0 if spread == 0 else float(np.clip(variance[off_diagonal].sum() / spread, 0, 1))
+
+    shrunk = intensity * np.diag(np.diag(covariance)) + (1 - intensity) * covariance
+
+    mean_variance = np.diag(covariance).mean()
+    ridge = prediction_covariance_ridge * (mean_variance if mean_variance > 0 else 1.0)
+
+    return shrunk + ridge * np.eye(covariance.shape[0])